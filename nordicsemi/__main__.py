@@ -31,14 +31,21 @@ import logging
 import os
 import click
 import sys,traceback
+import threading
 
-from nordicsemi.dfu.dfu import Dfu
+from nordicsemi.dfu.dfu import Dfu, DfuPackage
+from nordicsemi.dfu.dfu_server import DfuServer
+from nordicsemi.dfu.dfu_session import expand_ports, run_serial_sessions
+from nordicsemi.dfu.dfu_station import DfuStation
 from nordicsemi.dfu.dfu_transport import DfuEvent
 from nordicsemi.dfu.dfu_transport_serial import DfuTransportSerial
+from nordicsemi.dfu.flash_timing import FlashTimingModel
+from nordicsemi.dfu.package_cache import PackageCache
 from nordicsemi.dfu.package import Package
 from nordicsemi import version as nrfutil_version
 from nordicsemi.dfu.signing import Signing
 from nordicsemi.dfu.util import query_func
+from nordicsemi.dfu.wire_image import WireImage, load_package
 
 
 class nRFException(Exception):
@@ -136,6 +143,41 @@ def keys(key_file,
         click.echo(signer.get_vk(show_vk))
 
 
+@cli.command(short_help='Run DFU jobs for local clients, through a JSON-RPC API')
+@click.option('--socket',
+              help='Listen on this Unix socket instead of localhost TCP',
+              type=click.Path(file_okay=True, dir_okay=False, writable=True))
+@click.option('--port',
+              help='Localhost TCP port to listen on, default: {0}'.format(DfuServer.DEFAULT_PORT),
+              type=click.IntRange(1, 65535),
+              default=DfuServer.DEFAULT_PORT)
+@click.option('-j', '--jobs',
+              help='Maximum number of devices programmed at once, default: 4',
+              type=click.IntRange(1, None),
+              default=4)
+@click.option('--cache-size',
+              help='Memory kept for loaded packages, in MiB, default: {0}'
+                   .format(PackageCache.DEFAULT_MAX_SIZE // (1024 * 1024)),
+              type=click.IntRange(0, None),
+              default=PackageCache.DEFAULT_MAX_SIZE // (1024 * 1024))
+def serve(socket, port, jobs, cache_size):
+    """
+    Stay resident and run DFU jobs for local clients, through a JSON-RPC 2.0 API with one request or response per
+    line. Methods: submit(package, port, options...), status(job), progress(job), cancel(job), jobs(), list_ports().
+    """
+    server = DfuServer(jobs, PackageCache(cache_size * 1024 * 1024))
+    address = socket if socket else ("127.0.0.1", port)
+
+    click.echo("Serving DFU jobs on {0}".format(socket if socket else "127.0.0.1:{0}".format(port)))
+
+    try:
+        server.serve(address)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+
+
 @cli.group()
 def dfu():
     """
@@ -244,6 +286,30 @@ def genpkg(zipfile,
     except OSError:
         print(log_message)
 
+
+@dfu.command('compile', short_help='Compile a package into a wire image for fast serial DFU')
+@click.argument('wirefile',
+                required=True,
+                type=click.Path(file_okay=True, dir_okay=False, writable=True))
+@click.option('-pkg', '--package',
+              help='DFU package filename',
+              type=click.Path(exists=True, resolve_path=True, file_okay=True, dir_okay=False),
+              required=True)
+@click.option('--packet-size',
+              help='Firmware bytes per serial DFU data packet, default: {0}'
+                   .format(DfuTransportSerial.DFU_PACKET_MAX_SIZE),
+              type=click.INT,
+              default=DfuTransportSerial.DFU_PACKET_MAX_SIZE)
+def compile_package(wirefile, package, packet_size):
+    """
+    Compile a DFU package into a wire image: every serial DFU data packet of the package, already encoded.
+    The wire image is accepted by the serial commands in place of the package, and is sent without building packets.
+    """
+    with DfuPackage(package) as dfu_package:
+        size = WireImage.compile(dfu_package, wirefile, packet_size)
+    click.echo("Wire image created at {0}, {1} bytes".format(wirefile, size))
+
+
 def update_progress(progress=0, done=False, log_message=""):
     del done, log_message  # Unused parameters
     if progress == 0:
@@ -255,43 +321,98 @@ def update_progress(progress=0, done=False, log_message=""):
         click.echo('#', nl=False)
 
 
+def serial_transport_options(func):
+    """Adds the options shared by the commands that program devices over serial DFU."""
+    options = [
+        click.option('-b', '--baudrate',
+                     help='Desired baud rate 38400/96000/115200/230400/250000/460800/921600/1000000 (default: 38400). '
+                          'Note: Physical serial ports (e.g. COM1) typically do not support baud rates > 115200',
+                     type=click.INT,
+                     default=DfuTransportSerial.DEFAULT_BAUD_RATE),
+        click.option('-fc', '--flowcontrol',
+                     help='Enable flow control, default: disabled',
+                     type=click.BOOL,
+                     is_flag=True),
+        click.option('-sb', '--singlebank',
+                     help='Single bank bootloader to skip firmware activating delay, default: Dual bank',
+                     type=click.BOOL,
+                     default=False,
+                     is_flag=True),
+        click.option('-t', '--touch',
+                     help='Open port with specified baud then close it, before uploading',
+                     type=click.INT,
+                     default=0),
+        click.option('-w', '--window',
+                     help='Number of data packets sent ahead of their acknowledgement (1-{0}), default: {1}. '
+                          'Falls back to 1 if the bootloader does not support it'
+                          .format(DfuTransportSerial.MAX_WINDOW_SIZE, DfuTransportSerial.DEFAULT_WINDOW_SIZE),
+                     type=click.IntRange(1, DfuTransportSerial.MAX_WINDOW_SIZE),
+                     default=DfuTransportSerial.DEFAULT_WINDOW_SIZE),
+        click.option('--chip',
+                     help='Target chip, enables flash timings learned from previous uploads. '
+                          'Worst case timings are used if not given',
+                     type=click.Choice(sorted(FlashTimingModel.CHIPS.keys()))),
+        click.option('--conservative',
+                     help='Always wait the worst case flash erase/write times',
+                     is_flag=True),
+        click.option('--boot-banner',
+                     help='Regular expression matching what the new firmware prints on the serial port when it '
+                          'starts. Activation ends as soon as it is received instead of after the worst case time',
+                     type=click.STRING),
+        click.option('--detect-reenumeration',
+                     help='End activation as soon as the USB serial port of the device comes back instead of after '
+                          'the worst case time',
+                     is_flag=True),
+    ]
+
+    for option in reversed(options):
+        func = option(func)
+
+    return func
+
+
+def packet_size_option(dfu_package):
+    """Returns the transport option sending a compiled package with the packet size it was compiled for."""
+    if dfu_package.packet_size is not None:
+        return {'packet_size': dfu_package.packet_size}
+
+    return {}
+
+
 @dfu.command(short_help="Program a device with bootloader that support serial DFU")
 @click.option('-pkg', '--package',
-              help='DFU package filename',
+              help='DFU package or wire image filename',
               type=click.Path(exists=True, resolve_path=True, file_okay=True, dir_okay=False),
               required=True)
 @click.option('-p', '--port',
               help='Serial port COM Port to which the device is connected',
               type=click.STRING,
               required=True)
-@click.option('-b', '--baudrate',
-              help='Desired baud rate 38400/96000/115200/230400/250000/460800/921600/1000000 (default: 38400). '
-                   'Note: Physical serial ports (e.g. COM1) typically do not support baud rates > 115200',
-              type=click.INT,
-              default=DfuTransportSerial.DEFAULT_BAUD_RATE)
-@click.option('-fc', '--flowcontrol',
-              help='Enable flow control, default: disabled',
-              type=click.BOOL,
-              is_flag=True)
-@click.option('-sb', '--singlebank',
-              help='Single bank bootloader to skip firmware activating delay, default: Dual bank',
-              type=click.BOOL,
-              default=False,
-              is_flag=True)
-@click.option('-t', '--touch',
-              help='Open port with specified baud then close it, before uploading',
-              type=click.INT,
-              default=0)
-
-def serial(package, port, baudrate, flowcontrol, singlebank, touch):
+@serial_transport_options
+@click.option('--report',
+              help='Write a JSON report with the time spent in each phase, frame latencies and retry counts',
+              type=click.Path(file_okay=True, dir_okay=False, writable=True))
+@click.option('--events',
+              help='Write timing events as JSON lines while the upgrade runs',
+              type=click.Path(file_okay=True, dir_okay=False, writable=True))
+
+def serial(package, port, baudrate, flowcontrol, singlebank, touch, window, chip, conservative, boot_banner,
+           detect_reenumeration, report, events):
     """Program a device with bootloader that support serial DFU"""
-    serial_backend = DfuTransportSerial(port, baudrate, flowcontrol, singlebank, touch)
+    dfu_package = load_package(package)
+    serial_backend = DfuTransportSerial(port, baudrate, flowcontrol, singlebank, touch, window_size=window,
+                                        chip=chip, conservative=conservative, boot_banner=boot_banner,
+                                        detect_reenumeration=detect_reenumeration,
+                                        **packet_size_option(dfu_package))
     serial_backend.register_events_callback(DfuEvent.PROGRESS_EVENT, update_progress)
-    dfu = Dfu(package, dfu_transport=serial_backend)
+    dfu = Dfu(dfu_package, dfu_transport=serial_backend)
 
     click.echo("Upgrading target on {1} with DFU package {0}. Flow control is {2}, {3} bank, Touch {4}"
                .format(package, port, "enabled" if flowcontrol else "disabled", "Single" if singlebank else "Dual", touch if touch > 0 else "disabled"))
 
+    if events:
+        serial_backend.report.event_stream = open(events, 'w')
+
     try:
         dfu.dfu_send_images()
 
@@ -308,10 +429,131 @@ def serial(package, port, baudrate, flowcontrol, singlebank, touch):
 
         return False
 
+    finally:
+        dfu_package.close()
+
+        if serial_backend.report.event_stream is not None:
+            serial_backend.report.event_stream.close()
+            serial_backend.report.event_stream = None
+
+        if report:
+            serial_backend.report.write(report)
+
     click.echo("Device programmed.")
 
     return True
 
 
+@dfu.command('serial-multi', short_help="Program several devices with bootloader that support serial DFU in parallel")
+@click.option('-pkg', '--package',
+              help='DFU package or wire image filename',
+              type=click.Path(exists=True, resolve_path=True, file_okay=True, dir_okay=False),
+              required=True)
+@click.option('-p', '--port',
+              help='Serial port to which a device is connected, may be repeated or a glob pattern like /dev/ttyACM*',
+              type=click.STRING,
+              multiple=True)
+@click.option('--port-list',
+              help='File listing one serial port or glob pattern per line',
+              type=click.Path(exists=True, file_okay=True, dir_okay=False))
+@click.option('-j', '--jobs',
+              help='Maximum number of devices programmed at once, default: all',
+              type=click.IntRange(1, None))
+@serial_transport_options
+def serial_multi(package, port, port_list, jobs, baudrate, flowcontrol, singlebank, touch, window, chip,
+                 conservative, boot_banner, detect_reenumeration):
+    """Program several devices with bootloader that support serial DFU in parallel"""
+    ports = expand_ports(port, port_list)
+
+    if not ports:
+        raise click.UsageError("No serial ports given, use --port or --port-list.")
+
+    dfu_package = load_package(package)
+
+    click.echo("Upgrading {0} target(s) with DFU package {1}. Flow control is {2}, {3} bank, Touch {4}"
+               .format(len(ports), package, "enabled" if flowcontrol else "disabled", "Single" if singlebank else "Dual",
+                       touch if touch > 0 else "disabled"))
+
+    def port_progress(port, progress=0, done=False, log_message=""):
+        del done, log_message  # Unused parameters
+        if progress > 0 and progress % 40 == 0:
+            click.echo("{0}: {1} packets sent".format(port, progress))
+
+    with dfu_package:
+        results = run_serial_sessions(dfu_package, ports, jobs, port_progress,
+                                      baud_rate=baudrate, flow_control=flowcontrol, single_bank=singlebank,
+                                      touch=touch, window_size=window, chip=chip, conservative=conservative,
+                                      boot_banner=boot_banner, detect_reenumeration=detect_reenumeration,
+                                      **packet_size_option(dfu_package))
+
+    port_width = max(len(result.port) for result in results)
+    click.echo("")
+    for result in results:
+        click.echo("{0:<{1}}  {2}  {3:6.1f}s  {4}".format(result.port, port_width,
+                                                         "PASS" if result.success else "FAIL",
+                                                         result.duration, result.error or ""))
+
+    failed = sum(1 for result in results if not result.success)
+    click.echo("{0} of {1} target(s) programmed.".format(len(results) - failed, len(results)))
+
+    if failed:
+        sys.exit(1)
+
+
+@dfu.command(short_help="Program serial DFU devices automatically as they are plugged in")
+@click.option('-pkg', '--package',
+              help='DFU package or wire image filename',
+              type=click.Path(exists=True, resolve_path=True, file_okay=True, dir_okay=False),
+              required=True)
+@click.option('--vid',
+              help='USB vendor id of the devices to program, e.g. 0x239A',
+              type=BASED_INT_OR_NONE)
+@click.option('--pid',
+              help='USB product id of the devices to program',
+              type=BASED_INT_OR_NONE)
+@click.option('--name',
+              help='Glob pattern the port name or description of the devices must match, e.g. "/dev/ttyACM*"',
+              type=click.STRING)
+@click.option('-j', '--jobs',
+              help='Maximum number of devices programmed at once, default: 4',
+              type=click.IntRange(1, None),
+              default=4)
+@click.option('--log',
+              help='File the result of each device is appended to, as JSON lines',
+              type=click.Path(file_okay=True, dir_okay=False, writable=True))
+@serial_transport_options
+def station(package, vid, pid, name, jobs, log, baudrate, flowcontrol, singlebank, touch, window, chip, conservative,
+            boot_banner, detect_reenumeration):
+    """
+    Program serial DFU devices automatically as they are plugged in, until interrupted with Ctrl-C.
+    Devices are told apart by their USB serial number, each one is programmed once until it is unplugged.
+    Use --touch to reset boards running an application into the bootloader.
+    """
+    if vid is None and pid is None and name is None:
+        raise click.UsageError("Select the devices to program with --vid, --pid or --name.")
+
+    dfu_package = load_package(package)
+
+    def result_callback(device):
+        click.echo("{0}  {1}  {2}  {3:6.1f}s  {4}".format(device.port, device.serial_number or "-",
+                                                          "PASS" if device.result.success else "FAIL",
+                                                          device.result.duration, device.result.error or ""))
+
+    dfu_station = DfuStation(dfu_package, vid=None if vid == 'none' else vid, pid=None if pid == 'none' else pid,
+                             name=name, jobs=jobs, log_file=log, result_callback=result_callback,
+                             baud_rate=baudrate, flow_control=flowcontrol, single_bank=singlebank, touch=touch,
+                             window_size=window, chip=chip, conservative=conservative, boot_banner=boot_banner,
+                             detect_reenumeration=detect_reenumeration, **packet_size_option(dfu_package))
+
+    click.echo("Waiting for devices to program with DFU package {0}, press Ctrl-C to stop".format(package))
+
+    # The devices being programmed are finished before run returns
+    with dfu_package:
+        try:
+            dfu_station.run(threading.Event())
+        except KeyboardInterrupt:
+            click.echo("Stopped.")
+
+
 if __name__ == '__main__':
     cli()
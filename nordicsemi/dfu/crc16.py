@@ -26,6 +26,9 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import binascii
+
+
 def calc_crc16(binary_data, crc=0xffff):
     """
     Calculates CRC16 on binary_data
@@ -34,12 +37,7 @@ def calc_crc16(binary_data, crc=0xffff):
     :param bytearray binary_data: Array with data to run CRC16 calculation on
     :return int: Calculated CRC value of binary_data
     """
-    if not isinstance(binary_data, bytes):
+    if not isinstance(binary_data, (bytes, bytearray, memoryview)):
       raise RuntimeError("calc_crc16 requires bytes input")
-    for b in binary_data:
-        crc = (crc >> 8 & 0x00FF) | (crc << 8 & 0xFF00)
-        crc ^= b
-        crc ^= (crc & 0x00FF) >> 4
-        crc ^= (crc << 8) << 4
-        crc ^= ((crc & 0x00FF) << 4) << 1
-    return crc & 0xFFFF
+    # CRC-16-CCITT, same polynomial and bit order as binascii.crc_hqx
+    return binascii.crc_hqx(binary_data, crc)
@@ -28,9 +28,9 @@
 
 # Python standard library
 import os
-import tempfile
-import shutil
 import logging
+import threading
+import zipfile
 from time import time, sleep
 from datetime import datetime, timedelta
 
@@ -39,45 +39,140 @@ from nordicsemi.exceptions import *
 from nordicsemi.dfu.package import Package
 from nordicsemi.dfu.dfu_transport import DfuEvent
 from nordicsemi.dfu.model import HexType
-from nordicsemi.dfu.manifest import SoftdeviceBootloaderFirmware
+from nordicsemi.dfu.manifest import Manifest, SoftdeviceBootloaderFirmware
 
 logger = logging.getLogger(__name__)
 
 
+class DfuPackage(object):
+    """
+    A DFU package with its manifest parsed and firmware images read into memory.
+
+    The package is read straight from the zip, nothing is extracted to disk. It is only read once, and can be shared
+    read-only by several Dfu sessions. Use it as a context manager, or call close, to release the images when done.
+    """
+
+    def __init__(self, zip_file_path):
+        """
+        Parses the manifest and reads all firmware images and init packets from the zip.
+
+        @param zip_file_path: Path to the zip file with the firmware to upgrade
+        @type zip_file_path: str
+        @return
+        """
+        self.zip_file_path = zip_file_path
+        self.files = {}
+
+        # Serial DFU data packets compiled ahead, by firmware file name, see nordicsemi.dfu.wire_image
+        self.compiled_frames = {}
+        self.packet_size = None
+
+        if not os.path.isfile(zip_file_path):
+            raise NordicSemiException("Package {0} not found.".format(zip_file_path))
+
+        self._read(zip_file_path)
+
+    def _read(self, zip_file_path):
+        """
+        Reads the manifest, firmware images and init packets. Subclasses read other file formats here.
+
+        :param str zip_file_path: Path to the package
+        :return:
+        """
+        try:
+            with zipfile.ZipFile(zip_file_path, 'r') as pkg:
+                self.manifest = Manifest.from_json(pkg.read(Package.MANIFEST_FILENAME).decode('utf-8'))
+
+                for _, firmware_manifest in self.images():
+                    for file_name in (firmware_manifest.bin_file, firmware_manifest.dat_file):
+                        self.files[file_name] = pkg.read(file_name)
+        except (zipfile.BadZipFile, KeyError) as e:
+            raise NordicSemiException("Package {0} is not a valid DFU package: {1}".format(zip_file_path, e))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Releases the firmware images, init packets and compiled packets of the package.
+
+        :return:
+        """
+        self.files.clear()
+        self.compiled_frames.clear()
+
+    def images(self):
+        """
+        Returns the firmware images in the package in the order they must be sent.
+
+        :return list: (program mode, firmware manifest) tuples
+        """
+        images = []
+
+        if self.manifest.softdevice_bootloader:
+            images.append((HexType.SD_BL, self.manifest.softdevice_bootloader))
+
+        if self.manifest.softdevice:
+            images.append((HexType.SOFTDEVICE, self.manifest.softdevice))
+
+        if self.manifest.bootloader:
+            images.append((HexType.BOOTLOADER, self.manifest.bootloader))
+
+        if self.manifest.application:
+            images.append((HexType.APPLICATION, self.manifest.application))
+
+        return images
+
+    def firmware(self, firmware_manifest):
+        return self.files[firmware_manifest.bin_file]
+
+    def init_packet(self, firmware_manifest):
+        return self.files[firmware_manifest.dat_file]
+
+    def frames(self, firmware_manifest):
+        """
+        Returns the serial DFU packets compiled for an image, see nordicsemi.dfu.wire_image.
+
+        :return list: (HciPacket, int) tuples split at packet_size, or None if the packets are built while sending
+        """
+        return self.compiled_frames.get(firmware_manifest.bin_file)
+
+
 class Dfu(object):
     """ Class to handle upload of a new hex image to the device. """
 
+    # Number of times a stalled firmware transfer is resumed before giving up
+    MAX_RESUME_ATTEMPTS = 3
+
     def __init__(self, zip_file_path, dfu_transport):
         """
         Initializes the dfu upgrade, unpacks zip and registers callbacks.
 
-        @param zip_file_path: Path to the zip file with the firmware to upgrade
-        @type zip_file_path: str
+        @param zip_file_path: Path to the zip file with the firmware to upgrade, or an already loaded package
+        @type zip_file_path: str or DfuPackage
         @param dfu_transport: Transport backend to use to upgrade
         @type dfu_transport: nordicsemi.dfu.dfu_transport.DfuTransport
         @return
         """
-        self.zip_file_path = zip_file_path
+        if isinstance(zip_file_path, DfuPackage):
+            self.package = zip_file_path
+        else:
+            self.package = DfuPackage(zip_file_path)
+
+        self.zip_file_path = self.package.zip_file_path
+        self.manifest = self.package.manifest
         self.ready_to_send = True
         self.response_opcode_received = None
 
-        self.temp_dir = tempfile.mkdtemp(prefix="nrf_dfu_")
-        self.unpacked_zip_path = os.path.join(self.temp_dir, 'unpacked_zip')
-        self.manifest = Package.unpack_package(self.zip_file_path, self.unpacked_zip_path)
-
         if dfu_transport:
             self.dfu_transport = dfu_transport
 
         self.dfu_transport.register_events_callback(DfuEvent.TIMEOUT_EVENT, self.timeout_event_handler)
         self.dfu_transport.register_events_callback(DfuEvent.ERROR_EVENT, self.error_event_handler)
 
-    def __del__(self):
-        """
-        Destructor removes the temporary directory for the unpacked zip
-        :return:
-        """
-        shutil.rmtree(self.temp_dir)
-
     def error_event_handler(self, log_message=""):
         """
         Event handler for errors, closes the transport backend.
@@ -101,27 +196,45 @@ class Dfu(object):
         logger.error(log_message)
 
     @staticmethod
-    def _read_file(file_path):
+    def image_sizes(program_mode, firmware_manifest, firmware):
         """
-        Reads a file and returns the content as a string.
+        Returns the sizes announced in the start packet of an image.
 
-        :param str file_path: The path to the file to read.
-        :return str: Content of the file.
+        @param program_mode: What type of firmware the DFU is
+        @type program_mode: nordicsemi.dfu.model.HexType
+        @param firmware_manifest: The manifest for the firmware image
+        @type firmware_manifest: nordicsemi.dfu.manifest.Firmware
+        @param firmware: The firmware image
+        @type firmware: bytes
+        @return: (softdevice size, bootloader size, application size)
+        @rtype: tuple
         """
-        buffer_size = 4096
+        softdevice_size = 0
+        bootloader_size = 0
+        application_size = 0
+
+        if program_mode == HexType.SD_BL:
+            if not isinstance(firmware_manifest, SoftdeviceBootloaderFirmware):
+                raise NordicSemiException("Wrong type of manifest")
+            softdevice_size = firmware_manifest.sd_size
+            bootloader_size = firmware_manifest.bl_size
+            firmware_size = len(firmware)
+            if softdevice_size + bootloader_size != firmware_size:
+                raise NordicSemiException(
+                    "Size of bootloader ({} bytes) and softdevice ({} bytes)"
+                    " is not equal to firmware provided ({} bytes)".format(
+                    bootloader_size, softdevice_size, firmware_size))
 
-        file_content = bytes()
+        elif program_mode == HexType.SOFTDEVICE:
+            softdevice_size = len(firmware)
 
-        with open(file_path, 'rb') as binary_file:
-            while True:
-                data = binary_file.read(buffer_size)
+        elif program_mode == HexType.BOOTLOADER:
+            bootloader_size = len(firmware)
 
-                if data:
-                    file_content += data
-                else:
-                    break
+        elif program_mode == HexType.APPLICATION:
+            application_size = len(firmware)
 
-        return file_content
+        return softdevice_size, bootloader_size, application_size
 
     def _wait_while_opening_transport(self):
         timeout = 10
@@ -137,7 +250,32 @@ class Dfu(object):
             sleep(0.1)
 
 
-    def _dfu_send_image(self, program_mode, firmware_manifest):
+    def _send_firmware(self, firmware):
+        """
+        Sends the firmware, resuming the transfer from the last acknowledged data if it stalls.
+
+        @param firmware: The firmware image
+        @type firmware: bytes
+        @return: True if the firmware was sent, False if the transfer stalled and could not be resumed
+        @rtype: bool
+        """
+        try:
+            self.dfu_transport.send_firmware(firmware)
+            return True
+        except NordicSemiException as e:
+            error = e
+
+        for _ in range(Dfu.MAX_RESUME_ATTEMPTS):
+            logger.warning("Firmware transfer stalled: %s", error)
+
+            try:
+                return self.dfu_transport.resume_firmware(firmware)
+            except NordicSemiException as e:
+                error = e
+
+        raise error
+
+    def _dfu_send_image(self, program_mode, firmware_manifest, restart_on_stall=True, reset=True, next_firmware=None):
         """
         Does DFU for one image. Reads the firmware image and init file.
         Opens the transport backend, calls setup, send and finalize and closes the backend again.
@@ -145,6 +283,12 @@ class Dfu(object):
         @type program_mode: nordicsemi.dfu.model.HexType
         @param firmware_manifest: The manifest for the firmware image
         @type firmware_manifest: nordicsemi.dfu.manifest.Firmware
+        @param restart_on_stall: Send the image again from the start if the transfer stalls and cannot be resumed
+        @type restart_on_stall: bool
+        @param reset: Reset the device into DFU mode, if False it is only reset if it is not in DFU mode already
+        @type reset: bool
+        @param next_firmware: Firmware of the image sent after this one, prepared while this one is activated
+        @type next_firmware: bytes
         @return:
         """
 
@@ -154,39 +298,14 @@ class Dfu(object):
         if self.dfu_transport.is_open():
             raise IllegalStateException("Transport is already open.")
 
-        self.dfu_transport.open()
+        if reset or not self.dfu_transport.open_without_reset():
+            self.dfu_transport.open()
         self._wait_while_opening_transport()
 
-        softdevice_size = 0
-        bootloader_size = 0
-        application_size = 0
-
-        bin_file_path = os.path.join(self.unpacked_zip_path, firmware_manifest.bin_file)
-        firmware = self._read_file(bin_file_path)
-
-        dat_file_path = os.path.join(self.unpacked_zip_path, firmware_manifest.dat_file)
-        init_packet = self._read_file(dat_file_path)
-
-        if program_mode == HexType.SD_BL:
-            if not isinstance(firmware_manifest, SoftdeviceBootloaderFirmware):
-                raise NordicSemiException("Wrong type of manifest")
-            softdevice_size = firmware_manifest.sd_size
-            bootloader_size = firmware_manifest.bl_size
-            firmware_size = len(firmware)
-            if softdevice_size + bootloader_size != firmware_size:
-                raise NordicSemiException(
-                    "Size of bootloader ({} bytes) and softdevice ({} bytes)"
-                    " is not equal to firmware provided ({} bytes)".format(
-                    bootloader_size, softdevice_size, firmware_size))
-
-        elif program_mode == HexType.SOFTDEVICE:
-            softdevice_size = len(firmware)
-
-        elif program_mode == HexType.BOOTLOADER:
-            bootloader_size = len(firmware)
-
-        elif program_mode == HexType.APPLICATION:
-            application_size = len(firmware)
+        firmware = self.package.firmware(firmware_manifest)
+        init_packet = self.package.init_packet(firmware_manifest)
+        softdevice_size, bootloader_size, application_size = Dfu.image_sizes(program_mode, firmware_manifest,
+                                                                             firmware)
 
         start_time = time()
         logger.info("Starting DFU upgrade of type %s, SoftDevice size: %s, bootloader size: %s, application size: %s",
@@ -202,34 +321,71 @@ class Dfu(object):
         logger.info("Sending DFU init packet")
         self.dfu_transport.send_init_packet(init_packet)
 
+        frames = self.package.frames(firmware_manifest)
+        if frames is not None:
+            self.dfu_transport.prepare_firmware(firmware, frames)
+
         logger.info("Sending firmware file")
-        self.dfu_transport.send_firmware(firmware)
+        if not self._send_firmware(firmware):
+            if not restart_on_stall:
+                raise NordicSemiException("Firmware transfer stalled and could not be resumed")
+
+            logger.warning("Firmware transfer could not be resumed, starting over")
+            self.dfu_transport.report.count("restarts")
+
+            if self.dfu_transport.is_open():
+                self.dfu_transport.close()
+
+            self._dfu_send_image(program_mode, firmware_manifest, restart_on_stall=False, next_firmware=next_firmware)
+            return
 
         self.dfu_transport.send_validate_firmware()
 
         self.dfu_transport.send_activate_firmware()
 
-        self.dfu_transport.close()
-
         # logger.info("Wait after activating %s second", self.get_activate_wait_time())
-        sleep(self.dfu_transport.get_activate_wait_time())
+        with self.dfu_transport.report.span("activation_wait"):
+            preparing = None
+
+            if next_firmware is not None:
+                # Encode the next image while the device is busy with this one
+                preparing = threading.Thread(target=self.dfu_transport.prepare_firmware, args=(next_firmware,))
+                preparing.start()
+
+            self.dfu_transport.wait_for_activation()
+
+            if preparing is not None:
+                preparing.join()
 
         end_time = time()
         logger.info("\nDFU upgrade took {0}s".format(end_time - start_time))
 
-    def dfu_send_images(self):
+    def plan_images(self):
         """
-        Does DFU for all firmware images in the stored manifest.
-        :return:
+        Plans sending all firmware images in the stored manifest in one session.
+
+        The device is reset into DFU mode for the first image. The bootloader restarts to activate each image, and
+        usually comes back in DFU mode, so later images are only sent after a reset if it does not answer. Each
+        image's firmware is prepared while the previous image is activated, unless the package has it compiled.
+
+        :return list: (program mode, firmware manifest, reset, next firmware) tuples, in the order to send them
         """
-        if self.manifest.softdevice_bootloader:
-            self._dfu_send_image(HexType.SD_BL, self.manifest.softdevice_bootloader)
+        images = self.package.images()
+        plan = []
 
-        if self.manifest.softdevice:
-            self._dfu_send_image(HexType.SOFTDEVICE, self.manifest.softdevice)
+        for i, (program_mode, firmware_manifest) in enumerate(images):
+            next_firmware = None
+            if i + 1 < len(images) and self.package.frames(images[i + 1][1]) is None:
+                next_firmware = self.package.firmware(images[i + 1][1])
+            plan.append((program_mode, firmware_manifest, i == 0, next_firmware))
 
-        if self.manifest.bootloader:
-            self._dfu_send_image(HexType.BOOTLOADER, self.manifest.bootloader)
+        return plan
 
-        if self.manifest.application:
-            self._dfu_send_image(HexType.APPLICATION, self.manifest.application)
+    def dfu_send_images(self):
+        """
+        Does DFU for all firmware images in the stored manifest.
+        :return:
+        """
+        for program_mode, firmware_manifest, reset, next_firmware in self.plan_images():
+            with self.dfu_transport.report.span("image", mode=program_mode):
+                self._dfu_send_image(program_mode, firmware_manifest, reset=reset, next_firmware=next_firmware)
@@ -0,0 +1,441 @@
+# Copyright (c) 2015, Nordic Semiconductor
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of Nordic Semiconductor ASA nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Python standard library
+import collections
+import itertools
+import json
+import logging
+import os
+import socketserver
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Python 3rd party imports
+from serial.tools import list_ports
+
+# Nordic libraries
+from nordicsemi.exceptions import NordicSemiException
+from nordicsemi.dfu.dfu import Dfu
+from nordicsemi.dfu.dfu_transport import DfuEvent
+from nordicsemi.dfu.dfu_transport_serial import DfuTransportSerial
+from nordicsemi.dfu.package_cache import PackageCache
+
+logger = logging.getLogger(__name__)
+
+
+class JobCancelled(Exception):
+    """
+    Raised in a job's thread to stop it.
+
+    Not a NordicSemiException, so a cancelled transfer is not resumed.
+    """
+    pass
+
+
+class JsonRpcError(Exception):
+    """ A JSON-RPC 2.0 error, with its error code. """
+
+    PARSE_ERROR = -32700
+    INVALID_REQUEST = -32600
+    METHOD_NOT_FOUND = -32601
+    INVALID_PARAMS = -32602
+    SERVER_ERROR = -32000
+
+    def __init__(self, code, message):
+        super(JsonRpcError, self).__init__(message)
+        self.code = code
+
+
+class DfuJob(object):
+    """ A DFU of one device, run by a DfuServer. """
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+    FINISHED = (DONE, FAILED, CANCELLED)
+
+    def __init__(self, job_id, package, port, transport_options):
+        """
+        :param int job_id: Id of the job, unique for the server
+        :param str package: Path to the DFU package or wire image
+        :param str port: Serial port the device is connected to
+        :param dict transport_options: Keyword arguments for DfuTransportSerial
+        """
+        self.id = job_id
+        self.package = package
+        self.port = port
+        self.transport_options = transport_options
+        self.state = DfuJob.QUEUED
+        self.progress = 0  # Data packets sent, or 100 when the firmware was sent
+        self.error = None
+        self.duration = 0.0
+        self.cancel_requested = False
+        self.future = None
+        self.changed = threading.Condition()
+
+    def update(self, **attributes):
+        """
+        Changes attributes of the job and wakes up the threads waiting for a change.
+
+        :return:
+        """
+        with self.changed:
+            for name, value in attributes.items():
+                setattr(self, name, value)
+            self.changed.notify_all()
+
+    def is_finished(self):
+        return self.state in DfuJob.FINISHED
+
+    def to_dict(self):
+        return {
+            "job": self.id,
+            "package": self.package,
+            "port": self.port,
+            "state": self.state,
+            "progress": self.progress,
+            "error": self.error,
+            "duration": self.duration,
+        }
+
+
+class DfuServer(object):
+    """
+    Runs DFU jobs for clients of a long running process.
+
+    Jobs run on a pool of worker threads, and the packages they send are loaded once and kept in a PackageCache. The
+    server is driven through a JSON-RPC 2.0 API, see handle, which serve exposes on a Unix socket or localhost TCP.
+    """
+
+    # Options of submit passed on to DfuTransportSerial
+    TRANSPORT_OPTIONS = ("baud_rate", "flow_control", "single_bank", "touch", "window_size", "chip", "conservative",
+                         "boot_banner", "detect_reenumeration", "packet_size")
+
+    # Number of finished jobs kept for clients asking about them
+    MAX_FINISHED_JOBS = 100
+
+    # Localhost TCP port served when no Unix socket is given
+    DEFAULT_PORT = 50505
+
+    def __init__(self, jobs=4, cache=None):
+        """
+        :param int jobs: Maximum number of jobs running at once
+        :param PackageCache cache: Cache of the packages sent, a new one if not given
+        """
+        self.cache = cache if cache is not None else PackageCache()
+        self.executor = ThreadPoolExecutor(max_workers=jobs)
+        self.jobs = collections.OrderedDict()
+        self._job_ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def submit(self, package, port, **transport_options):
+        """
+        Queues a DFU job.
+
+        :param str package: Path to the DFU package or wire image
+        :param str port: Serial port the device is connected to
+        :param transport_options: Keyword arguments for DfuTransportSerial, see TRANSPORT_OPTIONS. The data packets
+                                  of the package are compiled for packet_size, if given, and kept in the cache
+        :return DfuJob: The job
+        """
+        unknown = set(transport_options) - set(DfuServer.TRANSPORT_OPTIONS)
+        if unknown:
+            raise NordicSemiException("Unknown options: {0}".format(", ".join(sorted(unknown))))
+
+        if not os.path.isfile(package):
+            raise NordicSemiException("Package {0} not found.".format(package))
+
+        with self._lock:
+            job = DfuJob(next(self._job_ids), package, port, transport_options)
+
+        # Only published once it has its future, cancel and shutdown expect every job they find to have one
+        job.future = self.executor.submit(self._run, job)
+
+        with self._lock:
+            self.jobs[job.id] = job
+            self._forget_finished_jobs()
+
+        return job
+
+    def job(self, job_id):
+        """
+        :param int job_id: Id of the job
+        :return DfuJob: The job
+        """
+        with self._lock:
+            if job_id not in self.jobs:
+                raise NordicSemiException("No job {0}".format(job_id))
+
+            return self.jobs[job_id]
+
+    def cancel(self, job_id):
+        """
+        Cancels a job. A queued job does not start, a running job stops at its next progress event.
+
+        :param int job_id: Id of the job
+        :return bool: False if the job had finished already
+        """
+        job = self.job(job_id)
+
+        if job.is_finished():
+            return False
+
+        job.update(cancel_requested=True)
+
+        if job.future.cancel():
+            job.update(state=DfuJob.CANCELLED)
+
+        return True
+
+    @staticmethod
+    def list_ports():
+        """
+        Lists the serial ports enumerated by the operating system.
+
+        :return list: Dicts with the port name, description, hardware id, USB ids and serial number of each port
+        """
+        return [{
+            "port": port.device,
+            "description": port.description,
+            "hwid": port.hwid,
+            "vid": port.vid,
+            "pid": port.pid,
+            "serial_number": port.serial_number,
+        } for port in list_ports.comports()]
+
+    def shutdown(self):
+        """
+        Cancels all jobs and waits for the running ones to stop.
+
+        :return:
+        """
+        with self._lock:
+            job_ids = list(self.jobs)
+
+        for job_id in job_ids:
+            self.cancel(job_id)
+
+        self.executor.shutdown(wait=True)
+
+    def _run(self, job):
+        if job.cancel_requested:
+            job.update(state=DfuJob.CANCELLED)
+            return
+
+        start_time = time.monotonic()
+        job.update(state=DfuJob.RUNNING)
+        serial_backend = None
+
+        def progress(progress=0, done=False, log_message=""):
+            del done, log_message  # Unused parameters
+            if job.cancel_requested:
+                raise JobCancelled("Job {0} cancelled".format(job.id))
+            job.update(progress=progress)
+
+        try:
+            package = self.cache.get(job.package, job.transport_options.get("packet_size"))
+            transport_options = dict(job.transport_options)
+            if package.packet_size is not None:
+                transport_options["packet_size"] = package.packet_size
+
+            serial_backend = DfuTransportSerial(job.port, **transport_options)
+            serial_backend.register_events_callback(DfuEvent.PROGRESS_EVENT, progress)
+            Dfu(package, dfu_transport=serial_backend).dfu_send_images()
+            state, error = DfuJob.DONE, None
+        except JobCancelled as e:
+            state, error = DfuJob.CANCELLED, str(e)
+        except Exception as e:
+            logger.debug("Job %d on %s failed", job.id, job.port, exc_info=True)
+            state, error = DfuJob.FAILED, str(e)
+        finally:
+            if serial_backend is not None and serial_backend.is_open():
+                serial_backend.close()
+
+        job.update(state=state, error=error, duration=time.monotonic() - start_time)
+
+    def _forget_finished_jobs(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.is_finished()]
+
+        for job_id in finished[:max(0, len(finished) - DfuServer.MAX_FINISHED_JOBS)]:
+            del self.jobs[job_id]
+
+    def handle(self, request):
+        """
+        Handles a JSON-RPC 2.0 request.
+
+        Methods:
+            submit(package, port, **options): queues a job, returns its status
+            status(job): returns the status of a job
+            progress(job): streams a progress notification for each change of the job, returns its final status
+            cancel(job): cancels a job, returns False if it had finished
+            list_ports(): returns the serial ports
+            jobs(): returns the status of all jobs kept
+
+        :param dict request: The request
+        :return: Generator of responses and notifications to send, nothing for a notification request
+        """
+        request_id = request.get("id") if isinstance(request, dict) else None
+
+        try:
+            if not isinstance(request, dict) or not isinstance(request.get("method"), str):
+                raise JsonRpcError(JsonRpcError.INVALID_REQUEST, "Invalid request")
+
+            params = request.get("params", {})
+            if not isinstance(params, dict):
+                raise JsonRpcError(JsonRpcError.INVALID_PARAMS, "Params must be an object")
+
+            method = request["method"]
+            if method == "progress":
+                job = self._job_param(params)
+                for notification in self._stream_progress(job):
+                    yield notification
+                result = job.to_dict()
+            else:
+                result = self._call(method, params)
+        except JsonRpcError as e:
+            yield {"jsonrpc": "2.0", "id": request_id, "error": {"code": e.code, "message": str(e)}}
+            return
+        except NordicSemiException as e:
+            yield {"jsonrpc": "2.0", "id": request_id,
+                   "error": {"code": JsonRpcError.SERVER_ERROR, "message": str(e)}}
+            return
+        except Exception as e:
+            # Answered like any other failure, the connection must not end without a reply
+            logger.warning("Request %s failed", request.get("method"), exc_info=True)
+            yield {"jsonrpc": "2.0", "id": request_id,
+                   "error": {"code": JsonRpcError.SERVER_ERROR, "message": "{0}: {1}".format(type(e).__name__, e)}}
+            return
+
+        if "id" in request:
+            yield {"jsonrpc": "2.0", "id": request_id, "result": result}
+
+    def _call(self, method, params):
+        if method == "submit":
+            try:
+                return self.submit(**params).to_dict()
+            except TypeError as e:
+                raise JsonRpcError(JsonRpcError.INVALID_PARAMS, str(e))
+
+        if method == "status":
+            return self._job_param(params).to_dict()
+
+        if method == "cancel":
+            return self.cancel(self._job_param(params).id)
+
+        if method == "list_ports":
+            return self.list_ports()
+
+        if method == "jobs":
+            with self._lock:
+                return [job.to_dict() for job in self.jobs.values()]
+
+        raise JsonRpcError(JsonRpcError.METHOD_NOT_FOUND, "Method {0} not found".format(method))
+
+    def _job_param(self, params):
+        if not isinstance(params.get("job"), int):
+            raise JsonRpcError(JsonRpcError.INVALID_PARAMS, "Param job must be a job id")
+
+        return self.job(params["job"])
+
+    @staticmethod
+    def _stream_progress(job):
+        # Notifications are sent without holding the job's lock, a slow client must not hold up the transfer.
+        # Changes made while a notification is sent are merged into the next one.
+        last = None
+
+        while True:
+            with job.changed:
+                while job.to_dict() == last:
+                    job.changed.wait()
+                status = job.to_dict()
+
+            yield {"jsonrpc": "2.0", "method": "progress", "params": status}
+            last = status
+
+            if status["state"] in DfuJob.FINISHED:
+                return
+
+    def serve(self, address):
+        """
+        Serves the JSON-RPC API until the process is stopped, one request or response per line.
+
+        :param address: Path of a Unix socket, or (host, port) of a TCP socket
+        :return:
+        """
+        server = self.create_socket_server(address)
+
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+            if isinstance(address, str) and os.path.exists(address):
+                os.remove(address)
+
+    def create_socket_server(self, address):
+        """
+        Creates the socket server of the JSON-RPC API.
+
+        :param address: Path of a Unix socket, or (host, port) of a TCP socket
+        :return socketserver.BaseServer: The server, bound to the address
+        """
+        dfu_server = self
+
+        class RequestHandler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    if not line.strip():
+                        continue
+
+                    try:
+                        request = json.loads(line.decode('utf-8'))
+                    except ValueError as e:
+                        responses = [{"jsonrpc": "2.0", "id": None,
+                                      "error": {"code": JsonRpcError.PARSE_ERROR, "message": str(e)}}]
+                    else:
+                        responses = dfu_server.handle(request)
+
+                    for response in responses:
+                        self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+                        self.wfile.flush()
+
+        if isinstance(address, str):
+            server_class = socketserver.ThreadingUnixStreamServer
+        else:
+            server_class = socketserver.ThreadingTCPServer
+
+        class SocketServer(server_class):
+            daemon_threads = True
+            allow_reuse_address = True
+
+        return SocketServer(address, RequestHandler)
+
@@ -0,0 +1,146 @@
+# Copyright (c) 2015, Nordic Semiconductor
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of Nordic Semiconductor ASA nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Python standard library
+import glob
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Nordic libraries
+from nordicsemi.dfu.dfu import Dfu
+from nordicsemi.dfu.dfu_transport import DfuEvent
+from nordicsemi.dfu.dfu_transport_serial import DfuTransportSerial
+
+logger = logging.getLogger(__name__)
+
+
+class DfuSessionResult(object):
+    """ Outcome of a DFU session on one port. """
+
+    def __init__(self, port, success=False, error=None, duration=0.0):
+        """
+        :param str port: Serial port the session ran on
+        :param bool success: True if the device was programmed
+        :param str error: Error message if the session failed
+        :param float duration: Duration of the session in seconds
+        """
+        self.port = port
+        self.success = success
+        self.error = error
+        self.duration = duration
+
+
+def expand_ports(ports=(), port_list_file=None):
+    """
+    Expands port arguments into a list of serial ports.
+
+    Ports containing glob characters are matched against the file system, e.g. /dev/ttyACM*.
+    The port list file has one port or pattern per line, empty lines and lines starting with # are ignored.
+
+    :param list ports: Ports or glob patterns
+    :param str port_list_file: Path to a file listing ports or glob patterns
+    :return list: Ports without duplicates, in the order given
+    """
+    patterns = list(ports)
+
+    if port_list_file:
+        with open(port_list_file, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    patterns.append(line)
+
+    expanded = []
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            matches = sorted(glob.glob(pattern))
+            if not matches:
+                logger.warning("No serial port matches %s", pattern)
+            expanded.extend(matches)
+        else:
+            expanded.append(pattern)
+
+    result = []
+    for port in expanded:
+        if port not in result:
+            result.append(port)
+
+    return result
+
+
+def run_serial_session(package, port, progress_callback=None, **transport_options):
+    """
+    Programs the device on one serial port.
+
+    :param nordicsemi.dfu.dfu.DfuPackage package: Loaded package, shared read-only between sessions
+    :param str port: Serial port the device is connected to
+    :param progress_callback: Called as progress_callback(port, progress=, done=, log_message=) on progress events
+    :param transport_options: Keyword arguments for DfuTransportSerial
+    :return DfuSessionResult: The outcome of the session
+    """
+    start_time = time.monotonic()
+    result = DfuSessionResult(port)
+
+    try:
+        serial_backend = DfuTransportSerial(port, **transport_options)
+
+        if progress_callback is not None:
+            serial_backend.register_events_callback(DfuEvent.PROGRESS_EVENT,
+                                                    lambda **kwargs: progress_callback(port, **kwargs))
+
+        dfu = Dfu(package, dfu_transport=serial_backend)
+        dfu.dfu_send_images()
+        result.success = True
+    except Exception as e:
+        logger.debug("DFU on %s failed", port, exc_info=True)
+        result.error = str(e)
+
+    result.duration = time.monotonic() - start_time
+    return result
+
+
+def run_serial_sessions(package, ports, jobs=None, progress_callback=None, **transport_options):
+    """
+    Programs the devices on several serial ports in parallel.
+
+    :param nordicsemi.dfu.dfu.DfuPackage package: Loaded package, shared read-only between sessions
+    :param list ports: Serial ports the devices are connected to
+    :param int jobs: Maximum number of sessions running at once, one per port if not given
+    :param progress_callback: Called as progress_callback(port, progress=, done=, log_message=) on progress events
+    :param transport_options: Keyword arguments for DfuTransportSerial
+    :return list: DfuSessionResult for each port, in the order of ports
+    """
+    if not ports:
+        return []
+
+    with ThreadPoolExecutor(max_workers=jobs or len(ports)) as executor:
+        futures = [executor.submit(run_serial_session, package, port, progress_callback, **transport_options)
+                   for port in ports]
+
+        return [future.result() for future in futures]
@@ -0,0 +1,205 @@
+# Copyright (c) 2015, Nordic Semiconductor
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of Nordic Semiconductor ASA nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Python standard library
+import fnmatch
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Python 3rd party imports
+from serial.tools import list_ports
+
+# Nordic libraries
+from nordicsemi.dfu.dfu_session import run_serial_session
+
+logger = logging.getLogger(__name__)
+
+
+class StationDevice(object):
+    """ A device seen by a DfuStation. """
+
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    def __init__(self, key, port):
+        """
+        :param str key: USB serial number of the device, or its port name if it has none
+        :param port: serial.tools.list_ports_common.ListPortInfo of the port it showed up on
+        """
+        self.key = key
+        self.port = port.device
+        self.serial_number = port.serial_number
+        self.vid = port.vid
+        self.pid = port.pid
+        self.state = StationDevice.RUNNING
+        self.last_seen = time.monotonic()
+        self.result = None
+
+    def to_dict(self):
+        return {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "port": self.port,
+            "serial_number": self.serial_number,
+            "vid": self.vid,
+            "pid": self.pid,
+            "success": self.state == StationDevice.DONE,
+            "error": self.result.error if self.result is not None else None,
+            "duration": round(self.result.duration, 3) if self.result is not None else None,
+        }
+
+
+class DfuStation(object):
+    """
+    Programs serial devices with a package as they are plugged in.
+
+    The enumerated serial ports are polled, and each new port matching the USB ids and name pattern is programmed
+    on a bounded pool of worker threads. Devices are told apart by their USB serial number, so a device is not
+    programmed again when it re-enumerates, e.g. when it is reset into the bootloader or starts the new firmware. A
+    device is programmed again only after it has been gone for FORGET_TIME. Each result is appended to the log file as
+    a JSON line.
+    """
+
+    POLL_INTERVAL = 0.2
+    FORGET_TIME = 5.0  # Time a finished device must be gone before it is programmed again when it shows up
+
+    def __init__(self, package, vid=None, pid=None, name=None, jobs=4, log_file=None, result_callback=None,
+                 **transport_options):
+        """
+        :param nordicsemi.dfu.dfu.DfuPackage package: Loaded package, shared read-only between sessions
+        :param int vid: USB vendor id the devices must have, any if None
+        :param int pid: USB product id the devices must have, any if None
+        :param str name: Glob pattern the port name or description must match, any if None
+        :param int jobs: Maximum number of devices programmed at once
+        :param str log_file: Path of the file the results are appended to, as JSON lines
+        :param result_callback: Called with the StationDevice when a device is finished
+        :param transport_options: Keyword arguments for DfuTransportSerial
+        """
+        self.package = package
+        self.vid = vid
+        self.pid = pid
+        self.name = name
+        self.log_file = log_file
+        self.result_callback = result_callback
+        self.transport_options = transport_options
+        self.executor = ThreadPoolExecutor(max_workers=jobs)
+        self.devices = {}
+        self._lock = threading.Lock()
+
+    def matches(self, port):
+        """
+        Tells if a port is one of the devices to program.
+
+        :param port: serial.tools.list_ports_common.ListPortInfo of the port
+        :return bool: True if the port matches the USB ids and name pattern
+        """
+        if self.vid is not None and port.vid != self.vid:
+            return False
+
+        if self.pid is not None and port.pid != self.pid:
+            return False
+
+        if self.name is not None:
+            return any(fnmatch.fnmatch(text, self.name) for text in (port.device, port.description) if text)
+
+        return True
+
+    def poll(self):
+        """
+        Starts programming the matching devices that showed up since the last poll.
+
+        :return list: StationDevice of each device started
+        """
+        now = time.monotonic()
+        started = []
+
+        with self._lock:
+            for port in list_ports.comports():
+                key = port.serial_number or port.device
+                device = self.devices.get(key)
+
+                if device is not None:
+                    device.last_seen = now
+                    continue
+
+                if not self.matches(port):
+                    continue
+
+                device = StationDevice(key, port)
+                self.devices[key] = device
+                started.append(device)
+
+            for key, device in list(self.devices.items()):
+                if device.state != StationDevice.RUNNING and now - device.last_seen > DfuStation.FORGET_TIME:
+                    del self.devices[key]
+
+        for device in started:
+            logger.info("Programming %s on %s", device.key, device.port)
+            self.executor.submit(self._program, device)
+
+        return started
+
+    def run(self, stop_event):
+        """
+        Polls for devices until stop_event is set, then waits for the devices being programmed.
+
+        :param threading.Event stop_event: Set to stop
+        :return:
+        """
+        try:
+            while not stop_event.is_set():
+                self.poll()
+                stop_event.wait(DfuStation.POLL_INTERVAL)
+        finally:
+            self.executor.shutdown(wait=True)
+
+    def _program(self, device):
+        result = run_serial_session(self.package, device.port, **self.transport_options)
+
+        with self._lock:
+            device.result = result
+            device.state = StationDevice.DONE if result.success else StationDevice.FAILED
+            # The device may re-enumerate while it is programmed, it is only gone once no longer seen after this
+            device.last_seen = time.monotonic()
+
+            # Nothing collects the result of this executor job, errors past this point are only seen if logged
+            if self.log_file:
+                try:
+                    with open(self.log_file, 'a') as f:
+                        f.write(json.dumps(device.to_dict()) + '\n')
+                except (IOError, OSError, TypeError, ValueError):
+                    logger.exception("Could not log the result of %s to %s", device.key, self.log_file)
+
+        if self.result_callback is not None:
+            try:
+                self.result_callback(device)
+            except Exception:
+                logger.exception("Result callback failed for %s", device.key)
@@ -29,8 +29,10 @@
 # Python specific imports
 import abc
 import logging
+import time
 
 # Nordic Semiconductor imports
+from nordicsemi.dfu.session_report import SessionReport
 from nordicsemi.dfu.util import int32_to_bytes
 
 logger = logging.getLogger(__name__)
@@ -40,6 +42,7 @@ class DfuEvent:
     PROGRESS_EVENT = 1
     TIMEOUT_EVENT = 2
     ERROR_EVENT = 3
+    RETRANSMIT_EVENT = 4
 
 
 class DfuTransport(object, metaclass=abc.ABCMeta):
@@ -73,6 +76,7 @@ class DfuTransport(object, metaclass=abc.ABCMeta):
     @abc.abstractmethod
     def __init__(self):
         self.callbacks = {}
+        self.report = SessionReport()
 
     @abc.abstractmethod
     def open(self):
@@ -82,6 +86,16 @@ class DfuTransport(object, metaclass=abc.ABCMeta):
         """
         pass
 
+    def open_without_reset(self):
+        """
+        Open the transport to a device that is already in DFU mode, without resetting it.
+
+        Transports that cannot tell if the device is ready leave this as is, and open is used instead.
+
+        :return bool: True if the transport was opened
+        """
+        return False
+
     @abc.abstractmethod
     def close(self):
         """
@@ -141,6 +155,29 @@ class DfuTransport(object, metaclass=abc.ABCMeta):
         """
         pass
 
+    def prepare_firmware(self, firmware, frames=None):
+        """
+        Prepare sending a firmware ahead of the send_firmware call for it, e.g. while the device is busy.
+
+        May run in another thread than the rest of the transfer.
+
+        :param str firmware: The firmware that will be passed to send_firmware
+        :param list frames: Transport specific packets built before, e.g. by compiling the package, if any
+        :return:
+        """
+        pass
+
+    def resume_firmware(self, firmware):
+        """
+        Continues a send_firmware call that failed part way, from the last data the device acknowledged.
+
+        Transports that cannot resume a transfer leave this as is, and the image is sent again from the start.
+
+        :param str firmware: The firmware passed to send_firmware
+        :return bool: True if the transfer was completed, False if it cannot be resumed
+        """
+        return False
+
     @abc.abstractmethod
     def send_validate_firmware(self):
         """
@@ -165,6 +202,28 @@ class DfuTransport(object, metaclass=abc.ABCMeta):
         """
         pass
 
+    def get_activate_wait_time(self):
+        """
+        Returns the time the device needs to activate the new firmware and restart.
+
+        Transports that cannot estimate it leave this as is.
+
+        :return float: Wait time in seconds
+        """
+        return 0
+
+    def wait_for_activation(self):
+        """
+        Closes the transport and waits until the device runs the activated firmware.
+
+        Transports that cannot detect the restart leave this as is, and the worst case activation time is waited.
+
+        :return bool: True if the activation was detected before the worst case time
+        """
+        self.close()
+        time.sleep(self.get_activate_wait_time())
+        return False
+
     def register_events_callback(self, event_type, callback):
         """
         Register a callback.
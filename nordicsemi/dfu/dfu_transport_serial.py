@@ -27,18 +27,22 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 # Python imports
+import collections
+import re
 import time
-from datetime import datetime, timedelta
 import binascii
 import logging
+import struct
 import click
 
 # Python 3rd party imports
-from serial import Serial
+from serial import Serial, SerialException
 
 # Nordic Semiconductor imports
-from nordicsemi.dfu.util import slip_parts_to_four_bytes, slip_encode_esc_chars, int16_to_bytes, int32_to_bytes
+from nordicsemi.dfu.util import slip_parts_to_header
 from nordicsemi.dfu import crc16
+from nordicsemi.dfu.flash_timing import FlashTimingModel
+from nordicsemi.dfu.port_watcher import PortWatcher
 from nordicsemi.exceptions import NordicSemiException
 from nordicsemi.dfu.dfu_transport import DfuTransport, DfuEvent
 
@@ -51,9 +55,11 @@ class DfuTransportSerial(DfuTransport):
     DEFAULT_BAUD_RATE = 115200
     DEFAULT_FLOW_CONTROL = False
     DEFAULT_SERIAL_PORT_TIMEOUT = 1.0  # Timeout time on serial port read
+    # Upper bounds of the waits for the device, opening continues as soon as it is ready
     SERIAL_PORT_OPEN_WAIT_TIME = 0.1
     TOUCH_RESET_WAIT_TIME = 1.5     # Wait time for device into DFU mode
     DTR_RESET_WAIT_TIME = 0.1
+    READY_PROBE_INTERVAL = 0.02  # Time between probes of the bootloader while waiting for it
     ACK_PACKET_TIMEOUT = 1.0  # Timeout time for for ACK packet received before reporting timeout through event system
 
     # ADADFRUIT:
@@ -76,7 +82,21 @@ class DfuTransportSerial(DfuTransport):
     # The DFU packet max size
     DFU_PACKET_MAX_SIZE = 512
 
-    def __init__(self, com_port, baud_rate=DEFAULT_BAUD_RATE, flow_control=DEFAULT_FLOW_CONTROL, single_bank=False, touch=0, timeout=DEFAULT_SERIAL_PORT_TIMEOUT):
+    # Number of unacknowledged data packets allowed in flight. The three-wire UART header only carries a
+    # 3-bit sequence number, so the window can never cover the whole sequence space.
+    DEFAULT_WINDOW_SIZE = 1
+    MAX_WINDOW_SIZE = 7
+
+    # Number of times the oldest unacknowledged packet is resent before giving up
+    MAX_TX_ATTEMPTS = 3
+
+    # The ACK timeout grows by this factor with every resend of a packet, up to the maximum
+    ACK_TIMEOUT_BACKOFF = 2.0
+    MAX_ACK_PACKET_TIMEOUT = 4.0
+
+    def __init__(self, com_port, baud_rate=DEFAULT_BAUD_RATE, flow_control=DEFAULT_FLOW_CONTROL, single_bank=False, touch=0, timeout=DEFAULT_SERIAL_PORT_TIMEOUT,
+                 window_size=DEFAULT_WINDOW_SIZE, chip=None, conservative=False, packet_size=DFU_PACKET_MAX_SIZE,
+                 boot_banner=None, detect_reenumeration=False):
         super(DfuTransportSerial, self).__init__()
         self.com_port = com_port
         self.baud_rate = baud_rate
@@ -89,48 +109,208 @@ class DfuTransportSerial(DfuTransport):
         self.sd_size   = 0
         """:type: serial.Serial """
 
+        if not 1 <= window_size <= DfuTransportSerial.MAX_WINDOW_SIZE:
+            raise NordicSemiException("Window size must be between 1 and {0}, got {1}"
+                                      .format(DfuTransportSerial.MAX_WINDOW_SIZE, window_size))
+        self.window_size = window_size
+
+        if not 4 <= packet_size <= DfuTransportSerial.DFU_PACKET_MAX_SIZE or packet_size % 4:
+            raise NordicSemiException("Packet size must be a multiple of 4 up to {0}, got {1}"
+                                      .format(DfuTransportSerial.DFU_PACKET_MAX_SIZE, packet_size))
+        self.packet_size = packet_size
+
+        # Learned flash timings replace the worst case waits for known chips
+        self.flash_timing = FlashTimingModel(self.FLASH_PAGE_SIZE, self.FLASH_PAGE_ERASE_TIME, self.FLASH_PAGE_WRITE_TIME,
+                                             chip=chip, conservative=conservative, flow_control=bool(flow_control))
+        self.erase_wait = None
+
+        # Ways to tell the new firmware is running before the worst case activation time has passed
+        self.boot_banner = re.compile(boot_banner) if isinstance(boot_banner, str) else boot_banner
+        self.detect_reenumeration = detect_reenumeration
+
+        # Link layer state is kept per transport so several sessions can run at once
+        self.link = HciLink()
+        self.slip_reader = SlipReader()
+        self.rx_frames = collections.deque()
+        self.checkpoint = TransferCheckpoint()
+        self.prepared_frames = None
+
+        # Retry counters are always part of the session report, even when nothing had to be retried
+        self.report.counters["retransmissions"] = 0
+        self.report.counters["recoveries"] = 0
+        self.report.counters["timeouts"] = 0
+        self.report.counters["resumes"] = 0
 
     def open(self):
         super(DfuTransportSerial, self).open()
 
+        # The device restarts its sequence numbering when it enters DFU mode
+        self.link.reset()
+        self.slip_reader.reset()
+        self.rx_frames.clear()
+
         # Touch is enabled, disconnect and reconnect
         if self.touch > 0:
+            with self.report.span("touch_reset_wait", port=self.com_port):
+                watcher = PortWatcher(self.com_port)
+
+                try:
+                    touch_port = Serial(port=self.com_port, baudrate=self.touch, rtscts=self.flow_control, timeout=self.timeout)
+                except Exception as e:
+                    raise NordicSemiException("Serial port could not be opened on {0}. Reason: {1}".format(self.com_port, e))
+
+                # Wait for serial port stable
+                time.sleep(DfuTransportSerial.SERIAL_PORT_OPEN_WAIT_TIME)
+
+                touch_port.close()
+                logger.info("Touched serial port %s", self.com_port)
+
+                # Wait for device go into DFU mode and fully enumerated
+                self.wait_for_reenumeration(watcher, DfuTransportSerial.TOUCH_RESET_WAIT_TIME)
+
+            self._open_port()
+
+            # Wait for serial port stable
+            with self.report.span("port_ready_wait", port=self.com_port):
+                self.wait_until_ready(DfuTransportSerial.SERIAL_PORT_OPEN_WAIT_TIME)
+
+        # Toggle DTR to reset the board and enter DFU mode (only if touch is not used)
+        else:
+            self._open_port()
+
+            # Wait for serial port stable
+            time.sleep(DfuTransportSerial.SERIAL_PORT_OPEN_WAIT_TIME)
+
+            with self.report.span("dtr_reset_wait", port=self.com_port):
+                try:
+                    self.serial_port.setDTR(False)
+                    time.sleep(0.05)
+                    self.serial_port.setDTR(True)
+                except OSError as e:
+                    # Virtual ports, e.g. pseudo-terminals, have no modem control lines
+                    logger.warning("Could not toggle DTR on %s: %s", self.com_port, e)
+
+                # Delay to allow device to boot up
+                self.wait_until_ready(DfuTransportSerial.DTR_RESET_WAIT_TIME)
+
+    def open_without_reset(self):
+        """
+        Opens the port to a device that is expected to wait in DFU mode already, e.g. after the bootloader restarted
+        to activate the previous image of a package.
+
+        The device is neither touched nor reset through DTR. If the bootloader does not answer the readiness probe,
+        the port is closed again.
+
+        :return bool: True if the bootloader answered and the transport is open
+        """
+        self.link.reset()
+        self.slip_reader.reset()
+        self.rx_frames.clear()
+
+        try:
+            self._open_port()
+        except NordicSemiException as e:
+            logger.info("%s", e)
+            return False
+
+        with self.report.span("port_ready_wait", port=self.com_port):
+            ready = self.wait_until_ready(DfuTransportSerial.SERIAL_PORT_OPEN_WAIT_TIME +
+                                          DfuTransportSerial.DTR_RESET_WAIT_TIME)
+
+        if not ready:
+            logger.info("Bootloader on %s did not answer, resetting it into DFU mode", self.com_port)
+            self.serial_port.close()
+
+        return ready
+
+    def _open_port(self):
+        with self.report.span("port_open", port=self.com_port):
             try:
-                touch_port = Serial(port=self.com_port, baudrate=self.touch, rtscts=self.flow_control, timeout=self.timeout)
+                self.serial_port = Serial(port=self.com_port, baudrate=self.baud_rate, rtscts=self.flow_control, timeout=self.timeout)
             except Exception as e:
                 raise NordicSemiException("Serial port could not be opened on {0}. Reason: {1}".format(self.com_port, e))
 
-            # Wait for serial port stable
-            time.sleep(DfuTransportSerial.SERIAL_PORT_OPEN_WAIT_TIME)
+            logger.info("Opened serial port %s", self.com_port)
+
+    def wait_for_reenumeration(self, watcher, timeout):
+        """
+        Waits until a device reset by a touch is enumerated again, for at most timeout seconds.
+
+        The port name is updated if the device comes back under a different one. If the port cannot be watched the
+        whole timeout is waited.
+
+        :param PortWatcher watcher: Watcher created before the touch
+        :param float timeout: Maximum time to wait in seconds
+        :return:
+        """
+        deadline = time.monotonic() + timeout
+
+        if watcher.wait_for_removal(timeout):
+            device = watcher.wait_for_arrival(deadline - time.monotonic())
+
+            if device is not None:
+                self.com_port = device
+                return
+
+        time.sleep(max(0.0, deadline - time.monotonic()))
 
-            touch_port.close()
-            logger.info("Touched serial port %s", self.com_port)
+    def wait_until_ready(self, timeout):
+        """
+        Probes the bootloader until it answers, for at most timeout seconds.
 
-            # Wait for device go into DFU mode and fully enumerated
-            time.sleep(DfuTransportSerial.TOUCH_RESET_WAIT_TIME)
+        The probe is an empty packet with sequence number 0. A bootloader that just entered DFU mode expects sequence
+        number 1, so it only acknowledges the probe without processing it.
+
+        :param float timeout: Maximum time to wait in seconds
+        :return bool: True if the bootloader answered
+        """
+        deadline = time.monotonic() + timeout
+        probe = HciPacket(sequence_number=0)
+        port_timeout = self.serial_port.timeout
+        self.serial_port.timeout = DfuTransportSerial.READY_PROBE_INTERVAL
 
         try:
-            self.serial_port = Serial(port=self.com_port, baudrate=self.baud_rate, rtscts=self.flow_control, timeout=self.timeout)
-        except Exception as e:
-            raise NordicSemiException("Serial port could not be opened on {0}. Reason: {1}".format(self.com_port, e))
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
 
-        logger.info("Opened serial port %s", self.com_port)
+                self.serial_port.write(probe.data)
+                self.link.unanswered += 1
 
-        # Wait for serial port stable
-        time.sleep(DfuTransportSerial.SERIAL_PORT_OPEN_WAIT_TIME)
+                if self.read_ack(min(remaining, DfuTransportSerial.READY_PROBE_INTERVAL)) is not None:
+                    self.link.unanswered -= 1
+                    return True
+        finally:
+            self.serial_port.timeout = port_timeout
 
-        # Toggle DTR to reset the board and enter DFU mode (only if touch is not used)
-        if self.touch == 0:
-            self.serial_port.setDTR(False)
-            time.sleep(0.05)
-            self.serial_port.setDTR(True)
+    def reopen(self):
+        """
+        Opens the port again after the transfer stalled, without touching it or toggling DTR.
+
+        The device is not reset, and the link state is kept so the transfer can continue where it stopped.
+
+        :return:
+        """
+        if self.is_open():
+            self.serial_port.close()
 
-            # Delay to allow device to boot up
-            time.sleep(DfuTransportSerial.DTR_RESET_WAIT_TIME)
+        self.slip_reader.reset()
+        self.rx_frames.clear()
+        self.link.unanswered = 0
+
+        self._open_port()
+
+        # Wait for serial port stable, the device is in the middle of the transfer and cannot be probed
+        time.sleep(DfuTransportSerial.SERIAL_PORT_OPEN_WAIT_TIME)
+        self.serial_port.reset_input_buffer()
 
     def close(self):
         super(DfuTransportSerial, self).close()
-        self.serial_port.close()
+
+        with self.report.span("close", port=self.com_port):
+            self.serial_port.close()
+            self.flash_timing.save()
 
     def is_open(self):
         super(DfuTransportSerial, self).is_open()
@@ -147,41 +327,90 @@ class DfuTransportSerial(DfuTransport):
     def send_init_packet(self, init_packet):
         super(DfuTransportSerial, self).send_init_packet(init_packet)
 
-        frame = [x for x in int32_to_bytes(DFU_INIT_PACKET)]
-        frame += [chr(x) for x in bytes(init_packet)]
-        frame += [x for x in int16_to_bytes(0x0000)]  # Padding required
+        # Padding required after the init packet
+        packet = self.create_packet(struct.pack('<I', DFU_INIT_PACKET), init_packet, struct.pack('<H', 0x0000))
+        with self.report.span("init_packet", size=len(init_packet)):
+            latency = self.timed_send_packet(packet)
 
-        packet = HciPacket(frame)
-        self.send_packet(packet)
+        # The init packet is the first one sent after the erase wait, its latency tells if the device was still busy
+        if self.erase_wait is not None:
+            self.flash_timing.record_erase(self.total_size, self.erase_wait, latency)
+            self.erase_wait = None
 
     def get_erase_wait_time(self):
-        # timeout is not least than 0.5 seconds
-        return max(0.5, ((self.total_size // self.FLASH_PAGE_SIZE) + 1)*self.FLASH_PAGE_ERASE_TIME)
+        return self.flash_timing.erase_wait_time(self.total_size)
 
     def get_activate_wait_time(self):
-        if (self.single_bank and (self.sd_size == 0)):
-            # Single bank and not updating SD+Bootloader, we can skip bank1 -> bank0 delay
-            # but still need to delay bootloader setting save (1 flash page)
-            return self.FLASH_PAGE_ERASE_TIME + self.FLASH_PAGE_WRITE_TIME;
+        return self.flash_timing.activate_wait_time(self.total_size, self.single_bank, self.sd_size)
+
+    def wait_for_activation(self):
+        """
+        Closes the port and waits until the device runs the activated firmware.
+
+        If a boot banner is set, the port is kept open and read until the banner shows up. If re-enumeration
+        detection is enabled, the wait ends when the device's USB serial port has gone away and come back. Otherwise,
+        or if neither happens in time, the computed worst case activation time is waited.
+
+        :return bool: True if the activation was detected before the worst case time
+        """
+        deadline = time.monotonic() + self.get_activate_wait_time()
+        detected = False
+
+        if self.boot_banner is not None:
+            detected = self.wait_for_boot_banner(deadline)
+            self.close()
+        elif self.detect_reenumeration:
+            watcher = PortWatcher(self.com_port)
+            self.close()
+            detected = (watcher.wait_for_removal(deadline - time.monotonic()) and
+                        watcher.wait_for_arrival(deadline - time.monotonic()) is not None)
         else:
-            # Activate wait time including time to erase bank0 and transfer bank1 -> bank0
-            write_wait_time = ((self.total_size // self.FLASH_PAGE_SIZE) + 1) * self.FLASH_PAGE_WRITE_TIME
-            return self.get_erase_wait_time() + write_wait_time
+            self.close()
+
+        if detected:
+            logger.info("New firmware running, %.1f s before the activation timeout", deadline - time.monotonic())
+        else:
+            time.sleep(max(0.0, deadline - time.monotonic()))
+
+        return detected
+
+    def wait_for_boot_banner(self, deadline):
+        """
+        Reads the port until the boot banner shows up.
+
+        The port is not reopened, as that could reset the device while it is still copying the new firmware.
+
+        :param float deadline: time.monotonic() value at which to give up
+        :return bool: True if the banner was received
+        """
+        received = bytearray()
+
+        try:
+            while time.monotonic() < deadline:
+                received += self.serial_port.read(max(1, self.serial_port.in_waiting))
+
+                if self.boot_banner.search(received.decode('latin-1')):
+                    return True
+        except SerialException as e:
+            # A USB serial port goes away when the device resets
+            logger.info("Stopped waiting for the boot banner: %s", e)
+
+        return False
 
     def send_start_dfu(self, mode, softdevice_size=None, bootloader_size=None, app_size=None):
         super(DfuTransportSerial, self).send_start_dfu(mode, softdevice_size, bootloader_size, app_size)
 
-        frame = [x for x in int32_to_bytes(DFU_START_PACKET)]
-        frame += [x for x in int32_to_bytes(mode)]
-        frame += [x for x in DfuTransport.create_image_size_packet(softdevice_size, bootloader_size, app_size)]
-
-        packet = HciPacket(frame)
-        self.send_packet(packet)
+        packet = self.create_packet(struct.pack('<IIIII', DFU_START_PACKET, mode, softdevice_size, bootloader_size,
+                                                app_size))
+        with self.report.span("start_packet", mode=mode):
+            self.send_packet(packet)
 
         self.sd_size = softdevice_size
         self.total_size = softdevice_size+bootloader_size+app_size
         #logger.info("Wait after Init Packet %s second", self.get_erase_wait_time())
-        time.sleep( self.get_erase_wait_time() )
+        self.erase_wait = self.get_erase_wait_time()
+        with self.report.span("erase_wait", size=self.total_size):
+            time.sleep(self.erase_wait)
 
     def send_activate_firmware(self):
         super(DfuTransportSerial, self).send_activate_firmware()
@@ -191,101 +420,483 @@ class DfuTransportSerial(DfuTransport):
         # Single bank bootloader could skip this delay if package contains only application firmware
         click.echo("\nActivating new firmware")
 
-    def send_firmware(self, firmware):
+    def send_firmware(self, firmware, offset=0):
+        """
+        Sends the firmware data and the data stop packet.
+
+        :param bytes firmware: Firmware image
+        :param int offset: Firmware bytes the device already acknowledged, when resuming a transfer
+        :return:
+        """
         super(DfuTransportSerial, self).send_firmware(firmware)
 
-        def progress_percentage(part, whole):
-            return int(100 * float(part)/float(whole))
+        if offset == 0:
+            self.checkpoint = TransferCheckpoint()
+            self._send_event(DfuEvent.PROGRESS_EVENT, progress=0, done=False, log_message="")
 
-        frames = []
-        self._send_event(DfuEvent.PROGRESS_EVENT, progress=0, done=False, log_message="")
+        frames = self.firmware_frames(firmware, offset)
+        frames_per_page = max(1, self.FLASH_PAGE_SIZE // self.packet_size)
+        first_frame = offset // self.packet_size
 
-        for i in range(0, len(firmware), DfuTransportSerial.DFU_PACKET_MAX_SIZE):
-            theframe = [x for x in int32_to_bytes(DFU_DATA_PACKET)]
-            theframe += [chr(x) for x in firmware[i:i + DfuTransportSerial.DFU_PACKET_MAX_SIZE]]
-            data_packet = HciPacket(theframe)
-            frames.append(data_packet)
+        with self.report.span("data_transfer", size=len(firmware) - offset, window_size=self.window_size):
+            if self.window_size > 1:
+                self.send_packets_windowed(frames, first_frame)
+            else:
+                page_wait = None
+
+                # Send firmware packets, each one is built right before it goes out unless prepared ahead
+                for count, (pkt, size) in enumerate(frames, first_frame):
+                    self.checkpoint.in_flight = [(pkt, size)]
+                    latency = self.timed_send_packet(pkt)
+                    self.checkpoint.acknowledge(1)
+
+                    if page_wait is None:
+                        self.flash_timing.record_round_trip(latency)
+                    else:
+                        self.flash_timing.record_page_write(page_wait, latency)
+                        page_wait = None
+
+                    self._send_event(DfuEvent.PROGRESS_EVENT,
+                                     log_message="",
+                                     progress=count,
+                                     done=False)
+
+                    # After 4096 Bytes, nrf5x will erase and write to flash. While erasing/writing to flash
+                    # nrf5x's CPU is blocked. We better wait a few ms, just to be safe
+                    if count % frames_per_page == 0:
+                        page_wait = self.flash_timing.page_write_wait_time()
+                        time.sleep(page_wait)
+
+            # Wait for last page to write
+            page_wait = self.flash_timing.page_write_wait_time()
+            time.sleep(page_wait)
 
-        frames_count = len(frames)
+        # Send data stop packet
+        packet = self.create_packet(struct.pack('<I', DFU_STOP_DATA_PACKET))
+        self.checkpoint.in_flight = [(packet, 0)]
+        with self.report.span("stop_packet"):
+            latency = self.timed_send_packet(packet)
+        self.checkpoint.acknowledge(1)
+        self.flash_timing.record_page_write(page_wait, latency)
 
-        # Send firmware packets
-        for count, pkt in enumerate(frames):
-            self.send_packet(pkt)
-            self._send_event(DfuEvent.PROGRESS_EVENT,
-                             log_message="",
-                             progress=count,
-                             done=False)
+        self._send_event(DfuEvent.PROGRESS_EVENT, progress=100, done=False, log_message="")
 
-            # After 8 frames (4096 Bytes), nrf5x will erase and write to flash. While erasing/writing to flash
-            # nrf5x's CPU is blocked. We better wait a few ms, just to be safe
-            if count%8 == 0:
-                time.sleep(DfuTransportSerial.FLASH_PAGE_WRITE_TIME)
+    def resume_firmware(self, firmware):
+        """
+        Continues a firmware transfer that stalled, from the last data the device acknowledged.
 
-        # Wait for last page to write
-        time.sleep(DfuTransportSerial.FLASH_PAGE_WRITE_TIME)
+        The port is reopened without resetting the device and the oldest unacknowledged packet is sent again with
+        its original sequence number. If the device is still receiving it acknowledges that packet, or a later one it
+        got before the stall, and the transfer continues after it.
 
-        # Send data stop packet
-        frame = int32_to_bytes(DFU_STOP_DATA_PACKET)
-        packet = HciPacket(frame)
-        self.send_packet(packet)
+        :param bytes firmware: Firmware image passed to send_firmware
+        :return bool: True if the transfer was completed, False if the device is no longer receiving
+        """
+        checkpoint = self.checkpoint
+        if not checkpoint.in_flight:
+            return False
 
-        self._send_event(DfuEvent.PROGRESS_EVENT, progress=100, done=False, log_message="")
+        with self.report.span("resume", offset=checkpoint.offset):
+            self.reopen()
+
+            acked = self.probe(checkpoint.in_flight)
+            if not acked:
+                logger.info("Device did not acknowledge packet %d, transfer cannot be resumed",
+                            checkpoint.in_flight[0][0].sequence_number)
+                return False
+
+            # Everything but the data stop packet had been acknowledged
+            stop_only = checkpoint.offset == len(firmware)
+            checkpoint.acknowledge(acked)
+
+        self.report.count("resumes")
+        logger.info("Resuming firmware transfer at offset %d", checkpoint.offset)
+
+        if not stop_only:
+            self.send_firmware(firmware, checkpoint.offset)
+
+        return True
+
+    def probe(self, in_flight):
+        """
+        Sends the oldest unacknowledged packet once more to find out if the device still receives the transfer.
+
+        :param list in_flight: (packet, size) tuples of the packets not acknowledged, oldest first
+        :return int: Number of these packets the device has received, 0 if it did not answer or lost the transfer
+        """
+        self.write_packet(in_flight[0][0])
+        ack = self.read_ack(DfuTransportSerial.MAX_ACK_PACKET_TIMEOUT)
+
+        if ack is None:
+            return 0
+
+        # A device that was reset expects sequence number 1. It accepts the probe if it has that number, or answers
+        # that it still expects 1, and either answer can be mistaken for the ACK of a packet in flight.
+        if ack == (2 if in_flight[0][0].sequence_number == 1 else 1):
+            return 0
+
+        for i, (pkt, _) in enumerate(in_flight):
+            if self.link.is_acknowledged(pkt, ack):
+                self.link.sequence_number = pkt.sequence_number
+                self.link.last_ack = ack
+                return i + 1
+
+        return 0
+
+    def prepare_firmware(self, firmware, frames=None):
+        """
+        Builds the data packets of a firmware image ahead of the send_firmware call for it.
+
+        The packets are numbered like in a new session, where the start and init packets take sequence numbers 1 and
+        2. Meant to run while the device is busy with the previous image, it only touches the transport when done.
+
+        :param bytes firmware: Firmware image
+        :param list frames: (HciPacket, int) tuples built before, e.g. read from a wire image, used instead of
+                            building the packets
+        :return:
+        """
+        if frames is None:
+            frames = self.encode_frames(firmware, self.packet_size)
+
+        self.prepared_frames = (firmware, frames)
+
+    @staticmethod
+    def encode_frames(firmware, packet_size=DFU_PACKET_MAX_SIZE):
+        """
+        Builds all data packets of a firmware image, numbered like in a new session.
+
+        :param bytes firmware: Firmware image
+        :param int packet_size: Maximum number of firmware bytes per packet
+        :return list: (HciPacket, int) tuples, with the number of firmware bytes in each packet
+        """
+        link = HciLink()
+        link.sequence_number = 2
+
+        return [(link.create_packet(*payload), len(payload[1]))
+                for payload in DfuTransportSerial.data_payloads(firmware, packet_size)]
+
+    def firmware_frames(self, firmware, offset=0):
+        """
+        Returns the data packets of a firmware image, with the number of firmware bytes in each.
+
+        Packets prepared by prepare_firmware are used if they are for this firmware, split at this transport's packet
+        size and their sequence numbers follow the link's. That is also the case when a transfer is resumed, as
+        resuming keeps the numbering. Otherwise each packet is built when it is taken.
+
+        :param bytes firmware: Firmware image
+        :param int offset: Firmware bytes to skip
+        :return: Iterable of (HciPacket, int) tuples
+        """
+        if self.prepared_frames is not None:
+            prepared_firmware, frames = self.prepared_frames
+            first_frame = offset // self.packet_size
+
+            if (prepared_firmware is firmware and offset % self.packet_size == 0 and first_frame < len(frames) and
+                    frames[0][1] == min(self.packet_size, len(firmware)) and
+                    frames[first_frame][0].sequence_number == (self.link.sequence_number + 1) % 8):
+                self.link.sequence_number = frames[-1][0].sequence_number
+                return frames[first_frame:]
+
+            if prepared_firmware is not firmware:
+                self.prepared_frames = None
+
+        return self.build_frames(self.data_payloads(memoryview(firmware)[offset:], self.packet_size))
+
+    def build_frames(self, payloads):
+        """
+        Builds packets from payloads, each one when it is taken from the generator.
+
+        :param payloads: Iterable of payload part tuples for HciPacket, the first part being the packet type
+        :return: Generator of (HciPacket, int) tuples, with the number of bytes after the packet type
+        """
+        for payload in payloads:
+            yield self.create_packet(*payload), sum(len(part) for part in payload[1:])
+
+    def create_packet(self, *payload):
+        """
+        Builds the next packet of this session.
+
+        :param payload: Payload parts as bytes-like objects
+        :return HciPacket: The packet, with the next sequence number
+        """
+        return self.link.create_packet(*payload)
+
+    @staticmethod
+    def data_payloads(firmware, packet_size=DFU_PACKET_MAX_SIZE):
+        """
+        Generates the payloads of the data packets for a firmware image.
+
+        Payloads reference the firmware through a memoryview, nothing is copied until the packet is built.
+
+        :param bytes firmware: Firmware image
+        :param int packet_size: Maximum number of firmware bytes per packet
+        :return: Generator of payload part tuples for HciPacket
+        """
+        data_packet_type = struct.pack('<I', DFU_DATA_PACKET)
+        firmware = memoryview(firmware)
+
+        for i in range(0, len(firmware), packet_size):
+            yield data_packet_type, firmware[i:i + packet_size]
+
+    def timed_send_packet(self, pkt):
+        """
+        Sends a packet and returns how long it took until it was acknowledged.
+
+        :param HciPacket pkt: Packet to send
+        :return float: Time in seconds from writing the packet until its ACK was received
+        """
+        start = time.monotonic()
+        self.send_packet(pkt)
+        return time.monotonic() - start
 
     def send_packet(self, pkt):
+        """
+        Sends a packet and waits until the device acknowledges it.
+
+        The packet is resent with the same sequence number if no ACK arrives in time, or if the device answers with
+        an ACK number that does not acknowledge it, e.g. after a CRC error. The timeout grows with every resend.
+        Late ACKs for writes that timed out are still expected and skipped instead of being taken as rejections.
+
+        :param HciPacket pkt: Packet to send
+        :return:
+        """
+        timeout = DfuTransportSerial.ACK_PACKET_TIMEOUT
+        timed_out = False
+
+        for attempt in range(DfuTransportSerial.MAX_TX_ATTEMPTS + 1):
+            if attempt > 0:
+                self.link.retransmissions += 1
+                self.report.count("retransmissions")
+                self._send_event(DfuEvent.RETRANSMIT_EVENT,
+                                 log_message="Resending packet {0}".format(pkt.sequence_number),
+                                 sequence_number=pkt.sequence_number,
+                                 attempt=attempt)
+
+            logger.debug("PC -> target: %s", pkt)
+            sent_at = self.write_packet(pkt)
+            self.link.unanswered += 1
+            deadline = time.monotonic() + timeout
+
+            while True:
+                ack = self.read_ack(deadline - time.monotonic())
+                timed_out = ack is None
+                if timed_out:
+                    break
+
+                self.link.unanswered = max(0, self.link.unanswered - 1)
+                self.link.last_ack = ack
+
+                if self.link.is_acknowledged(pkt, ack):
+                    self.report.record_latency("frame_ack", time.monotonic() - sent_at)
+                    if attempt > 0:
+                        self.link.recoveries += 1
+                        self.report.count("recoveries")
+                    return
+
+                if self.link.unanswered == 0:
+                    logger.info("Packet %d not accepted, ACK %d", pkt.sequence_number, ack)
+                    break
+
+                # Answer to an earlier write that timed out, the one to the last write is still to come
+
+            if timed_out:
+                logger.info("No ACK for packet %d within %.1f s", pkt.sequence_number, timeout)
+                self.link.timeouts += 1
+                self.report.count("timeouts")
+                # Only the answer to the last write can still be on its way
+                self.link.unanswered = 1
+                timeout = min(timeout * DfuTransportSerial.ACK_TIMEOUT_BACKOFF,
+                              DfuTransportSerial.MAX_ACK_PACKET_TIMEOUT)
+
+        if timed_out:
+            self.ack_timed_out()
+
+        raise NordicSemiException("{0} failed tx attempts encountered on packet {1}"
+                                  .format(DfuTransportSerial.MAX_TX_ATTEMPTS + 1, pkt.sequence_number))
+
+    def write_packet(self, pkt):
+        """
+        Writes a packet to the serial port and records how long the write took.
+
+        :param HciPacket pkt: Packet to write
+        :return float: Monotonic time at which the write completed
+        """
+        start = time.monotonic()
+        self.serial_port.write(pkt.data)
+        sent_at = time.monotonic()
+        self.report.record_latency("frame_write", sent_at - start)
+        return sent_at
+
+    def send_packets_windowed(self, frames, first_frame=0):
+        """
+        Sends packets keeping up to window_size of them unacknowledged at a time.
+
+        The ACK number returned by the device is the sequence number it expects next, so a single ACK
+        acknowledges every in-flight packet up to it. If the device ACKs something outside the window
+        the answers still due for the burst are read, and the packets are resent starting from the last
+        acknowledged sequence number. If that happens within the first window the device is assumed not
+        to support pipelining and the window falls back to 1 for the rest of the session.
+
+        If no ACK arrives in time, e.g. because the last packet of the window or its ACK was lost, the
+        packets are resent the same way and the timeout grows with every resend, like in send_packet.
+        The transfer is given up after MAX_TX_ATTEMPTS resends without progress.
+
+        Packets are taken from the iterable only when there is room in the window, so packets from
+        build_frames get their sequence number at that point.
+
+        :param frames: Iterable of (HciPacket, firmware bytes) tuples, in order
+        :param int first_frame: Index of the first packet in the firmware, when resuming a transfer
+        :return:
+        """
+        frames = iter(frames)
+        frames_per_page = max(1, self.FLASH_PAGE_SIZE // self.packet_size)
+        pending = collections.deque()
+        resend = collections.deque()
+        frame_count = first_frame
+        acked_count = first_frame
         attempts = 0
-        last_ack = None
-        packet_sent = False
+        timeout = DfuTransportSerial.ACK_PACKET_TIMEOUT
 
-        while not packet_sent:
-            logger.debug("PC -> target: %s" % pkt)
-            self.serial_port.write(bytearray(pkt.data))
-            attempts += 1
-            ack = self.get_ack_nr()
+        while True:
+            while len(pending) < self.window_size:
+                if resend:
+                    pkt, size = resend.popleft()
+                else:
+                    frame = next(frames, None)
+                    if frame is None:
+                        break
+                    pkt, size = frame
+                    frame_count += 1
+
+                    # After 4096 Bytes, nrf5x will erase and write to flash. While erasing/writing to flash
+                    # nrf5x's CPU is blocked. We better wait a few ms, just to be safe
+                    if frame_count % frames_per_page == 1 % frames_per_page:
+                        time.sleep(self.flash_timing.page_write_wait_time())
 
-            if last_ack is None:
+                logger.debug("PC -> target: %s", pkt)
+                pending.append((pkt, size, self.write_packet(pkt)))
+
+            if not pending:
                 break
 
-            if ack == (last_ack + 1) % 8:
-                last_ack = ack
-                packet_sent = True
+            self.checkpoint.in_flight = [(pkt, size) for pkt, size, _ in pending] + list(resend)
 
-                if attempts > 3:
-                    raise Exception("Three failed tx attempts encountered on packet {0}".format(pkt.sequence_number))
+            ack = self.read_ack(timeout)
 
-    def get_ack_nr(self):
-        def is_timeout(start_time, timeout_sec):
-            return not (datetime.now() - start_time <= timedelta(0, timeout_sec))
+            if ack is None:
+                logger.info("No ACK for packet %d within %.1f s", pending[0][0].sequence_number, timeout)
+                self.link.timeouts += 1
+                self.report.count("timeouts")
+                timeout = min(timeout * DfuTransportSerial.ACK_TIMEOUT_BACKOFF,
+                              DfuTransportSerial.MAX_ACK_PACKET_TIMEOUT)
+            else:
+                acked = 0
+                for i, (pkt, _, _) in enumerate(pending):
+                    if self.link.is_acknowledged(pkt, ack):
+                        acked = i + 1
+                        break
+
+                self.link.last_ack = ack
+
+                if acked:
+                    now = time.monotonic()
+                    for _ in range(acked):
+                        _, _, sent_at = pending.popleft()
+                        self.report.record_latency("frame_ack", now - sent_at)
+                    self.checkpoint.acknowledge(acked)
+                    acked_count += acked
+                    if attempts > 0:
+                        self.link.recoveries += 1
+                        self.report.count("recoveries")
+                    attempts = 0
+                    timeout = DfuTransportSerial.ACK_PACKET_TIMEOUT
+                    self._send_event(DfuEvent.PROGRESS_EVENT,
+                                     log_message="",
+                                     progress=acked_count - 1,
+                                     done=False)
+                    continue
+
+            # The oldest pending packet was not accepted or not answered, resend everything from the last ACKed
+            # sequence number
+            attempts += 1
+            if attempts > DfuTransportSerial.MAX_TX_ATTEMPTS:
+                if ack is None:
+                    self.ack_timed_out()
+
+                raise NordicSemiException("{0} failed tx attempts encountered on packet {1}"
+                                          .format(DfuTransportSerial.MAX_TX_ATTEMPTS + 1,
+                                                  pending[0][0].sequence_number))
+
+            if ack is not None:
+                if acked_count - first_frame < self.window_size and self.window_size > 1:
+                    logger.warning("Device does not accept pipelined packets, falling back to window size 1")
+                    self.window_size = 1
+
+                logger.info("Unexpected ACK %d, resending %d packet(s) from sequence number %d",
+                            ack, len(pending), pending[0][0].sequence_number)
+
+            self.link.retransmissions += len(pending)
+            self.report.count("retransmissions", len(pending))
+            self._send_event(DfuEvent.RETRANSMIT_EVENT,
+                             log_message="Resending {0} packet(s)".format(len(pending)),
+                             sequence_number=pending[0][0].sequence_number,
+                             attempt=attempts)
+            if ack is not None:
+                self.read_unanswered(pending)
+            resend = collections.deque([(pkt, size) for pkt, size, _ in pending] + list(resend))
+            pending = collections.deque()
+
+    def read_unanswered(self, pending):
+        """
+        Reads and drops the answers still due for a burst of packets the device did not accept.
+
+        The device answers every frame it receives, in order, with the sequence number it expects next. The answer
+        already read came from the oldest pending packet if the device got it but rejected it, or from a later one if
+        it was lost, so it cannot tell how many of the later packets are still to be answered. Reading their answers
+        until none arrive in time keeps them from being taken as rejections of the packets sent again.
+
+        :param pending: (HciPacket, firmware bytes, send time) tuples of the burst, oldest first
+        :return:
+        """
+        for _ in range(len(pending) - 1):
+            if self.read_ack(DfuTransportSerial.ACK_PACKET_TIMEOUT) is None:
+                break
 
-        uart_buffer = []
-        start = datetime.now()
+    def ack_timed_out(self):
+        """
+        Gives up on the device after it stopped answering and reports the timeout through the event system.
 
-        while uart_buffer.count(0xC0) < 2:
-            # Disregard first of the two C0
-            temp = [x for x in self.serial_port.read(6)]
+        :return:
+        """
+        # reset packet numbering back to 0
+        self.link.sequence_number = 0
+        self._send_event(DfuEvent.TIMEOUT_EVENT,
+                         log_message="Timed out waiting for acknowledgement from device.")
 
-            if temp:
-                uart_buffer += temp
+        raise NordicSemiException("No data received on serial port. Not able to proceed.")
 
-            if is_timeout(start, DfuTransportSerial.ACK_PACKET_TIMEOUT):
-                # reset HciPacket numbering back to 0
-                HciPacket.sequence_number = 0
-                self._send_event(DfuEvent.TIMEOUT_EVENT,
-                                 log_message="Timed out waiting for acknowledgement from device.")
+    def read_ack(self, timeout):
+        """
+        Reads the next frame from the device and returns its ACK number.
 
-                # quit loop
-                break
+        :param float timeout: Time in seconds to wait for a frame
+        :return int: ACK number, or None if no frame arrived in time
+        """
+        start = time.monotonic()
 
-                # read until you get a new C0
-                # RESUME_WORK
+        while not self.rx_frames:
+            # Block for the first byte, then take whatever else the driver already has
+            data = self.serial_port.read(max(1, self.serial_port.in_waiting))
 
-        if len(uart_buffer) < 2:
-            raise NordicSemiException("No data received on serial port. Not able to proceed.")
+            if data:
+                self.rx_frames.extend(self.slip_reader.feed(data))
+            elif time.monotonic() - start > timeout:
+                return None
 
-        logger.debug("PC <- target: %s", [hex(i) for i in uart_buffer])
-        data = self.decode_esc_chars(uart_buffer)
+        data = self.rx_frames.popleft()
 
-        # Remove 0xC0 at start and beginning
-        data = data[1:-1]
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("PC <- target: %s", binascii.hexlify(data))
 
         # Extract ACK number from header
         return (data[0] >> 3) & 0x07
@@ -293,26 +904,107 @@ class DfuTransportSerial(DfuTransport):
     @staticmethod
     def decode_esc_chars(data):
         """Replace 0xDBDC with 0xCO and 0xDBDD with 0xDB"""
-        result = []
+        return list(SlipReader.decode(bytes(data)))
+
+
+class TransferCheckpoint(object):
+    """
+    Position of a firmware transfer, updated as packets are acknowledged so a stalled transfer can be resumed.
+    """
+
+    def __init__(self):
+        self.offset = 0  # Firmware bytes acknowledged by the device
+        self.in_flight = []  # (packet, firmware bytes) sent but not acknowledged, oldest first
+
+    def acknowledge(self, count):
+        """
+        Moves the checkpoint past the oldest packets in flight.
 
-        #data = bytearray(data)
+        :param int count: Number of packets acknowledged
+        :return:
+        """
+        for _, size in self.in_flight[:count]:
+            self.offset += size
+
+        del self.in_flight[:count]
+
+
+class SlipReader(object):
+    """
+    Incremental decoder for SLIP framed three-wire UART packets.
+
+    Bytes are fed as they arrive from the serial port. Complete frames are returned decoded, bytes of an unfinished
+    frame are kept until the rest arrives. Frames with a broken escape sequence or header checksum are dropped.
+    """
+
+    SLIP_END = 0xC0
+    HEADER_SIZE = 4
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        """
+        Adds received bytes and returns the frames completed by them.
+
+        :param bytes data: Received bytes
+        :return list: Decoded frames as bytes, without SLIP delimiters
+        """
+        frames = []
+        scan_start = len(self.buffer)
+        self.buffer += data
 
-        while len(data):
-            char = data.pop(0)
+        frame_start = 0
+        end = self.buffer.find(SlipReader.SLIP_END, scan_start)
 
-            if char == 0xDB:
-                char2 = data.pop(0)
+        while end >= 0:
+            frame = bytes(self.buffer[frame_start:end])
+            frame_start = end + 1
 
-                if char2 == 0xDC:
-                    result.append(0xC0)
-                elif char2 == 0xDD:
-                    result.append(0xDB)
+            if frame:
+                try:
+                    frame = SlipReader.decode(frame)
+                except NordicSemiException as e:
+                    logger.debug("Dropping frame: %s", e)
                 else:
-                    raise Exception('Char 0xDB NOT followed by 0xDC or 0xDD')
-            else:
-                result.append(char)
+                    if SlipReader.is_valid_header(frame):
+                        frames.append(frame)
+                    else:
+                        logger.debug("Dropping frame with invalid header")
+
+            end = self.buffer.find(SlipReader.SLIP_END, frame_start)
+
+        del self.buffer[:frame_start]
+        return frames
+
+    def reset(self):
+        self.buffer = bytearray()
+
+    @staticmethod
+    def decode(frame):
+        """
+        Replaces 0xDBDC with 0xC0 and 0xDBDD with 0xDB.
+
+        :param bytes frame: SLIP encoded frame without delimiters
+        :return bytes: Decoded frame
+        """
+        escapes = frame.count(b'\xdb')
+
+        if escapes == 0:
+            return frame
+
+        if escapes != frame.count(b'\xdb\xdc') + frame.count(b'\xdb\xdd'):
+            raise NordicSemiException('Char 0xDB NOT followed by 0xDC or 0xDD')
+
+        return frame.replace(b'\xdb\xdc', b'\xc0').replace(b'\xdb\xdd', b'\xdb')
+
+    @staticmethod
+    def is_valid_header(frame):
+        if len(frame) < SlipReader.HEADER_SIZE:
+            return False
+
+        return (sum(frame[0:SlipReader.HEADER_SIZE]) & 0xFF) == 0
 
-        return result
 
 DATA_INTEGRITY_CHECK_PRESENT = 1
 RELIABLE_PACKET = 1
@@ -329,41 +1021,120 @@ DFU_UPDATE_MODE_BL = 2
 DFU_UPDATE_MODE_APP = 4
 
 
+class HciLink(object):
+    """
+    Link layer state of one serial DFU session.
+
+    Owns the sequence number of the packets sent, the last ACK number received and the retry counters.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """
+        Starts over with the numbering the device uses after entering DFU mode.
+
+        :return:
+        """
+        self.sequence_number = 0  # Sequence number of the last packet built
+        self.last_ack = None  # Last ACK number received
+        self.retransmissions = 0  # Packets sent again after the device did not accept them
+        self.recoveries = 0  # Packets acknowledged after being sent again
+        self.timeouts = 0  # Times no ACK was received in time
+        self.unanswered = 0  # Writes the device has not answered yet
+
+    def create_packet(self, *payload):
+        """
+        Builds the next packet of the session.
+
+        :param payload: Payload parts as bytes-like objects
+        :return HciPacket: The packet, with the next sequence number
+        """
+        self.sequence_number = (self.sequence_number + 1) % 8
+        return HciPacket(*payload, sequence_number=self.sequence_number)
+
+    @staticmethod
+    def is_acknowledged(pkt, ack):
+        """
+        Tells if an ACK number acknowledges a packet. The device ACKs with the sequence number it expects next.
+
+        :param HciPacket pkt: Packet sent
+        :param int ack: ACK number received
+        :return bool: True if the packet was received by the device
+        """
+        return ack == (pkt.sequence_number + 1) % 8
+
+
 class HciPacket(object):
     """Class representing a single HCI packet"""
 
-    sequence_number = 0
-
-    def __init__(self, data=''):
-        HciPacket.sequence_number = (HciPacket.sequence_number + 1) % 8
-        temp_data = []
-        logger.debug("Data "+str(len(data))+": %s", data)
-        slip_bytes = slip_parts_to_four_bytes(HciPacket.sequence_number,
-                                                   DATA_INTEGRITY_CHECK_PRESENT,
-                                                   RELIABLE_PACKET,
-                                                   HCI_PACKET_TYPE,
-                                                   len(data))
-        temp_data += [ord(x) for x in slip_bytes]        
-        logger.debug("Add slip preamble: %s", [hex(i) for i in temp_data])
-
-        temp_data += [ord(x) for x in data]
-        logger.debug("Add Data: %s", [hex(i) for i in temp_data])
-        
+    HEADER_SIZE = 4
+    CRC_SIZE = 2
+
+    def __init__(self, *payload, sequence_number):
+        """
+        Builds the SLIP encoded frame for a packet.
+
+        The payload parts are written one after the other, so a DFU command can be followed by a memoryview slice of
+        the firmware without joining them first.
+
+        :param payload: Payload parts as bytes-like objects
+        :param int sequence_number: Sequence number of the packet, see HciLink
+        """
+        self.sequence_number = sequence_number
+
+        payload = [HciPacket._to_bytes(part) for part in payload]
+        length = sum(len(part) for part in payload)
+
+        raw = bytearray(HciPacket.HEADER_SIZE + length + HciPacket.CRC_SIZE)
+        raw[0:HciPacket.HEADER_SIZE] = slip_parts_to_header(self.sequence_number,
+                                                            DATA_INTEGRITY_CHECK_PRESENT,
+                                                            RELIABLE_PACKET,
+                                                            HCI_PACKET_TYPE,
+                                                            length)
+
+        offset = HciPacket.HEADER_SIZE
+        for part in payload:
+            raw[offset:offset + len(part)] = part
+            offset += len(part)
+
+        crc = crc16.calc_crc16(memoryview(raw)[:offset], crc=0xffff)
+        raw[offset] = crc & 0xFF
+        raw[offset + 1] = (crc & 0xFF00) >> 8
+
         # Add escape characters
-        crc = crc16.calc_crc16(bytes(temp_data) , crc=0xffff)
-        logger.debug("CRC: %s", hex(crc))
-        temp_data.append(crc & 0xFF)
-        temp_data.append((crc & 0xFF00) >> 8)
-        logger.debug("Add CRC: %s", [hex(i) for i in temp_data])
-
-        encoded = slip_encode_esc_chars("".join(chr(x) for x in bytearray(temp_data)))
-        temp_data = [ord(x) for x in encoded]
-        logger.debug("SLIP encoded: %s", [hex(i) for i in temp_data])
-        
-        self.data = [0xc0]
-        self.data += temp_data
-        self.data += [0xc0]
-        logger.debug("Final packet: %s", [hex(i) for i in self.data])
+        self.data = b'\xc0' + bytes(raw.replace(b'\xdb', b'\xdb\xdd').replace(b'\xc0', b'\xdb\xdc')) + b'\xc0'
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Data %d: %s", length, binascii.hexlify(raw[HciPacket.HEADER_SIZE:offset]))
+            logger.debug("CRC: %s", hex(crc))
+            logger.debug("Final packet: %s", binascii.hexlify(self.data))
+
+    @classmethod
+    def from_frame(cls, data, sequence_number):
+        """
+        Wraps a frame that was SLIP encoded before, e.g. one read from a wire image.
+
+        :param bytes data: SLIP encoded frame, delimiters included
+        :param int sequence_number: Sequence number the frame was built with
+        :return HciPacket: The packet
+        """
+        pkt = cls.__new__(cls)
+        pkt.sequence_number = sequence_number
+        pkt.data = data
+        return pkt
+
+    @staticmethod
+    def _to_bytes(part):
+        # Packets used to be built from str and lists of characters
+        if isinstance(part, str):
+            return part.encode('latin-1')
+
+        if isinstance(part, list):
+            return bytes(ord(x) if isinstance(x, str) else x for x in part)
+
+        return part
 
     def __str__(self):
-        return str([hex(i) for i in self.data])
+        return binascii.hexlify(self.data).decode('ascii')
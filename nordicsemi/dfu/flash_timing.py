@@ -0,0 +1,346 @@
+# Copyright (c) 2015, Nordic Semiconductor
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of Nordic Semiconductor ASA nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Python standard library
+import contextlib
+import errno
+import json
+import logging
+import os
+import tempfile
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class FlashTimingModel(object):
+    """
+    Estimates how long the device is busy erasing or writing flash, so the transport only waits as long as needed.
+
+    Estimates are learned from the ACK latency of the packet sent right after a wait: if the device was still busy
+    when the packet arrived, the ACK is delayed by the remaining busy time. If the ACK comes back as fast as a normal
+    packet the device was idle already. With flow control the estimate is then lowered a bit to probe for a shorter
+    wait next time. Without it the device loses bytes that arrive while it is busy, so waits are never probed below
+    what has been seen to work. Learned values are stored per chip in a small JSON profile.
+
+    Unknown chips and conservative mode always use the worst case values the transport was created with.
+    """
+
+    # Datasheet timings, page erase and word write times are the worst case values
+    CHIPS = {
+        'nrf52832': {'page_erase_time': 0.0897, 'page_erase_time_min': 0.00205,
+                     'word_write_time': 0.000338, 'word_write_time_min': 0.0000675},
+        'nrf52840': {'page_erase_time': 0.085, 'page_erase_time_min': 0.00205,
+                     'word_write_time': 0.000041, 'word_write_time_min': 0.000041},
+    }
+
+    DEFAULT_PROFILE_PATH = os.path.join(os.path.expanduser("~"), ".adafruit-nrfutil", "flash_timing.json")
+
+    # Multiplier applied to learned values
+    DEFAULT_SAFETY_MARGIN = 1.5
+
+    # Weight of a new sample in the moving averages
+    LEARNING_RATE = 0.3
+
+    # Factor applied to the estimate when the device turned out to be idle already, with flow control only
+    PROBE_FACTOR = 0.9
+
+    # ACK latency above the usual round trip time by less than this is not counted as the device being busy
+    BUSY_THRESHOLD = 0.002
+
+    # Never wait less than this after the start packet
+    MIN_ERASE_WAIT_TIME = 0.5
+
+    # Time to wait for another session to finish writing the profile, and age after which its lock is abandoned
+    PROFILE_LOCK_TIMEOUT = 5.0
+    PROFILE_LOCK_POLL_INTERVAL = 0.02
+
+    def __init__(self, page_size, page_erase_time, page_write_time, chip=None, conservative=False,
+                 safety_margin=DEFAULT_SAFETY_MARGIN, profile_path=DEFAULT_PROFILE_PATH, flow_control=False):
+        """
+        :param int page_size: Flash page size in bytes
+        :param float page_erase_time: Worst case time to erase one page, used in conservative mode and as upper bound
+        :param float page_write_time: Worst case time to write one page, used in conservative mode and as upper bound
+        :param str chip: Chip name, one of CHIPS. Unknown or None chips are handled conservatively
+        :param bool conservative: Always use the worst case timings
+        :param float safety_margin: Multiplier applied to learned values
+        :param str profile_path: Path to the JSON profile with learned values, None to not persist them
+        :param bool flow_control: True if the link has flow control, so data sent while the device is busy is
+                                  delayed instead of lost
+        """
+        self.page_size = page_size
+        self.max_page_erase_time = page_erase_time
+        self.max_page_write_time = page_write_time
+        self.chip = chip
+        self.conservative = conservative or chip not in FlashTimingModel.CHIPS
+        self.safety_margin = safety_margin
+        self.profile_path = profile_path
+        self.flow_control = flow_control
+        self.dirty = False
+
+        self.page_erase_time = page_erase_time
+        self.page_write_time = page_write_time
+        self.round_trip_time = None
+
+        if not self.conservative:
+            datasheet = FlashTimingModel.CHIPS[chip]
+            words_per_page = page_size // 4
+            self.max_page_erase_time = min(page_erase_time, datasheet['page_erase_time'])
+            self.max_page_write_time = min(page_write_time, words_per_page * datasheet['word_write_time'])
+            self.min_page_erase_time = datasheet['page_erase_time_min']
+            self.min_page_write_time = words_per_page * datasheet['word_write_time_min']
+            self.page_erase_time = self.max_page_erase_time
+            self.page_write_time = self.max_page_write_time
+            self.load()
+
+    def pages(self, size):
+        return (size // self.page_size) + 1
+
+    def page_erase_wait_time(self):
+        """
+        Time to wait for the device to erase one flash page.
+
+        :return float: Wait time in seconds
+        """
+        if self.conservative:
+            return self.max_page_erase_time
+
+        return min(self.max_page_erase_time, self.page_erase_time * self.safety_margin)
+
+    def erase_wait_time(self, size):
+        """
+        Time to wait after the start packet while the device erases room for an image.
+
+        :param int size: Size of the image in bytes
+        :return float: Wait time in seconds
+        """
+        return max(FlashTimingModel.MIN_ERASE_WAIT_TIME, self.pages(size) * self.page_erase_wait_time())
+
+    def page_write_wait_time(self):
+        """
+        Time to wait after a page worth of data while the device writes it to flash.
+
+        :return float: Wait time in seconds
+        """
+        if self.conservative:
+            return self.max_page_write_time
+
+        return min(self.max_page_write_time, self.page_write_time * self.safety_margin)
+
+    def activate_wait_time(self, size, single_bank, sd_size):
+        """
+        Time to wait after activating the firmware while the device moves it in place.
+
+        :param int size: Total size of the image in bytes
+        :param bool single_bank: True for single bank bootloaders
+        :param int sd_size: Size of the SoftDevice part of the image
+        :return float: Wait time in seconds
+        """
+        if single_bank and (sd_size == 0):
+            # Single bank and not updating SD+Bootloader, we can skip bank1 -> bank0 delay
+            # but still need to delay bootloader setting save (1 flash page)
+            return self.page_erase_wait_time() + self.page_write_wait_time()
+
+        # Activate wait time including time to erase bank0 and transfer bank1 -> bank0
+        return self.erase_wait_time(size) + self.pages(size) * self.page_write_wait_time()
+
+    def record_round_trip(self, latency):
+        """
+        Records the ACK latency of a packet that was not sent right after a flash operation.
+
+        :param float latency: Time from writing the packet until its ACK was received
+        :return:
+        """
+        if self.round_trip_time is None:
+            self.round_trip_time = latency
+        else:
+            self.round_trip_time = self._average(self.round_trip_time, latency)
+
+    def record_erase(self, size, waited, latency):
+        """
+        Records the ACK latency of the first packet sent after the erase wait.
+
+        :param int size: Size of the image that was erased for
+        :param float waited: Time waited after the start packet
+        :param float latency: ACK latency of the packet sent after the wait
+        :return:
+        """
+        if self.conservative:
+            return
+
+        sample = self._busy_time(waited, latency) / self.pages(size)
+        self.page_erase_time = self._clamp(self._average(self.page_erase_time, sample),
+                                           self.min_page_erase_time, self.max_page_erase_time)
+        self.dirty = True
+
+    def record_page_write(self, waited, latency):
+        """
+        Records the ACK latency of the first packet sent after a page write wait.
+
+        :param float waited: Time waited after the page was complete
+        :param float latency: ACK latency of the packet sent after the wait
+        :return:
+        """
+        if self.conservative:
+            return
+
+        sample = self._busy_time(waited, latency)
+        self.page_write_time = self._clamp(self._average(self.page_write_time, sample),
+                                           self.min_page_write_time, self.max_page_write_time)
+        self.dirty = True
+
+    def _busy_time(self, waited, latency):
+        extra = latency - (self.round_trip_time or 0)
+
+        if extra > FlashTimingModel.BUSY_THRESHOLD:
+            # Device was still busy when the packet arrived
+            return waited + extra
+
+        if not self.flow_control:
+            # Device was done before the wait ended, but a shorter wait could lose data, keep the estimate
+            return waited / self.safety_margin
+
+        # Device was done before the wait ended, try a little less next time
+        return waited / self.safety_margin * FlashTimingModel.PROBE_FACTOR
+
+    @staticmethod
+    def _average(current, sample):
+        return current + FlashTimingModel.LEARNING_RATE * (sample - current)
+
+    @staticmethod
+    def _clamp(value, low, high):
+        return max(low, min(high, value))
+
+    def load(self):
+        """
+        Loads learned values for the chip from the profile, if there are any.
+
+        :return:
+        """
+        if self.profile_path is None or not os.path.isfile(self.profile_path):
+            return
+
+        try:
+            with open(self.profile_path, 'r') as f:
+                profile = json.load(f).get(self.chip, {})
+        except (IOError, ValueError) as e:
+            logger.warning("Ignoring flash timing profile %s: %s", self.profile_path, e)
+            return
+
+        self.page_erase_time = self._clamp(profile.get('page_erase_time', self.page_erase_time),
+                                           self.min_page_erase_time, self.max_page_erase_time)
+        self.page_write_time = self._clamp(profile.get('page_write_time', self.page_write_time),
+                                           self.min_page_write_time, self.max_page_write_time)
+        self.round_trip_time = profile.get('round_trip_time', self.round_trip_time)
+
+    def save(self):
+        """
+        Stores the learned values for the chip in the profile, keeping the values of other chips.
+
+        Sessions running at the same time, in this process or others, take turns through a lock file next to the
+        profile, so none of them overwrites what another one stored in the meantime.
+
+        :return:
+        """
+        if self.conservative or self.profile_path is None or not self.dirty:
+            return
+
+        profile_dir = os.path.dirname(self.profile_path)
+
+        try:
+            if profile_dir:
+                os.makedirs(profile_dir, exist_ok=True)
+
+            with self._profile_lock():
+                self._merge_into_profile(profile_dir)
+        except (IOError, OSError) as e:
+            logger.warning("Could not store flash timing profile %s: %s", self.profile_path, e)
+            return
+
+        self.dirty = False
+        logger.info("Stored flash timing profile for %s in %s", self.chip, self.profile_path)
+
+    def _merge_into_profile(self, profile_dir):
+        # Read again right before replacing, the lock keeps other sessions from saving in between
+        profile = {}
+        if os.path.isfile(self.profile_path):
+            try:
+                with open(self.profile_path, 'r') as f:
+                    profile = json.load(f)
+            except (IOError, ValueError):
+                profile = {}
+
+        profile[self.chip] = {
+            'page_erase_time': self.page_erase_time,
+            'page_write_time': self.page_write_time,
+            'round_trip_time': self.round_trip_time,
+        }
+
+        # Write to a temporary file first so a concurrent reader never sees a partial profile
+        fd, temp_path = tempfile.mkstemp(dir=profile_dir or None, prefix=".flash_timing_")
+        with os.fdopen(fd, 'w') as f:
+            json.dump(profile, f, indent=4, sort_keys=True)
+        os.replace(temp_path, self.profile_path)
+
+    @contextlib.contextmanager
+    def _profile_lock(self):
+        """
+        Holds the lock file of the profile, created exclusively so only one session at a time can have it.
+
+        A lock older than PROFILE_LOCK_TIMEOUT is left over from a session that died while saving and is removed.
+        """
+        lock_path = self.profile_path + ".lock"
+        deadline = time.monotonic() + FlashTimingModel.PROFILE_LOCK_TIMEOUT
+
+        while True:
+            try:
+                fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                break
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+
+            try:
+                if time.time() - os.path.getmtime(lock_path) > FlashTimingModel.PROFILE_LOCK_TIMEOUT:
+                    logger.warning("Removing stale flash timing profile lock %s", lock_path)
+                    os.remove(lock_path)
+                    continue
+            except OSError:
+                # Released in the meantime
+                continue
+
+            if time.monotonic() > deadline:
+                raise IOError("Timed out waiting for flash timing profile lock {0}".format(lock_path))
+
+            time.sleep(FlashTimingModel.PROFILE_LOCK_POLL_INTERVAL)
+
+        try:
+            os.close(fd)
+            yield
+        finally:
+            os.remove(lock_path)
@@ -56,6 +56,7 @@ from .compat import (
     )
 
 from .getsizeof import total_size
+from .segments import SegmentBuffer
 
 
 class _DeprecatedParam(object):
@@ -81,7 +82,7 @@ class IntelHex(object):
         self.start_addr = None
 
         # private members
-        self._buf = {}
+        self._buf = SegmentBuffer()
         self._offset = 0
 
         if source is not None:
@@ -140,13 +141,13 @@ class IntelHex(object):
         if record_type == 0:
             # data record
             addr += self._offset
-            for i in range_g(4, 4+record_length):
-                if not self._buf.get(addr, None) is None:
-                    raise AddressOverlapError(address=addr, line=line)
-                self._buf[addr] = bin[i]
-                addr += 1   # FIXME: addr should be wrapped 
-                            # BUT after 02 record (at 64K boundary)
-                            # and after 04 record (at 4G boundary)
+            overlap = self._buf.first_used(addr, addr+record_length)
+            if overlap is not None:
+                raise AddressOverlapError(address=overlap, line=line)
+            self._buf.write(addr, bin[4:4+record_length])
+            # FIXME: addr should be wrapped
+            # BUT after 02 record (at 64K boundary)
+            # and after 04 record (at 4G boundary)
 
         elif record_type == 1:
             # end of file record
@@ -202,19 +203,97 @@ class IntelHex(object):
             fclose = None
 
         self._offset = 0
-        line = 0
 
         try:
-            decode = self._decode_record
+            self._decode_records(fobj.read())
+        finally:
+            if fclose:
+                fclose()
+
+    def _decode_records(self, text):
+        """Decode all records of HEX file.
+
+        The hex digits of all records are unhexlified in one call, then
+        every data record is checked on its slice of the result and runs
+        of contiguous data records are stored as one segment. Other
+        records, and records with errors, are passed to _decode_record,
+        so errors are the same as when decoding line by line.
+
+        @param  text    content of HEX file.
+        """
+        records = []
+        for line, s in enumerate(text.split('\n')):
+            s = s.rstrip('\r')
+            if s:
+                records.append((line + 1, s))
+
+        decode = self._decode_record
+        try:
+            raw = unhexlify(asbytes(''.join([s[1:] for line, s in records
+                                             if s[0] == ':' and len(s) % 2])))
+        except (TypeError, ValueError):
+            # bad hex digits somewhere, let the line by line decoder find them
             try:
-                for s in fobj:
-                    line += 1
+                for line, s in records:
                     decode(s, line)
             except _EndOfFile:
                 pass
-        finally:
-            if fclose:
-                fclose()
+            return
+
+        pos = 0
+        run = bytearray()   # data of the contiguous data records
+        run_addr = run_end = None
+        run_starts = []     # start address and line of each record in run
+        run_lines = []
+        try:
+            for line, s in records:
+                if s[0] != ':' or not len(s) % 2:
+                    self._write_run(run_addr, run, run_starts, run_lines)
+                    decode(s, line)
+                length = len(s) // 2
+                record = raw[pos:pos+length]
+                pos += length
+                if (length < 5 or record[0] != length - 5 or record[3] != 0
+                        or sum(record) & 0x0FF):
+                    # not a data record, or a bad one
+                    self._write_run(run_addr, run, run_starts, run_lines)
+                    run = bytearray()
+                    run_addr = run_end = None
+                    del run_starts[:], run_lines[:]
+                    decode(s, line)
+                    continue
+
+                addr = record[1]*256 + record[2] + self._offset
+                if addr != run_end:
+                    self._write_run(run_addr, run, run_starts, run_lines)
+                    run = bytearray()
+                    run_addr = run_end = addr
+                    del run_starts[:], run_lines[:]
+                run += record[4:-1]
+                run_end += length - 5
+                run_starts.append(addr)
+                run_lines.append(line)
+        except _EndOfFile:
+            pass
+        self._write_run(run_addr, run, run_starts, run_lines)
+
+    def _write_run(self, addr, data, starts, lines):
+        """Store data of contiguous data records.
+
+        @param  addr    start address of data.
+        @param  data    data of the records.
+        @param  starts  start address of each record.
+        @param  lines   line number of each record (for error messages).
+
+        @raise  AddressOverlapError     if there is data in the range already.
+        """
+        if not data:
+            return
+        overlap = self._buf.first_used(addr, addr+len(data))
+        if overlap is not None:
+            line = lines[bisect_right(starts, overlap) - 1]
+            raise AddressOverlapError(address=overlap, line=line)
+        self._buf.write(addr, data)
 
     def loadbin(self, fobj, offset=0):
         """Load bin file into internal buffer. Not needed if source set in
@@ -282,16 +361,14 @@ class IntelHex(object):
         """Load data from array or list of bytes.
         Similar to loadbin() method but works directly with iterable bytes.
         """
-        for b in bytes:
-            self._buf[offset] = b
-            offset += 1
+        self._buf.write(offset, bytearray(bytes))
 
     def _get_start_end(self, start=None, end=None, size=None):
         """Return default values for start and end if they are None.
         If this IntelHex object is empty then it's error to
         invoke this method with both start and end as None. 
         """
-        if (start,end) == (None,None) and self._buf == {}:
+        if (start,end) == (None,None) and not self._buf:
             raise EmptyIntelHexError
         if size is not None:
             if None not in (start, end):
@@ -342,13 +419,12 @@ class IntelHex(object):
         if pad is None:
             pad = self.padding
         bin = array('B')
-        if self._buf == {} and None in (start, end):
+        if not self._buf and None in (start, end):
             return bin
         if size is not None and size <= 0:
             raise ValueError("tobinarray: wrong value for size")
         start, end = self._get_start_end(start, end, size)
-        for i in range_g(start, end+1):
-            bin.append(self._buf.get(i, pad))
+        bin.extend(self._buf.read(start, end-start+1, pad))
         return bin
 
     def tobinstr(self, start=None, end=None, pad=_DEPRECATED, size=None):
@@ -401,18 +477,30 @@ class IntelHex(object):
         else:
             close_fd = False
 
-        fobj.write(self._tobinstr_really(start, end, pad, size))
+        try:
+            self._tobinfile_really(fobj, start, end, pad, size)
+        finally:
+            if close_fd:
+                fobj.close()
 
-        if close_fd:
-            fobj.close()
+    def _tobinfile_really(self, fobj, start, end, pad, size):
+        """Write binary data to file object, segment by segment."""
+        if pad is None:
+            pad = self.padding
+        if not self._buf and None in (start, end):
+            return
+        if size is not None and size <= 0:
+            raise ValueError("tobinarray: wrong value for size")
+        start, end = self._get_start_end(start, end, size)
+        for chunk in self._buf.chunks(start, end+1, pad):
+            fobj.write(chunk)
 
     def todict(self):
         '''Convert to python dictionary.
 
         @return         dict suitable for initializing another IntelHex object.
         '''
-        r = {}
-        r.update(self._buf)
+        r = dict(self._buf.items())
         if self.start_addr:
             r['start_addr'] = self.start_addr
         return r
@@ -421,29 +509,19 @@ class IntelHex(object):
         '''Returns all used addresses in sorted order.
         @return         list of occupied data addresses in sorted order. 
         '''
-        aa = dict_keys(self._buf)
-        aa.sort()
-        return aa
+        return list(self._buf.keys())
 
     def minaddr(self):
         '''Get minimal address of HEX content.
         @return         minimal address or None if no data
         '''
-        aa = dict_keys(self._buf)
-        if aa == []:
-            return None
-        else:
-            return min(aa)
+        return self._buf.minaddr()
 
     def maxaddr(self):
         '''Get maximal address of HEX content.
         @return         maximal address or None if no data
         '''
-        aa = dict_keys(self._buf)
-        if aa == []:
-            return None
-        else:
-            return max(aa)
+        return self._buf.maxaddr()
 
     def __getitem__(self, addr):
         ''' Get requested byte from address.
@@ -457,17 +535,18 @@ class IntelHex(object):
                 raise TypeError('Address should be >= 0.')
             return self._buf.get(addr, self.padding)
         elif t == slice:
-            addresses = dict_keys(self._buf)
             ih = IntelHex()
-            if addresses:
-                addresses.sort()
-                start = addr.start or addresses[0]
-                stop = addr.stop or (addresses[-1]+1)
+            if self._buf:
+                start = addr.start or self._buf.minaddr()
+                stop = addr.stop or (self._buf.maxaddr()+1)
                 step = addr.step or 1
-                for i in range_g(start, stop, step):
-                    x = self._buf.get(i)
-                    if x is not None:
-                        ih[i] = x
+                if step == 1:
+                    ih._buf = self._buf.slice(start, stop)
+                else:
+                    for i in range_g(start, stop, step):
+                        x = self._buf.get(i)
+                        if x is not None:
+                            ih[i] = x
             return ih
         else:
             raise TypeError('Address has unsupported type: %s' % t)
@@ -500,10 +579,13 @@ class IntelHex(object):
                 raise TypeError('start address cannot be negative')
             if stop < 0:
                 raise TypeError('stop address cannot be negative')
-            j = 0
-            for i in range_g(start, stop, step):
-                self._buf[i] = byte[j]
-                j += 1
+            if step == 1:
+                self._buf.write(start, byte[:stop-start])
+            else:
+                j = 0
+                for i in range_g(start, stop, step):
+                    self._buf[i] = byte[j]
+                    j += 1
         else:
             raise TypeError('Address has unsupported type: %s' % t)
 
@@ -515,22 +597,33 @@ class IntelHex(object):
                 raise TypeError('Address should be >= 0.')
             del self._buf[addr]
         elif t == slice:
-            addresses = dict_keys(self._buf)
-            if addresses:
-                addresses.sort()
-                start = addr.start or addresses[0]
-                stop = addr.stop or (addresses[-1]+1)
+            if self._buf:
+                start = addr.start or self._buf.minaddr()
+                stop = addr.stop or (self._buf.maxaddr()+1)
                 step = addr.step or 1
-                for i in range_g(start, stop, step):
-                    x = self._buf.get(i)
-                    if x is not None:
-                        del self._buf[i]
+                if step == 1:
+                    self._buf.delete(start, stop)
+                else:
+                    for i in range_g(start, stop, step):
+                        self._buf.pop(i, None)
         else:
             raise TypeError('Address has unsupported type: %s' % t)
 
+    def delete_range(self, start, end):
+        """Delete all data in address range from start to end (exclusive).
+        Takes time proportional to the data present, not to the range size.
+
+        @param  start   first address to delete.
+        @param  end     address after the last one to delete.
+        @return         number of bytes deleted.
+        """
+        if start < 0 or end < 0:
+            raise TypeError('Address should be >= 0.')
+        return self._buf.delete(start, end)
+
     def __len__(self):
         """Return count of bytes with real values."""
-        return len(dict_keys(self._buf))
+        return len(self._buf)
 
     def _get_eol_textfile(eolstyle, platform):
         if eolstyle == 'native':
@@ -623,86 +716,46 @@ class IntelHex(object):
                 raise InvalidStartAddressValueError(start_addr=self.start_addr)
 
         # data
-        addresses = dict_keys(self._buf)
-        addresses.sort()
-        addr_len = len(addresses)
-        if addr_len:
-            minaddr = addresses[0]
-            maxaddr = addresses[-1]
-
-            if maxaddr > 65535:
+        if self._buf:
+            if self._buf.maxaddr() > 65535:
                 need_offset_record = True
             else:
                 need_offset_record = False
-            high_ofs = 0
-
-            cur_addr = minaddr
-            cur_ix = 0
-
-            while cur_addr <= maxaddr:
-                if need_offset_record:
-                    bin = array('B', asbytes('\0'*7))
-                    bin[0] = 2      # reclen
-                    bin[1] = 0      # offset msb
-                    bin[2] = 0      # offset lsb
-                    bin[3] = 4      # rectyp
-                    high_ofs = int(cur_addr>>16)
-                    b = divmod(high_ofs, 256)
-                    bin[4] = b[0]   # msb of high_ofs
-                    bin[5] = b[1]   # lsb of high_ofs
-                    bin[6] = (-sum(bin)) & 0x0FF    # chksum
-                    fwrite(':' +
-                           asstr(hexlify(array_tobytes(bin)).translate(table)) +
-                           eol)
-
-                while True:
-                    # produce one record
+            high_ofs = None
+
+            for seg_addr, data in self._buf.segments():
+                cur_addr = seg_addr
+                seg_end = seg_addr + len(data)
+
+                while cur_addr < seg_end:
+                    if need_offset_record and (cur_addr >> 16) != high_ofs:
+                        bin = array('B', asbytes('\0'*7))
+                        bin[0] = 2      # reclen
+                        bin[1] = 0      # offset msb
+                        bin[2] = 0      # offset lsb
+                        bin[3] = 4      # rectyp
+                        high_ofs = int(cur_addr>>16)
+                        b = divmod(high_ofs, 256)
+                        bin[4] = b[0]   # msb of high_ofs
+                        bin[5] = b[1]   # lsb of high_ofs
+                        bin[6] = (-sum(bin)) & 0x0FF    # chksum
+                        fwrite(':' +
+                               asstr(hexlify(array_tobytes(bin)).translate(table)) +
+                               eol)
+
+                    # produce one record, records never cross a 64K boundary
                     low_addr = cur_addr & 0x0FFFF
-                    # chain_len off by 1
-                    chain_len = min(byte_count-1, 65535-low_addr, maxaddr-cur_addr)
-
-                    # search continuous chain
-                    stop_addr = cur_addr + chain_len
-                    if chain_len:
-                        ix = bisect_right(addresses, stop_addr,
-                                          cur_ix,
-                                          min(cur_ix+chain_len+1, addr_len))
-                        chain_len = ix - cur_ix     # real chain_len
-                        # there could be small holes in the chain
-                        # but we will catch them by try-except later
-                        # so for big continuous files we will work
-                        # at maximum possible speed
-                    else:
-                        chain_len = 1               # real chain_len
+                    chain_len = min(byte_count, 65536-low_addr, seg_end-cur_addr)
 
-                    bin = array('B', asbytes('\0'*(5+chain_len)))
                     b = divmod(low_addr, 256)
-                    bin[1] = b[0]   # msb of low_addr
-                    bin[2] = b[1]   # lsb of low_addr
-                    bin[3] = 0          # rectype
-                    try:    # if there is small holes we'll catch them
-                        for i in range_g(chain_len):
-                            bin[4+i] = self._buf[cur_addr+i]
-                    except KeyError:
-                        # we catch a hole so we should shrink the chain
-                        chain_len = i
-                        bin = bin[:5+i]
-                    bin[0] = chain_len
-                    bin[4+chain_len] = (-sum(bin)) & 0x0FF    # chksum
+                    bin = bytearray((chain_len, b[0], b[1], 0))
+                    bin += data[cur_addr-seg_addr:cur_addr-seg_addr+chain_len]
+                    bin.append((-sum(bin)) & 0x0FF)     # chksum
                     fwrite(':' +
-                           asstr(hexlify(array_tobytes(bin)).translate(table)) +
+                           asstr(hexlify(bytes(bin)).translate(table)) +
                            eol)
 
-                    # adjust cur_addr/cur_ix
-                    cur_ix += chain_len
-                    if cur_ix < addr_len:
-                        cur_addr = addresses[cur_ix]
-                    else:
-                        cur_addr = maxaddr + 1
-                        break
-                    high_addr = int(cur_addr>>16)
-                    if high_addr > high_ofs:
-                        break
+                    cur_addr += chain_len
 
         # end-of-file record
         fwrite(":00000001FF"+eol)
@@ -729,21 +782,16 @@ class IntelHex(object):
         from addr through addr+length, a NotEnoughDataError exception will
         be raised. Padding is not used.
         """
-        a = array('B', asbytes('\0'*length))
         try:
-            for i in range_g(length):
-                a[i] = self._buf[addr+i]
+            return self._buf.read(addr, length)
         except KeyError:
             raise NotEnoughDataError(address=addr, length=length)
-        return array_tobytes(a)
 
     def puts(self, addr, s):
         """Put string of bytes at given address. Will overwrite any previous
         entries.
         """
-        a = array('B', asbytes(s))
-        for i in range_g(len(a)):
-            self._buf[addr+i] = a[i]
+        self._buf.write(addr, asbytes(s))
 
     def getsz(self, addr):
         """Get zero-terminated bytes string from given address. Will raise 
@@ -811,11 +859,9 @@ class IntelHex(object):
             else:
                 tofile.write('start_addr = %r\n' % start_addr)
         # actual data
-        addresses = dict_keys(self._buf)
-        if addresses:
-            addresses.sort()
-            minaddr = addresses[0]
-            maxaddr = addresses[-1]
+        if self._buf:
+            minaddr = self._buf.minaddr()
+            maxaddr = self._buf.maxaddr()
             startaddr = (minaddr // width) * width
             endaddr = ((maxaddr // width) + 1) * width
             maxdigits = max(len(hex(endaddr)) - 2, 4)   # Less 2 to exclude '0x'
@@ -868,15 +914,19 @@ class IntelHex(object):
                 "'error', 'ignore' or 'replace'")
         # merge data
         this_buf = self._buf
-        other_buf = other._buf
-        for i in other_buf:
-            if i in this_buf:
-                if overlap == 'error':
+        for start, data in other._buf.segments():
+            end = start + len(data)
+            if overlap == 'error':
+                i = this_buf.first_used(start, end)
+                if i is not None:
                     raise AddressOverlapError(
                         'Data overlapped at address 0x%X' % i)
-                elif overlap == 'ignore':
-                    continue
-            this_buf[i] = other_buf[i]
+            elif overlap == 'ignore':
+                # only fill the holes of this object
+                for gap_start, gap_end in this_buf.gaps(start, end):
+                    this_buf.write(gap_start, data[gap_start-start:gap_end-start])
+                continue
+            this_buf.write(start, data)
         # merge start_addr
         if self.start_addr != other.start_addr:
             if self.start_addr is None:     # set start addr from other
@@ -896,25 +946,22 @@ class IntelHex(object):
         The second entry of the tuple is always an integer greater than the first entry.
         @param min_gap      the minimum gap size between data in order to separate the segments
         """
-        addresses = self.addresses()
-        if not addresses:
-            return []
-        elif len(addresses) == 1:
-            return([(addresses[0], addresses[0]+1)])
-        adjacent_differences = [(b - a) for (a, b) in zip(addresses[:-1], addresses[1:])]
-        breaks = [i for (i, x) in enumerate(adjacent_differences) if x > min_gap]
-        endings = [addresses[b] for b in breaks]
-        endings.append(addresses[-1])
-        beginnings = [addresses[b+1] for b in breaks]
-        beginnings.insert(0, addresses[0])
-        return [(a, b+1) for (a, b) in zip(beginnings, endings)]
+        result = []
+        for start, data in self._buf.segments():
+            end = start + len(data)
+            # gap measured as the difference of the addresses around it
+            if result and start - (result[-1][1]-1) <= min_gap:
+                result[-1] = (result[-1][0], end)
+            else:
+                result.append((start, end))
+        return result
         
     def get_memory_size(self):
         """Returns the approximate memory footprint for data."""
         n = sys.getsizeof(self)
         n += sys.getsizeof(self.padding)
         n += total_size(self.start_addr)
-        n += total_size(self._buf)
+        n += self._buf.get_memory_size()
         n += sys.getsizeof(self._offset)
         return n
 
@@ -987,22 +1034,22 @@ class IntelHex16bit(IntelHex):
 
         @return         minimal address used in this object
         '''
-        aa = dict_keys(self._buf)
-        if aa == []:
+        aa = self._buf.minaddr()
+        if aa is None:
             return 0
         else:
-            return min(aa)>>1
+            return aa>>1
 
     def maxaddr(self):
         '''Get maximal address of HEX content in 16-bit mode.
 
         @return         maximal address used in this object 
         '''
-        aa = dict_keys(self._buf)
-        if aa == []:
+        aa = self._buf.maxaddr()
+        if aa is None:
             return 0
         else:
-            return max(aa)>>1
+            return aa>>1
 
     def tobinarray(self, start=None, end=None, size=None):
         '''Convert this object to binary form as array (of 2-bytes word data).
@@ -1015,7 +1062,7 @@ class IntelHex16bit(IntelHex):
         '''
         bin = array('H')
 
-        if self._buf == {} and None in (start, end):
+        if not self._buf and None in (start, end):
             return bin
 
         if size is not None and size <= 0:
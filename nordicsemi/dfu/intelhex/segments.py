@@ -0,0 +1,371 @@
+# Copyright (c) 2015, Nordic Semiconductor
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of Nordic Semiconductor ASA nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+'''Sparse byte storage for IntelHex, as sorted contiguous segments.'''
+
+from bisect import bisect_left, bisect_right
+import sys
+
+
+class SegmentBuffer(object):
+    '''Bytes at sparse addresses, stored as runs of contiguous data.
+
+    Segments are kept sorted by start address, each one a bytearray. Adjacent
+    or overlapping writes are merged, so no two segments touch. Lookups use
+    bisect on the start addresses, range operations copy or drop whole slices.
+
+    Single addresses can be read and written like in the dict of address to
+    byte value IntelHex used to keep.
+
+    generation is incremented on every change, so derived values can be
+    cached and checked for staleness.
+    '''
+
+    def __init__(self, source=None):
+        ''' Constructor.
+
+        @param  source  other SegmentBuffer or dict of address to byte value
+        '''
+        self._starts = []
+        self._data = []
+        self._len = 0
+        self.generation = 0
+        if source is not None:
+            self.update(source)
+
+    # single addresses
+
+    def get(self, addr, default=None):
+        i = bisect_right(self._starts, addr) - 1
+        if i >= 0:
+            offset = addr - self._starts[i]
+            data = self._data[i]
+            if offset < len(data):
+                return data[offset]
+        return default
+
+    def __getitem__(self, addr):
+        value = self.get(addr)
+        if value is None:
+            raise KeyError(addr)
+        return value
+
+    def __setitem__(self, addr, byte):
+        self.write(addr, (byte,))
+
+    def __delitem__(self, addr):
+        if self.get(addr) is None:
+            raise KeyError(addr)
+        self.delete(addr, addr + 1)
+
+    def __contains__(self, addr):
+        return self.get(addr) is not None
+
+    def pop(self, addr, *default):
+        value = self.get(addr)
+        if value is None:
+            if default:
+                return default[0]
+            raise KeyError(addr)
+        self.delete(addr, addr + 1)
+        return value
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        return self.keys()
+
+    def keys(self):
+        '''Generates the used addresses in ascending order.'''
+        for start, data in zip(self._starts, self._data):
+            for addr in range(start, start + len(data)):
+                yield addr
+
+    def items(self):
+        '''Generates (address, byte value) pairs in ascending address order.'''
+        for start, data in zip(self._starts, self._data):
+            for offset, value in enumerate(data):
+                yield start + offset, value
+
+    def __eq__(self, other):
+        if isinstance(other, SegmentBuffer):
+            return self._starts == other._starts and self._data == other._data
+        if isinstance(other, dict):
+            return self._len == len(other) and all(self.get(addr) == value for addr, value in other.items())
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    def copy(self):
+        new = SegmentBuffer()
+        new._starts = list(self._starts)
+        new._data = [bytearray(data) for data in self._data]
+        new._len = self._len
+        return new
+
+    def update(self, other):
+        '''Writes all bytes of other, a SegmentBuffer or a dict of address
+        to byte value, over the bytes stored.
+        '''
+        if isinstance(other, SegmentBuffer):
+            for start, data in other.segments():
+                self.write(start, data)
+            return
+
+        run_start = None
+        run = bytearray()
+        for addr, value in sorted(other.items()):
+            if run and addr == run_start + len(run):
+                run.append(value)
+                continue
+            if run:
+                self.write(run_start, run)
+            run_start = addr
+            run = bytearray((value,))
+        if run:
+            self.write(run_start, run)
+
+    # segments and ranges
+
+    def segments(self):
+        '''Returns the stored segments.
+
+        @return     list of (start address, bytearray) tuples in ascending
+                    address order. The bytearrays must not be modified.
+        '''
+        return list(zip(self._starts, self._data))
+
+    def minaddr(self):
+        '''@return  lowest used address, or None if empty'''
+        if not self._starts:
+            return None
+        return self._starts[0]
+
+    def maxaddr(self):
+        '''@return  highest used address, or None if empty'''
+        if not self._starts:
+            return None
+        return self._starts[-1] + len(self._data[-1]) - 1
+
+    def _overlapping(self, start, end):
+        '''Returns the index range [first, last) of the segments holding
+        addresses in [start, end).
+        '''
+        if start >= end:
+            return 0, 0
+        first = bisect_right(self._starts, start) - 1
+        if first < 0 or self._starts[first] + len(self._data[first]) <= start:
+            first += 1
+        last = bisect_left(self._starts, end)
+        return first, last
+
+    def first_used(self, start, end):
+        '''@return  lowest used address in [start, end), or None if there is
+                    no data in the range
+        '''
+        first, last = self._overlapping(start, end)
+        if first >= last:
+            return None
+        return max(start, self._starts[first])
+
+    def gaps(self, start, end):
+        '''Returns the address ranges in [start, end) without data.
+
+        @return     list of (start, end) tuples, end exclusive
+        '''
+        gaps = []
+        first, last = self._overlapping(start, end)
+        addr = start
+        for i in range(first, last):
+            if self._starts[i] > addr:
+                gaps.append((addr, self._starts[i]))
+            addr = self._starts[i] + len(self._data[i])
+        if addr < end:
+            gaps.append((addr, end))
+        return gaps
+
+    def read(self, addr, length, fill=None):
+        '''Reads length bytes starting at addr.
+
+        @param  fill    byte value for addresses without data. If None, all
+                        addresses must have data.
+        @return         bytes read
+        @raise  KeyError    if fill is None and an address has no data
+        '''
+        if length <= 0:
+            return b''
+        if fill is None:
+            i = bisect_right(self._starts, addr) - 1
+            if i < 0:
+                raise KeyError(addr)
+            offset = addr - self._starts[i]
+            if offset + length > len(self._data[i]):
+                raise KeyError(addr)
+            return bytes(self._data[i][offset:offset + length])
+
+        result = bytearray((fill,)) * length
+        end = addr + length
+        first, last = self._overlapping(addr, end)
+        for i in range(first, last):
+            start = self._starts[i]
+            data = self._data[i]
+            lo = max(addr, start)
+            hi = min(end, start + len(data))
+            result[lo - addr:hi - addr] = data[lo - start:hi - start]
+        return bytes(result)
+
+    def chunks(self, start, end, fill, pad_size=0x10000):
+        '''Generates the bytes in [start, end) as consecutive chunks, views of
+        the segment data and fill bytes for the addresses without data. Gaps
+        are filled from one preallocated buffer of at most pad_size bytes.
+
+        The chunks must be used before the buffer is modified.
+        '''
+        pad = memoryview(bytes(bytearray((fill,)) * max(0, min(pad_size, end - start))))
+        first, last = self._overlapping(start, end)
+        # start of each segment's data in the range, and the end of the range
+        pieces = [(max(start, self._starts[i]), i) for i in range(first, last)]
+        pieces.append((end, None))
+
+        addr = start
+        for lo, i in pieces:
+            while addr < lo:
+                n = min(lo - addr, len(pad))
+                yield pad[:n]
+                addr += n
+            if i is not None:
+                seg_start = self._starts[i]
+                hi = min(end, seg_start + len(self._data[i]))
+                yield memoryview(self._data[i])[lo - seg_start:hi - seg_start]
+                addr = hi
+
+    def write(self, addr, data):
+        '''Writes bytes starting at addr, over any bytes stored there.
+
+        @param  data    bytes-like object or sequence of byte values
+        '''
+        length = len(data)
+        if length == 0:
+            return
+        end = addr + length
+
+        # Segments overlapping or touching [addr, end) are merged with the new data
+        first = bisect_right(self._starts, addr) - 1
+        if first < 0 or self._starts[first] + len(self._data[first]) < addr:
+            first += 1
+        last = bisect_right(self._starts, end)
+
+        if first == last:
+            self._starts.insert(first, addr)
+            self._data.insert(first, bytearray(data))
+            self._len += length
+            self.generation += 1
+            return
+
+        start = self._starts[first]
+        merged = self._data[first]
+        old_len = sum(len(self._data[i]) for i in range(first, last))
+
+        if start + len(merged) == addr and last == first + 1:
+            # Appending right after a segment, the common case when loading
+            merged += bytes(data) if not isinstance(data, (bytes, bytearray, memoryview)) else data
+        else:
+            if addr < start:
+                merged[0:0] = bytes(start - addr)
+                start = addr
+            for i in range(first + 1, last):
+                gap = self._starts[i] - start - len(merged)
+                if gap > 0:
+                    merged += bytes(gap)
+                merged += self._data[i]
+            if len(merged) < end - start:
+                merged += bytes(end - start - len(merged))
+            merged[addr - start:end - start] = data
+
+        self._starts[first:last] = [start]
+        self._data[first:last] = [merged]
+        self._len += len(merged) - old_len
+        self.generation += 1
+
+    def delete(self, start, end):
+        '''Removes the bytes in [start, end).
+
+        @return     number of bytes removed
+        '''
+        if start >= end:
+            return 0
+        first, last = self._overlapping(start, end)
+        if first >= last:
+            return 0
+
+        starts = []
+        datas = []
+        removed = 0
+        for i in range(first, last):
+            seg_start = self._starts[i]
+            data = self._data[i]
+            seg_end = seg_start + len(data)
+            if seg_start < start:
+                starts.append(seg_start)
+                datas.append(data[:start - seg_start])
+            if end < seg_end:
+                starts.append(end)
+                datas.append(data[end - seg_start:])
+            removed += min(end, seg_end) - max(start, seg_start)
+
+        self._starts[first:last] = starts
+        self._data[first:last] = datas
+        self._len -= removed
+        self.generation += 1
+        return removed
+
+    def slice(self, start, end):
+        '''@return  new SegmentBuffer with a copy of the bytes in [start, end)'''
+        new = SegmentBuffer()
+        first, last = self._overlapping(start, end)
+        for i in range(first, last):
+            seg_start = self._starts[i]
+            data = self._data[i]
+            lo = max(start, seg_start)
+            hi = min(end, seg_start + len(data))
+            new._starts.append(lo)
+            new._data.append(data[lo - seg_start:hi - seg_start])
+            new._len += hi - lo
+        return new
+
+    def get_memory_size(self):
+        '''Returns the approximate memory footprint of the stored data.'''
+        n = sys.getsizeof(self) + sys.getsizeof(self._starts) + sys.getsizeof(self._data)
+        n += sum(sys.getsizeof(start) for start in self._starts)
+        n += sum(sys.getsizeof(data) for data in self._data)
+        return n
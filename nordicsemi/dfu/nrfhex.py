@@ -26,10 +26,48 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import hashlib
+from collections import namedtuple
+
 from nordicsemi.dfu import intelhex
+from nordicsemi.dfu.crc16 import calc_crc16
 from struct import unpack
 
 
+# Size, CRC16 and SHA-256 digest of a written binary
+BinInfo = namedtuple('BinInfo', ['size', 'crc16', 'sha256'])
+
+
+class BinWriter(object):
+    """
+        File object wrapper that counts the bytes written and computes their CRC16 and SHA-256 on the fly.
+    """
+
+    def __init__(self, fobj):
+        """
+        :param fobj: File object to write to, or None to only count and hash the data
+        """
+        self.fobj = fobj
+        self.size = 0
+        self.crc16 = 0xFFFF
+        self.sha256 = hashlib.sha256()
+
+    def write(self, data):
+        if self.fobj is not None:
+            self.fobj.write(data)
+        self.size += len(data)
+        self.crc16 = calc_crc16(data, self.crc16)
+        self.sha256.update(data)
+
+    def info(self):
+        """
+        Returns the size, CRC16 and SHA-256 of the data written so far.
+
+        :return: BinInfo
+        """
+        return BinInfo(self.size, self.crc16, self.sha256.digest())
+
+
 class nRFHex(intelhex.IntelHex):
     """
         Converts and merges .hex and .bin files into one .bin file.
@@ -44,17 +82,26 @@ class nRFHex(intelhex.IntelHex):
     s1x0_mbr_end_address = 0x1000
     s132_mbr_end_address = 0x3000
 
-    def __init__(self, source, bootloader=None):
+    # Address ranges (start, end exclusive) stripped from every firmware.
+    # FICR starts at 0x10000000 and UICR at 0x10001000, neither is part of the image.
+    removed_regions = ((0x10000000, 0x100000000),)
+
+    def __init__(self, source, bootloader=None, removed_regions=()):
         """
         Constructor that requires a firmware file path.
         Softdevices can take an optional bootloader file path as parameter.
 
         :param str source: The file path for the firmware
         :param str bootloader: Optional file path to bootloader firmware
+        :param removed_regions: Optional address ranges (start, end exclusive) to strip
+            in addition to nRFHex.removed_regions, e.g. the bootloader settings page
         :return: None
         """
         super(nRFHex, self).__init__()
 
+        # (buffer, buffer generation, softdevice variant) of the last detection
+        self._softdevice_variant = None
+
         self.file_format = 'hex'
 
         if source.endswith('.bin'):
@@ -62,19 +109,16 @@ class nRFHex(intelhex.IntelHex):
 
         self.loadfile(source, self.file_format)
 
-        self._removeuicr()
+        self._remove_regions(self.removed_regions + tuple(removed_regions))
 
         self.bootloaderhex = None
 
         if bootloader is not None:
-            self.bootloaderhex = nRFHex(bootloader)
+            self.bootloaderhex = nRFHex(bootloader, removed_regions=removed_regions)
 
-    def _removeuicr(self):
-        uicr_start_address = 0x10000000
-        maxaddress = self.maxaddr()
-        if maxaddress >= uicr_start_address:
-            for i in range(uicr_start_address, maxaddress + 1):
-                self._buf.pop(i, 0)
+    def _remove_regions(self, regions):
+        for start, end in regions:
+            self.delete_range(start, end)
 
     def address_has_magic_number(self, address):
         try:
@@ -85,6 +129,20 @@ class nRFHex(intelhex.IntelHex):
             return False
 
     def get_softdevice_variant(self):
+        """
+        Returns the softdevice variant, detected from the info struct magic number.
+        The result is cached until the data changes.
+
+        :return: str "s1x0", "s132" or "unknown"
+        """
+        cached = self._softdevice_variant
+        if cached is None or cached[0] is not self._buf or cached[1] != self._buf.generation:
+            cached = (self._buf, self._buf.generation, self._detect_softdevice_variant())
+            self._softdevice_variant = cached
+
+        return cached[2]
+
+    def _detect_softdevice_variant(self):
         potential_magic_number_address = nRFHex.info_struct_address_base + nRFHex.info_struct_magic_number_offset
 
         if self.address_has_magic_number(potential_magic_number_address):
@@ -145,24 +203,31 @@ class nRFHex(intelhex.IntelHex):
     def tobinfile(self, fobj, start=None, end=None, pad=None, size=None):
         """
         Writes a binary version of source and bootloader respectivly to fobj which could be a
-        file object or a file path.
+        file object or a file path. The data is streamed segment by segment, and its size, CRC16
+        and SHA-256 are computed while writing.
 
         :param str fobj: File path or object the function writes to
-        :return: None
+        :return: BinInfo of the data written
         """
-        # If there is a bootloader this will make the recursion call use the samme file object.
         if getattr(fobj, "write", None) is None:
             fobj = open(fobj, "wb")
             close_fd = True
         else:
             close_fd = False
 
-        start_address = self.minaddr()
-        size = self.size()
-        super(nRFHex, self).tobinfile(fobj, start=start_address, size=size)
+        writer = BinWriter(fobj)
 
-        if self.bootloaderhex is not None:
-            self.bootloaderhex.tobinfile(fobj)
+        try:
+            self._writebin(writer)
+        finally:
+            if close_fd:
+                fobj.close()
 
-        if close_fd:
-            fobj.close()
+        return writer.info()
+
+    def _writebin(self, writer):
+        # If there is a bootloader it is written right after the source, to the same writer.
+        super(nRFHex, self).tobinfile(writer, start=self.minaddr(), size=self.size())
+
+        if self.bootloaderhex is not None:
+            self.bootloaderhex._writebin(writer)
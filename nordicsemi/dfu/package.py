@@ -158,6 +158,9 @@ class Package(object):
         """
         work_directory = self.__create_temp_workspace()
 
+        # BinInfo of the .bin files written to the work directory, by path
+        bin_infos = {}
+
         if Package._is_bootloader_softdevice_combination(self.firmwares_data):
             # Removing softdevice and bootloader data from dictionary and adding the combined later
             softdevice_fw_data = self.firmwares_data.pop(HexType.SOFTDEVICE)
@@ -170,7 +173,7 @@ class Package(object):
             sd_bl_file_path = os.path.join(work_directory, new_filename)
 
             nrf_hex = nRFHex(softdevice_fw_name, bootloader_fw_name)
-            nrf_hex.tobinfile(sd_bl_file_path)
+            bin_infos[sd_bl_file_path] = nrf_hex.tobinfile(sd_bl_file_path)
 
             softdevice_size = nrf_hex.size()
             bootloader_size = nrf_hex.bootloadersize()
@@ -186,29 +189,33 @@ class Package(object):
 
             # Normalize the firmware file and store it in the work directory
             firmware[FirmwareKeys.BIN_FILENAME] = \
-                Package.normalize_firmware_to_bin(work_directory, firmware[FirmwareKeys.FIRMWARE_FILENAME])
+                Package.normalize_firmware_to_bin(work_directory, firmware[FirmwareKeys.FIRMWARE_FILENAME], bin_infos)
 
-            # Calculate the hash for the .bin file located in the work directory
+            # Size and hashes of the .bin file located in the work directory, computed when it was written
             bin_file_path = os.path.join(work_directory, firmware[FirmwareKeys.BIN_FILENAME])
+            bin_info = bin_infos.get(bin_file_path)
+
+            if bin_info is None:
+                bin_info = Package.calculate_bin_info(bin_file_path)
 
             init_packet_data = firmware[FirmwareKeys.INIT_PACKET_DATA]
 
             if self.dfu_ver <= 0.5:
-                firmware_hash = Package.calculate_crc16(bin_file_path)
+                firmware_hash = bin_info.crc16
                 init_packet_data[PacketField.NORDIC_PROPRIETARY_OPT_DATA_FIRMWARE_CRC16] = firmware_hash
             elif self.dfu_ver == 0.6:
                 init_packet_data[PacketField.NORDIC_PROPRIETARY_OPT_DATA_EXT_PACKET_ID] = INIT_PACKET_USES_CRC16
-                firmware_hash = Package.calculate_crc16(bin_file_path)
+                firmware_hash = bin_info.crc16
                 init_packet_data[PacketField.NORDIC_PROPRIETARY_OPT_DATA_FIRMWARE_CRC16] = firmware_hash
             elif self.dfu_ver == 0.7:
                 init_packet_data[PacketField.NORDIC_PROPRIETARY_OPT_DATA_EXT_PACKET_ID] = INIT_PACKET_USES_HASH
-                init_packet_data[PacketField.NORDIC_PROPRIETARY_OPT_DATA_FIRMWARE_LENGTH] = int(Package.calculate_file_size(bin_file_path))
-                firmware_hash = Package.calculate_sha256_hash(bin_file_path)
+                init_packet_data[PacketField.NORDIC_PROPRIETARY_OPT_DATA_FIRMWARE_LENGTH] = bin_info.size
+                firmware_hash = bin_info.sha256
                 init_packet_data[PacketField.NORDIC_PROPRIETARY_OPT_DATA_FIRMWARE_HASH] = firmware_hash
             elif self.dfu_ver == 0.8:
                 init_packet_data[PacketField.NORDIC_PROPRIETARY_OPT_DATA_EXT_PACKET_ID] = INIT_PACKET_EXT_USES_ECDS
-                firmware_hash = Package.calculate_sha256_hash(bin_file_path)
-                init_packet_data[PacketField.NORDIC_PROPRIETARY_OPT_DATA_FIRMWARE_LENGTH] = int(Package.calculate_file_size(bin_file_path))
+                firmware_hash = bin_info.sha256
+                init_packet_data[PacketField.NORDIC_PROPRIETARY_OPT_DATA_FIRMWARE_LENGTH] = bin_info.size
                 init_packet_data[PacketField.NORDIC_PROPRIETARY_OPT_DATA_FIRMWARE_HASH] = firmware_hash
                 temp_packet = self._create_init_packet(firmware)
                 signer = Signing()
@@ -281,18 +288,40 @@ class Package(object):
 
         :type str firmware_filename:
         """
-        data_buffer = b''
+        crc = 0xffff
+        read_size = 4096
+
+        with open(firmware_filename, 'rb') as firmware_file:
+            while True:
+                data = firmware_file.read(read_size)
+
+                if data:
+                    crc = calc_crc16(data, crc)
+                else:
+                    break
+        return crc
+
+    @staticmethod
+    def calculate_bin_info(firmware_filename):
+        """
+        Calculates size, CRC16 and SHA-256 hash of provided firmware filename in one pass
+
+        :type str firmware_filename:
+        :return: BinInfo
+        """
         read_size = 4096
 
         with open(firmware_filename, 'rb') as firmware_file:
+            writer = BinWriter(None)
+
             while True:
                 data = firmware_file.read(read_size)
 
                 if data:
-                    data_buffer += data
+                    writer.write(data)
                 else:
                     break
-        return calc_crc16(data_buffer, 0xffff)
+        return writer.info()
 
     def create_manifest(self):
         manifest = ManifestGenerator(self.dfu_ver, self.firmwares_data)
@@ -319,14 +348,25 @@ class Package(object):
         return p.generate_packet()
 
     @staticmethod
-    def normalize_firmware_to_bin(work_directory, firmware_path):
+    def normalize_firmware_to_bin(work_directory, firmware_path, bin_infos=None):
+        """
+        Converts the firmware to a .bin file in the work directory, unless it is there already.
+
+        :param str work_directory: Directory to write the .bin file to
+        :param str firmware_path: Path to the .hex or .bin firmware
+        :param dict bin_infos: Optional dict the BinInfo of a written .bin file is stored in, by path
+        :return: str path to the .bin file
+        """
         firmware_filename = os.path.basename(firmware_path)
         new_filename = firmware_filename.replace(".hex", ".bin")
         new_filepath = os.path.join(work_directory, new_filename)
 
         if not os.path.exists(new_filepath):
             temp = nRFHex(firmware_path)
-            temp.tobinfile(new_filepath)
+            bin_info = temp.tobinfile(new_filepath)
+
+            if bin_infos is not None:
+                bin_infos[new_filepath] = bin_info
 
         return new_filepath
 
@@ -0,0 +1,226 @@
+# Copyright (c) 2015, Nordic Semiconductor
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of Nordic Semiconductor ASA nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Python standard library
+import collections
+import concurrent.futures
+import hashlib
+import itertools
+import logging
+import os
+import threading
+
+# Nordic libraries
+from nordicsemi.dfu.dfu_transport_serial import DfuTransportSerial
+from nordicsemi.dfu.wire_image import load_package
+
+logger = logging.getLogger(__name__)
+
+
+def file_sha256(file_path):
+    """
+    Hashes the content of a file.
+
+    :param str file_path: Path to the file
+    :return str: SHA-256 hex digest
+    """
+    sha256 = hashlib.sha256()
+
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha256.update(chunk)
+
+    return sha256.hexdigest()
+
+
+def package_size(package):
+    """
+    Returns the number of bytes a loaded package holds in memory, counting firmware, init packets and compiled frames.
+
+    :param nordicsemi.dfu.dfu.DfuPackage package: Loaded package
+    :return int: Size in bytes
+    """
+    size = sum(len(data) for data in package.files.values())
+
+    for frames in package.compiled_frames.values():
+        size += sum(len(pkt.data) for pkt, _ in frames)
+
+    return size
+
+
+class PackageCache(object):
+    """
+    Loaded DFU packages, shared by the sessions of a long running process.
+
+    Packages are kept by file path, size, modification time and SHA-256, so a package file that is replaced is loaded
+    again. A file is only hashed again when its size or modification time changes. A package whose file changed
+    between hashing and loading is returned but not kept, as it may not match the digest. The least recently used
+    packages are dropped when the packages kept hold more than max_size bytes.
+
+    The cache is thread safe. Packages are loaded outside the cache lock, so a slow load only holds up the sessions
+    waiting for that same package, which share the one load. Packages returned are shared between sessions and must
+    not be closed or modified.
+    """
+
+    DEFAULT_MAX_SIZE = 64 * 1024 * 1024
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE):
+        """
+        :param int max_size: Maximum number of bytes held by the packages kept, see package_size
+        """
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._packages = collections.OrderedDict()
+        self._loading = {}  # key: future of the package being loaded
+        self._digests = {}  # absolute path of the packages kept or loading: (size, mtime in ns, SHA-256 hex digest)
+        self._lock = threading.Lock()
+
+    def get(self, file_path, packet_size=None):
+        """
+        Returns a package, loading it unless it is kept already.
+
+        :param str file_path: Path to a DFU package zip or wire image
+        :param int packet_size: If given, the serial DFU data packets of zip packages are compiled for this packet
+                                size, so sessions with that packet size do not build them
+        :return nordicsemi.dfu.dfu.DfuPackage: The loaded package
+        """
+        key = self._key(file_path) + (packet_size,)
+
+        with self._lock:
+            package = self._packages.get(key)
+
+            if package is not None:
+                self._packages.move_to_end(key)
+                self.hits += 1
+                return package
+
+            loading = self._loading.get(key)
+            if loading is None:
+                self.misses += 1
+                self._loading[key] = concurrent.futures.Future()
+            else:
+                self.hits += 1
+
+        if loading is not None:
+            return loading.result()
+
+        try:
+            package = self._load(file_path, packet_size)
+        except BaseException as e:
+            with self._lock:
+                self._loading.pop(key).set_exception(e)
+                self._forget_digest(key[0])
+            raise
+
+        try:
+            changed = self._stat(key[0]) != key[1:3]
+        except OSError:
+            changed = True
+
+        with self._lock:
+            loading = self._loading.pop(key)
+            size = package_size(package)
+
+            if changed:
+                logger.info("Package %s changed while it was loaded, not kept", file_path)
+            elif size > self.max_size:
+                logger.info("Package %s (%d bytes) is larger than the cache, not kept", file_path, size)
+            else:
+                self._packages[key] = package
+                self.size += size
+                self._evict()
+
+            self._forget_digest(key[0])
+
+        loading.set_result(package)
+        return package
+
+    def _key(self, file_path):
+        # Identifies the content of the file, its digest is kept for as long as its size and modification time stay
+        # the same
+        file_path = os.path.abspath(file_path)
+        stat = self._stat(file_path)
+
+        with self._lock:
+            digest = self._digests.get(file_path)
+
+        if digest is None or digest[:2] != stat:
+            digest = stat + (file_sha256(file_path),)
+
+            # Only remembered if the file did not change while it was hashed
+            if self._stat(file_path) == stat:
+                with self._lock:
+                    self._digests[file_path] = digest
+
+        return (file_path,) + digest
+
+    @staticmethod
+    def _stat(file_path):
+        stat = os.stat(file_path)
+        return stat.st_size, stat.st_mtime_ns
+
+    def _forget_digest(self, file_path):
+        # Called with the lock held. Digests are only kept for files with a package kept or loading.
+        if not any(key[0] == file_path for key in itertools.chain(self._packages, self._loading)):
+            self._digests.pop(file_path, None)
+
+    @staticmethod
+    def _load(file_path, packet_size):
+        package = load_package(file_path)
+
+        if packet_size is not None and package.packet_size is None:
+            for _, firmware_manifest in package.images():
+                package.compiled_frames[firmware_manifest.bin_file] = DfuTransportSerial.encode_frames(
+                    package.firmware(firmware_manifest), packet_size)
+            package.packet_size = packet_size
+
+        return package
+
+    def clear(self):
+        """
+        Drops all packages kept.
+
+        :return:
+        """
+        with self._lock:
+            self._packages.clear()
+            self._digests.clear()
+            self.size = 0
+
+    def __len__(self):
+        with self._lock:
+            return len(self._packages)
+
+    def _evict(self):
+        # Packages are not closed when dropped, sessions may still be sending them
+        while self.size > self.max_size:
+            key, package = self._packages.popitem(last=False)
+            self.size -= package_size(package)
+            self._forget_digest(key[0])
@@ -0,0 +1,135 @@
+# Copyright (c) 2015, Nordic Semiconductor
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of Nordic Semiconductor ASA nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Python standard library
+import logging
+import os
+import time
+
+# Python 3rd party imports
+from serial.tools import list_ports
+
+logger = logging.getLogger(__name__)
+
+
+def find_port(device):
+    """
+    Looks up a serial port among the ports enumerated by the operating system.
+
+    :param str device: Port name, e.g. /dev/ttyACM0 or COM3
+    :return: serial.tools.list_ports_common.ListPortInfo of the port, or None if it is not enumerated
+    """
+    for port in list_ports.comports():
+        if port.device == device:
+            return port
+
+    return None
+
+
+def _is_accessible(device):
+    # Device nodes can show up before udev has given them their final permissions
+    return not os.path.exists(device) or os.access(device, os.R_OK | os.W_OK)
+
+
+class PortWatcher(object):
+    """
+    Follows a USB serial port while the device behind it re-enumerates.
+
+    A device that resets into its bootloader disappears and comes back, on Linux often under a different node. The
+    port is recognized again by its USB serial number, or by its name if it has none. Ports the operating system
+    does not enumerate, e.g. pseudo-terminals, cannot be watched.
+    """
+
+    POLL_INTERVAL = 0.02
+
+    def __init__(self, device):
+        """
+        :param str device: Port name the device is connected to now
+        """
+        self.device = device
+        port = find_port(device)
+        self.watchable = port is not None
+        self.serial_number = port.serial_number if port is not None else None
+
+    def find(self):
+        """
+        Looks for the watched device among the enumerated ports.
+
+        :return str: Port name of the device, or None if it is not enumerated
+        """
+        for port in list_ports.comports():
+            if self.serial_number is not None:
+                if port.serial_number == self.serial_number:
+                    return port.device
+            elif port.device == self.device:
+                return port.device
+
+        return None
+
+    def wait_for_removal(self, timeout):
+        """
+        Waits until the device is no longer enumerated.
+
+        :param float timeout: Maximum time to wait in seconds
+        :return bool: True if the device went away, False on timeout or if the port cannot be watched
+        """
+        if not self.watchable:
+            return False
+
+        deadline = time.monotonic() + timeout
+
+        while self.find() is not None:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(PortWatcher.POLL_INTERVAL)
+
+        return True
+
+    def wait_for_arrival(self, timeout):
+        """
+        Waits until the device is enumerated again.
+
+        :param float timeout: Maximum time to wait in seconds
+        :return str: Port name of the device, or None on timeout or if the port cannot be watched
+        """
+        if not self.watchable:
+            return None
+
+        deadline = time.monotonic() + timeout
+
+        while True:
+            device = self.find()
+            if device is not None and _is_accessible(device):
+                if device != self.device:
+                    logger.info("%s came back as %s", self.device, device)
+                self.device = device
+                return device
+
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(PortWatcher.POLL_INTERVAL)
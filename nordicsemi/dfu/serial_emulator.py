@@ -0,0 +1,331 @@
+# Copyright (c) 2015, Nordic Semiconductor
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of Nordic Semiconductor ASA nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Emulator of the legacy serial DFU bootloader on a pseudo-terminal, for testing without hardware."""
+
+# Python standard library
+import logging
+import os
+import random
+import select
+import struct
+import threading
+import time
+import tty
+
+# Nordic libraries
+from nordicsemi.dfu import crc16
+from nordicsemi.dfu.dfu_transport_serial import SlipReader, DFU_INIT_PACKET, DFU_START_PACKET, DFU_DATA_PACKET, \
+    DFU_STOP_DATA_PACKET
+from nordicsemi.exceptions import NordicSemiException
+
+logger = logging.getLogger(__name__)
+
+
+class EmulatedImage(object):
+    """ A firmware image received by the emulator. """
+
+    def __init__(self, mode, softdevice_size, bootloader_size, app_size):
+        self.mode = mode
+        self.softdevice_size = softdevice_size
+        self.bootloader_size = bootloader_size
+        self.app_size = app_size
+        self.init_packet = None
+        self.firmware = bytearray()
+        self.complete = False
+
+    @property
+    def size(self):
+        return self.softdevice_size + self.bootloader_size + self.app_size
+
+
+class SerialDfuEmulator(object):
+    """
+    Emulates the serial DFU bootloader on one end of a pseudo-terminal pair.
+
+    Point DfuTransportSerial at the port attribute. Frames are SLIP decoded, checked against their CRC16 and
+    acknowledged like the bootloader's three-wire UART layer does. Page erases after the start packet and page writes
+    during the data transfer keep the emulated device busy for the configured times.
+
+    While busy, incoming data is either held back until the device is done, like a USB CDC port does, or dropped,
+    like a hardware UART without flow control does.
+
+    A pseudo-terminal cannot carry DTR, so a start packet with sequence number 1 is taken as the device having been
+    reset into DFU mode.
+    """
+
+    FLASH_PAGE_SIZE = 4096
+
+    # Default timings of a nRF52840
+    DEFAULT_PAGE_ERASE_TIME = 0.085
+    DEFAULT_WORD_WRITE_TIME = 0.000041
+
+    BUSY_DELAY = 'delay'
+    BUSY_DROP = 'drop'
+
+    def __init__(self, page_erase_time=DEFAULT_PAGE_ERASE_TIME, word_write_time=DEFAULT_WORD_WRITE_TIME,
+                 busy=BUSY_DELAY, drop_rate=0.0, corrupt_rate=0.0, seed=None, baud_rate=None, drop_frames=(),
+                 boot_banner=None, activation_time=0.0):
+        """
+        :param float page_erase_time: Time the device is busy erasing one flash page
+        :param float word_write_time: Time the device is busy writing one 32-bit word
+        :param str busy: BUSY_DELAY to hold back data received while busy, BUSY_DROP to drop it
+        :param float drop_rate: Probability of ignoring a received frame
+        :param float corrupt_rate: Probability of corrupting a received frame before the CRC check
+        :param seed: Seed for the random drops and corruption
+        :param int baud_rate: Line speed to simulate, data arrives as fast as it is written if not given
+        :param drop_frames: Numbers of the received frames to ignore, counting from 1
+        :param bytes boot_banner: Written to the port when the emulated firmware starts after a completed transfer
+        :param float activation_time: Time from the data stop packet until the emulated firmware starts
+        """
+        if not hasattr(os, 'openpty'):
+            raise NordicSemiException("Serial DFU emulator needs pseudo-terminal support")
+
+        self.page_erase_time = page_erase_time
+        self.word_write_time = word_write_time
+        self.busy = busy
+        self.drop_rate = drop_rate
+        self.corrupt_rate = corrupt_rate
+        self.random = random.Random(seed)
+        self.baud_rate = baud_rate
+        self.drop_frames = set(drop_frames)
+        self.boot_banner = boot_banner
+        self.activation_time = activation_time
+        self.boot_time = None
+
+        self.master_fd = None
+        self.slave_fd = None
+        self.port = None
+        self.thread = None
+        self.running = False
+
+        self.reader = SlipReader()
+        self.expected_sequence_number = 1
+        self.busy_until = 0.0
+        self.images = []
+
+        self.frames_received = 0
+        self.frames_dropped = 0
+        self.crc_errors = 0
+        self.duplicates = 0
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def start(self):
+        """
+        Opens the pseudo-terminal pair and starts answering on it.
+
+        :return:
+        """
+        self.master_fd, self.slave_fd = os.openpty()
+        tty.setraw(self.slave_fd)
+        # Keeping the slave end open keeps the master readable while the transport reopens the port
+        self.port = os.ttyname(self.slave_fd)
+
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="SerialDfuEmulator {0}".format(self.port))
+        self.thread.daemon = True
+        self.thread.start()
+
+        logger.info("Emulating serial DFU bootloader on %s", self.port)
+
+    def stop(self):
+        """
+        Stops answering and closes the pseudo-terminal pair.
+
+        :return:
+        """
+        self.running = False
+
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+        for fd in (self.master_fd, self.slave_fd):
+            if fd is not None:
+                os.close(fd)
+
+        self.master_fd = None
+        self.slave_fd = None
+
+    def reboot(self):
+        """
+        Restarts the emulated bootloader, it waits for a new transfer afterwards.
+
+        :return:
+        """
+        self.expected_sequence_number = 1
+        self.busy_until = 0.0
+
+    @property
+    def current_image(self):
+        return self.images[-1] if self.images else None
+
+    def _run(self):
+        while self.running:
+            readable, _, _ = select.select([self.master_fd], [], [], 0.01)
+
+            if self.boot_time is not None and time.monotonic() >= self.boot_time:
+                self.boot_time = None
+                os.write(self.master_fd, self.boot_banner)
+
+            if not readable:
+                continue
+
+            try:
+                data = os.read(self.master_fd, 4096)
+            except OSError:
+                continue
+
+            if self.baud_rate:
+                # 8N1, ten bits on the line for every byte
+                time.sleep(len(data) * 10.0 / self.baud_rate)
+
+            now = time.monotonic()
+            if now < self.busy_until:
+                if self.busy == SerialDfuEmulator.BUSY_DROP:
+                    logger.debug("Busy, dropping %d bytes", len(data))
+                    continue
+
+                time.sleep(self.busy_until - now)
+
+            for frame in self.reader.feed(data):
+                self._handle_frame(frame)
+
+    def _handle_frame(self, frame):
+        self.frames_received += 1
+
+        if self.random.random() < self.drop_rate or self.frames_received in self.drop_frames:
+            self.frames_dropped += 1
+            return
+
+        if len(frame) > 4 and self.random.random() < self.corrupt_rate:
+            frame = bytearray(frame)
+            frame[self.random.randrange(4, len(frame))] ^= 0xFF
+
+        if len(frame) < 6 or crc16.calc_crc16(frame[:-2]) != struct.unpack('<H', frame[-2:])[0]:
+            self.crc_errors += 1
+            self._send_ack()
+            return
+
+        sequence_number = frame[0] & 0x07
+        payload = memoryview(frame)[4:-2]
+
+        if sequence_number == 1 and self._packet_type(payload) == DFU_START_PACKET:
+            # Host reset the device into DFU mode
+            self.expected_sequence_number = 1
+
+        if sequence_number != self.expected_sequence_number:
+            self.duplicates += 1
+            self._send_ack()
+            return
+
+        self.expected_sequence_number = (self.expected_sequence_number + 1) % 8
+        self._send_ack()
+        self._handle_packet(payload)
+
+    @staticmethod
+    def _packet_type(payload):
+        if len(payload) < 4:
+            return None
+
+        return struct.unpack('<I', payload[:4])[0]
+
+    def _send_ack(self):
+        header = [self.expected_sequence_number << 3, 0, 0]
+        header.append((~sum(header) + 1) & 0xFF)
+        os.write(self.master_fd, bytes([0xC0] + header + [0xC0]))
+
+    def _handle_packet(self, payload):
+        packet_type = self._packet_type(payload)
+
+        if packet_type == DFU_START_PACKET:
+            mode, softdevice_size, bootloader_size, app_size = struct.unpack('<IIII', payload[4:20])
+            image = EmulatedImage(mode, softdevice_size, bootloader_size, app_size)
+            self.images.append(image)
+
+            pages = (image.size // SerialDfuEmulator.FLASH_PAGE_SIZE) + 1
+            self.busy_until = time.monotonic() + pages * self.page_erase_time
+
+        elif packet_type == DFU_INIT_PACKET and self.current_image is not None:
+            # Init packet is followed by two bytes of padding
+            self.current_image.init_packet = bytes(payload[4:-2])
+
+        elif packet_type == DFU_DATA_PACKET and self.current_image is not None:
+            image = self.current_image
+            previous_pages = len(image.firmware) // SerialDfuEmulator.FLASH_PAGE_SIZE
+            image.firmware += payload[4:]
+
+            if len(image.firmware) // SerialDfuEmulator.FLASH_PAGE_SIZE > previous_pages:
+                self._write_page()
+
+        elif packet_type == DFU_STOP_DATA_PACKET and self.current_image is not None:
+            self.current_image.complete = True
+            self._write_page()
+
+            if self.boot_banner is not None:
+                self.boot_time = self.busy_until + self.activation_time
+
+        else:
+            logger.warning("Ignoring packet of type %s", packet_type)
+
+    def _write_page(self):
+        words = SerialDfuEmulator.FLASH_PAGE_SIZE // 4
+        self.busy_until = time.monotonic() + words * self.word_write_time
+
+
+if __name__ == '__main__':
+    import click
+
+    @click.command()
+    @click.option('--page-erase-time', type=click.FLOAT, default=SerialDfuEmulator.DEFAULT_PAGE_ERASE_TIME,
+                  help='Time to erase one flash page in seconds')
+    @click.option('--word-write-time', type=click.FLOAT, default=SerialDfuEmulator.DEFAULT_WORD_WRITE_TIME,
+                  help='Time to write one 32-bit word in seconds')
+    @click.option('--busy', type=click.Choice([SerialDfuEmulator.BUSY_DELAY, SerialDfuEmulator.BUSY_DROP]),
+                  default=SerialDfuEmulator.BUSY_DELAY, help='What happens to data received while busy')
+    @click.option('--drop-rate', type=click.FLOAT, default=0.0, help='Probability of ignoring a frame')
+    @click.option('--corrupt-rate', type=click.FLOAT, default=0.0, help='Probability of corrupting a frame')
+    def main(page_erase_time, word_write_time, busy, drop_rate, corrupt_rate):
+        """Runs the emulator until interrupted."""
+        logging.basicConfig(format='%(message)s', level=logging.INFO)
+
+        with SerialDfuEmulator(page_erase_time, word_write_time, busy, drop_rate, corrupt_rate) as emulator:
+            click.echo("Serial DFU bootloader emulated on {0}".format(emulator.port))
+            try:
+                while True:
+                    time.sleep(1)
+            except KeyboardInterrupt:
+                pass
+
+    main()
@@ -0,0 +1,182 @@
+# Copyright (c) 2015, Nordic Semiconductor
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of Nordic Semiconductor ASA nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Python standard library
+import bisect
+import collections
+import contextlib
+import json
+import time
+
+
+class LatencyHistogram(object):
+    """ Histogram of latencies with fixed, roughly logarithmic buckets. """
+
+    # Upper bounds of the buckets in seconds, the last bucket has no upper bound
+    BUCKETS = [0.0001, 0.0002, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0]
+
+    def __init__(self):
+        self.counts = [0] * (len(LatencyHistogram.BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, seconds):
+        self.counts[bisect.bisect_left(LatencyHistogram.BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = seconds if self.max is None else max(self.max, seconds)
+
+    def to_dict(self):
+        buckets = collections.OrderedDict()
+        for bound, count in zip(LatencyHistogram.BUCKETS + [None], self.counts):
+            buckets["<={0}".format(bound) if bound is not None else "inf"] = count
+
+        return collections.OrderedDict([
+            ("count", self.count),
+            ("mean", self.total / self.count if self.count else None),
+            ("min", self.min),
+            ("max", self.max),
+            ("buckets", buckets),
+        ])
+
+
+class SessionReport(object):
+    """
+    Collects timing spans, latency histograms and counters of a DFU session.
+
+    Times are in seconds relative to the creation of the report. If an event stream is set, every span start, span
+    end and counter update is also written to it as one JSON object per line.
+    """
+
+    def __init__(self, event_stream=None):
+        """
+        :param event_stream: Text file object for JSON lines events, or None
+        """
+        self.event_stream = event_stream
+        self.start_time = time.monotonic()
+        self.spans = []
+        self.histograms = collections.OrderedDict()
+        self.counters = collections.OrderedDict()
+
+    def now(self):
+        return time.monotonic() - self.start_time
+
+    @contextlib.contextmanager
+    def span(self, name, **attributes):
+        """
+        Context manager timing a phase of the session.
+
+        :param str name: Name of the phase
+        :param attributes: Extra values stored with the span
+        """
+        start = self.now()
+        self._emit("span_start", name=name, **attributes)
+        error = None
+
+        try:
+            yield
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            duration = self.now() - start
+            span = collections.OrderedDict([("name", name), ("start", start), ("duration", duration)])
+            span.update(attributes)
+            if error is not None:
+                span["error"] = error
+            self.spans.append(span)
+            self._emit("span_end", name=name, duration=duration, **attributes)
+
+    def record_latency(self, name, seconds):
+        """
+        Adds a latency sample to a histogram.
+
+        :param str name: Name of the histogram
+        :param float seconds: Latency
+        :return:
+        """
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = LatencyHistogram()
+
+        histogram.add(seconds)
+
+    def count(self, name, increment=1):
+        """
+        Increments a counter.
+
+        :param str name: Name of the counter
+        :param int increment: Amount to add
+        :return:
+        """
+        self.counters[name] = self.counters.get(name, 0) + increment
+        self._emit("counter", name=name, value=self.counters[name])
+
+    def phase_totals(self):
+        """
+        Sums the duration of the spans by name.
+
+        :return dict: Total duration per span name, in order of first appearance
+        """
+        totals = collections.OrderedDict()
+        for span in sorted(self.spans, key=lambda s: s["start"]):
+            totals[span["name"]] = totals.get(span["name"], 0.0) + span["duration"]
+
+        return totals
+
+    def to_dict(self):
+        return collections.OrderedDict([
+            ("duration", self.now()),
+            ("phases", self.phase_totals()),
+            ("spans", sorted(self.spans, key=lambda s: s["start"])),
+            ("histograms", collections.OrderedDict((name, histogram.to_dict())
+                                                   for name, histogram in self.histograms.items())),
+            ("counters", self.counters),
+        ])
+
+    def write(self, path):
+        """
+        Writes the report as JSON.
+
+        :param str path: Path of the report file
+        :return:
+        """
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=4)
+
+    def _emit(self, event, **values):
+        if self.event_stream is None:
+            return
+
+        record = collections.OrderedDict([("time", self.now()), ("event", event)])
+        record.update(values)
+        self.event_stream.write(json.dumps(record) + "\n")
+        self.event_stream.flush()
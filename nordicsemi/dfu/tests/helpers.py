@@ -0,0 +1,66 @@
+# Copyright (c) 2015, Nordic Semiconductor
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of Nordic Semiconductor ASA nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Helpers shared by the DFU tests."""
+
+import os
+import zipfile
+
+from nordicsemi.dfu.package import Package
+
+FIRMWARES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "firmwares")
+
+
+def create_package(work_directory, name="package.zip", **firmwares):
+    """
+    Generates a DFU package from firmwares of the test firmwares directory.
+
+    :param str work_directory: Directory to create the package in
+    :param str name: File name of the package
+    :param firmwares: Package arguments with the file names of the firmwares, app_fw="bar.hex" if none are given
+    :return str: Path to the package
+    """
+    if not firmwares:
+        firmwares = {'app_fw': "bar.hex"}
+
+    package_path = os.path.join(work_directory, name)
+    Package(**{key: os.path.join(FIRMWARES, file_name)
+               for key, file_name in firmwares.items()}).generate_package(package_path)
+    return package_path
+
+
+def read_firmware(package_path, name="bar.bin"):
+    """
+    Reads a firmware image as stored in a DFU package.
+
+    :param str package_path: Path to the package
+    :param str name: File name of the image in the package
+    :return bytes: The image
+    """
+    with zipfile.ZipFile(package_path) as package:
+        return package.read(name)
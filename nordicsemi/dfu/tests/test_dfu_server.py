@@ -0,0 +1,175 @@
+# Copyright (c) 2015, Nordic Semiconductor
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of Nordic Semiconductor ASA nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from nordicsemi.dfu.dfu_server import DfuJob, DfuServer, JsonRpcError
+from nordicsemi.dfu.serial_emulator import SerialDfuEmulator
+from nordicsemi.dfu.tests.helpers import create_package, read_firmware
+from nordicsemi.exceptions import NordicSemiException
+
+
+class TestDfuServer(unittest.TestCase):
+    def setUp(self):
+        self.work_directory = tempfile.mkdtemp(prefix="nrf_dfu_tests_")
+        self.server = DfuServer(jobs=1)
+
+    def tearDown(self):
+        self.server.shutdown()
+        shutil.rmtree(self.work_directory, ignore_errors=True)
+
+    def call(self, method, **params):
+        return list(self.server.handle({"jsonrpc": "2.0", "id": 1, "method": method, "params": params}))
+
+    def test_errors(self):
+        self.assertEqual(JsonRpcError.METHOD_NOT_FOUND, self.call("flash")[0]["error"]["code"])
+        self.assertEqual(JsonRpcError.INVALID_PARAMS, self.call("status")[0]["error"]["code"])
+        self.assertEqual(JsonRpcError.INVALID_PARAMS, self.call("submit", package="package.zip")[0]["error"]["code"])
+        self.assertEqual(JsonRpcError.SERVER_ERROR, self.call("status", job=1)[0]["error"]["code"])
+        self.assertEqual(JsonRpcError.INVALID_REQUEST, list(self.server.handle([]))[0]["error"]["code"])
+
+        package_path = create_package(self.work_directory)
+        self.assertRaises(NordicSemiException, self.server.submit, package_path, "COM1", speed=1)
+        self.assertRaises(NordicSemiException, self.server.submit, "missing.zip", "COM1")
+
+    def test_unexpected_error(self):
+        for error in (OSError("Device busy"), KeyError("port")):
+            with mock.patch.object(DfuServer, 'list_ports', side_effect=error):
+                responses = self.call("list_ports")
+
+            self.assertEqual(1, len(responses))
+            self.assertEqual(1, responses[0]["id"])
+            self.assertEqual(JsonRpcError.SERVER_ERROR, responses[0]["error"]["code"])
+            self.assertIn(type(error).__name__, responses[0]["error"]["message"])
+
+    def test_job_published_with_future(self):
+        package_path = create_package(self.work_directory)
+        executor_submit = self.server.executor.submit
+
+        def submit(fn, job):
+            # Cancel and shutdown must not find the job before it has its future
+            self.assertNotIn(job.id, self.server.jobs)
+            return executor_submit(fn, job)
+
+        with mock.patch.object(self.server.executor, 'submit', side_effect=submit):
+            job = self.server.submit(package_path, os.path.join(self.work_directory, "missing"))
+
+        self.assertIs(job, self.server.job(job.id))
+        self.assertIsNotNone(job.future)
+
+    def test_failed_job(self):
+        package_path = create_package(self.work_directory)
+
+        job = self.call("submit", package=package_path, port=os.path.join(self.work_directory, "missing"))[0]["result"]
+        responses = self.call("progress", job=job["job"])
+
+        self.assertEqual("progress", responses[-2]["method"])
+        self.assertEqual(DfuJob.FAILED, responses[-1]["result"]["state"])
+        self.assertIn("could not be opened", responses[-1]["result"]["error"])
+
+    @unittest.skipUnless(hasattr(os, 'openpty'), 'Serial DFU emulator needs pseudo-terminals')
+    def test_jobs(self):
+        package_path = create_package(self.work_directory)
+        firmware = read_firmware(package_path)
+
+        with SerialDfuEmulator(page_erase_time=0.001, word_write_time=0.000001) as emulator:
+            first = self.server.submit(package_path, emulator.port, single_bank=True)
+            second = self.server.submit(package_path, emulator.port, single_bank=True)
+
+            # Only one job runs at a time, the second one is cancelled before it starts
+            self.assertTrue(self.server.cancel(second.id))
+
+            responses = self.call("progress", job=first.id)
+            progress = [response["params"]["progress"] for response in responses[:-1]]
+            self.assertEqual(sorted(progress), progress)
+            self.assertEqual(DfuJob.DONE, responses[-1]["result"]["state"])
+            self.assertEqual(100, responses[-1]["result"]["progress"])
+
+            self.assertEqual(DfuJob.CANCELLED, self.server.job(second.id).state)
+            self.assertFalse(self.server.cancel(second.id))
+
+            self.assertEqual(firmware, emulator.images[0].firmware)
+            self.assertEqual(1, len(emulator.images))
+            self.assertEqual(1, self.server.cache.misses)
+
+    @unittest.skipUnless(hasattr(os, 'openpty'), 'Serial DFU emulator needs pseudo-terminals')
+    def test_cancel_running_job(self):
+        package_path = create_package(self.work_directory)
+
+        with SerialDfuEmulator(page_erase_time=0.001, word_write_time=0.0001) as emulator:
+            job = self.server.submit(package_path, emulator.port, single_bank=True)
+            cancelled = False
+
+            for response in self.server.handle({"jsonrpc": "2.0", "id": 1, "method": "progress",
+                                                "params": {"job": job.id}}):
+                if not cancelled and response.get("params", {}).get("progress", 0) > 0:
+                    cancelled = self.server.cancel(job.id)
+
+            self.assertTrue(cancelled)
+            self.assertEqual(DfuJob.CANCELLED, response["result"]["state"])
+            self.assertFalse(emulator.images[0].complete)
+
+    @unittest.skipUnless(hasattr(socket, 'AF_UNIX'), 'Needs Unix sockets')
+    def test_unix_socket(self):
+        address = os.path.join(self.work_directory, "nrfutil.sock")
+        server = self.server.create_socket_server(address)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+
+        try:
+            client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            client.connect(address)
+            stream = client.makefile('rwb')
+
+            stream.write(b'{"jsonrpc": "2.0", "id": 7, "method": "list_ports"}\n')
+            stream.write(b'not json\n')
+            stream.flush()
+
+            response = json.loads(stream.readline().decode('utf-8'))
+            self.assertEqual(7, response["id"])
+            self.assertIsInstance(response["result"], list)
+
+            response = json.loads(stream.readline().decode('utf-8'))
+            self.assertEqual(JsonRpcError.PARSE_ERROR, response["error"]["code"])
+
+            stream.close()
+            client.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+# Copyright (c) 2015, Nordic Semiconductor
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of Nordic Semiconductor ASA nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from nordicsemi.dfu.dfu import Dfu, DfuPackage
+from nordicsemi.dfu.dfu_transport import DfuTransport
+from nordicsemi.dfu.dfu_session import expand_ports, run_serial_sessions
+from nordicsemi.dfu.model import HexType
+from nordicsemi.dfu.tests.helpers import create_package, read_firmware
+from nordicsemi.exceptions import NordicSemiException
+
+
+class RecordingTransport(DfuTransport):
+    """
+    Minimal transport that only records the calls made to it.
+    """
+    def __init__(self):
+        super(RecordingTransport, self).__init__()
+        self.opened = False
+        self.calls = []
+
+    def open(self):
+        self.calls.append("open")
+        self.opened = True
+
+    def close(self):
+        self.calls.append("close")
+        self.opened = False
+
+    def is_open(self):
+        return self.opened
+
+    def send_start_dfu(self, program_mode, softdevice_size=0, bootloader_size=0, app_size=0):
+        self.calls.append("start")
+
+    def send_init_packet(self, init_packet):
+        self.calls.append("init")
+
+    def send_firmware(self, firmware):
+        self.calls.append("firmware")
+
+    def send_validate_firmware(self):
+        self.calls.append("validate")
+
+    def send_activate_firmware(self):
+        self.calls.append("activate")
+
+
+class TestDfuSession(unittest.TestCase):
+    def setUp(self):
+        self.work_directory = tempfile.mkdtemp(prefix="nrf_dfu_tests_")
+
+    def tearDown(self):
+        shutil.rmtree(self.work_directory, ignore_errors=True)
+
+    def test_expand_ports(self):
+        for name in ("ttyACM1", "ttyACM0", "ttyUSB0"):
+            open(os.path.join(self.work_directory, name), 'w').close()
+
+        port_list = os.path.join(self.work_directory, "ports.txt")
+        with open(port_list, 'w') as f:
+            f.write("# jig A\n\n{0}\nCOM3\n".format(os.path.join(self.work_directory, "ttyUSB*")))
+
+        ports = expand_ports([os.path.join(self.work_directory, "ttyACM*"), "COM3"], port_list)
+
+        self.assertEqual([os.path.join(self.work_directory, "ttyACM0"),
+                          os.path.join(self.work_directory, "ttyACM1"),
+                          "COM3",
+                          os.path.join(self.work_directory, "ttyUSB0")], ports)
+
+    def test_package_is_loaded_once(self):
+        package = DfuPackage(create_package(self.work_directory))
+
+        images = package.images()
+        self.assertEqual(1, len(images))
+        self.assertEqual(HexType.APPLICATION, images[0][0])
+        self.assertGreater(len(package.firmware(images[0][1])), 0)
+        self.assertGreater(len(package.init_packet(images[0][1])), 0)
+
+    def test_package_is_read_in_memory(self):
+        package_path = create_package(self.work_directory)
+        firmware = read_firmware(package_path)
+
+        with mock.patch('tempfile.mkdtemp', side_effect=AssertionError("package extracted to disk")):
+            with DfuPackage(package_path) as package:
+                firmware_manifest = package.images()[0][1]
+                self.assertEqual(firmware, package.firmware(firmware_manifest))
+
+        self.assertEqual({}, package.files)
+
+    def test_invalid_package(self):
+        not_a_zip = os.path.join(self.work_directory, "package.zip")
+        with open(not_a_zip, 'w') as f:
+            f.write("not a zip")
+
+        self.assertRaises(NordicSemiException, DfuPackage, not_a_zip)
+        self.assertRaises(NordicSemiException, DfuPackage, os.path.join(self.work_directory, "missing.zip"))
+
+    def test_generic_transport(self):
+        transport = RecordingTransport()
+        dfu = Dfu(create_package(self.work_directory), transport)
+
+        with mock.patch('nordicsemi.dfu.dfu_transport.time.sleep') as sleep:
+            dfu.dfu_send_images()
+
+        self.assertEqual(["open", "start", "init", "firmware", "validate", "activate", "close"], transport.calls)
+        sleep.assert_called_once_with(0)
+
+    def test_failed_ports_are_reported(self):
+        package = DfuPackage(create_package(self.work_directory))
+        ports = [os.path.join(self.work_directory, "missing{0}".format(i)) for i in range(3)]
+
+        results = run_serial_sessions(package, ports, jobs=2)
+
+        self.assertEqual(ports, [result.port for result in results])
+        for result in results:
+            self.assertFalse(result.success)
+            self.assertIn("could not be opened", result.error)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,155 @@
+# Copyright (c) 2015, Nordic Semiconductor
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of Nordic Semiconductor ASA nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from nordicsemi.dfu.dfu import DfuPackage
+from nordicsemi.dfu.dfu_session import DfuSessionResult
+from nordicsemi.dfu.dfu_station import DfuStation, StationDevice
+from nordicsemi.dfu.serial_emulator import SerialDfuEmulator
+from nordicsemi.dfu.tests.helpers import create_package
+from nordicsemi.dfu.tests.test_port_watcher import create_port
+
+
+def create_usb_port(device, serial_number=None, vid=0x239A, pid=0x0029, description="Feather nRF52840"):
+    port = create_port(device, serial_number)
+    port.vid = vid
+    port.pid = pid
+    port.description = description
+    return port
+
+
+class TestDfuStation(unittest.TestCase):
+    def setUp(self):
+        self.work_directory = tempfile.mkdtemp(prefix="nrf_dfu_tests_")
+        self.package = DfuPackage(create_package(self.work_directory))
+
+    def tearDown(self):
+        self.package.close()
+        shutil.rmtree(self.work_directory, ignore_errors=True)
+
+    def test_matches(self):
+        port = create_usb_port('/dev/ttyACM0')
+
+        self.assertTrue(DfuStation(self.package).matches(port))
+        self.assertTrue(DfuStation(self.package, vid=0x239A, pid=0x0029).matches(port))
+        self.assertFalse(DfuStation(self.package, vid=0x239A, pid=0x0071).matches(port))
+        self.assertFalse(DfuStation(self.package, vid=0x1915).matches(port))
+        self.assertTrue(DfuStation(self.package, name='/dev/ttyACM*').matches(port))
+        self.assertTrue(DfuStation(self.package, name='Feather*').matches(port))
+        self.assertFalse(DfuStation(self.package, name='/dev/ttyUSB*').matches(port))
+
+    def test_devices_are_programmed_once(self):
+        ports = [create_usb_port('/dev/ttyS0', vid=None, pid=None), create_usb_port('/dev/ttyACM0', 'ABC')]
+        station = DfuStation(self.package, vid=0x239A)
+
+        with mock.patch('serial.tools.list_ports.comports', return_value=ports), \
+                mock.patch.object(station.executor, 'submit') as submit:
+            self.assertEqual(['ABC'], [device.key for device in station.poll()])
+
+            # The device re-enumerates under a new name while it is programmed
+            ports[1] = create_usb_port('/dev/ttyACM1', 'ABC')
+            self.assertEqual([], station.poll())
+
+            ports.append(create_usb_port('/dev/ttyACM2'))
+            self.assertEqual(['/dev/ttyACM2'], [device.key for device in station.poll()])
+            self.assertEqual(2, submit.call_count)
+
+    @mock.patch.object(DfuStation, 'FORGET_TIME', 0.0)
+    def test_unplugged_devices_are_forgotten(self):
+        ports = [create_usb_port('/dev/ttyACM0', 'ABC')]
+        station = DfuStation(self.package)
+
+        with mock.patch('serial.tools.list_ports.comports', return_value=ports), \
+                mock.patch.object(station.executor, 'submit'):
+            device, = station.poll()
+            device.state = StationDevice.DONE
+            self.assertEqual([], station.poll())
+
+            del ports[:]
+            station.poll()
+            self.assertEqual({}, station.devices)
+
+    def test_recording_errors_are_logged(self):
+        log_file = os.path.join(self.work_directory, "missing", "results.jsonl")
+        result_callback = mock.Mock(side_effect=ValueError("callback bug"))
+        station = DfuStation(self.package, log_file=log_file, result_callback=result_callback)
+        device = StationDevice('ABC', create_usb_port('/dev/ttyACM0', 'ABC'))
+
+        with mock.patch('nordicsemi.dfu.dfu_station.run_serial_session',
+                        return_value=DfuSessionResult('/dev/ttyACM0', success=True)), \
+                self.assertLogs('nordicsemi.dfu.dfu_station', 'ERROR') as logs:
+            station._program(device)
+
+        self.assertEqual(StationDevice.DONE, device.state)
+        result_callback.assert_called_once_with(device)
+        self.assertEqual(2, len(logs.records))
+        self.assertIn("Could not log the result of ABC", logs.output[0])
+        self.assertIn("Result callback failed for ABC", logs.output[1])
+        self.assertTrue(all(record.exc_info for record in logs.records))
+
+    @unittest.skipUnless(hasattr(os, 'openpty'), 'Serial DFU emulator needs pseudo-terminals')
+    def test_run(self):
+        log_file = os.path.join(self.work_directory, "results.jsonl")
+        results = []
+        stop = threading.Event()
+
+        def result_callback(device):
+            results.append(device)
+            if len(results) == 2:
+                stop.set()
+
+        with SerialDfuEmulator(page_erase_time=0.001, word_write_time=0.000001) as first, \
+                SerialDfuEmulator(page_erase_time=0.001, word_write_time=0.000001) as second:
+            ports = [create_usb_port(first.port, 'A'), create_usb_port(second.port, 'B'),
+                     create_usb_port(os.path.join(self.work_directory, "missing"), 'C', pid=0x8029)]
+            station = DfuStation(self.package, pid=0x0029, jobs=2, log_file=log_file,
+                                 result_callback=result_callback, single_bank=True)
+
+            with mock.patch('serial.tools.list_ports.comports', return_value=ports), \
+                    mock.patch.object(DfuStation, 'POLL_INTERVAL', 0.01):
+                station.run(stop)
+
+            self.assertTrue(first.images[0].complete)
+            self.assertTrue(second.images[0].complete)
+
+        with open(log_file) as f:
+            records = [json.loads(line) for line in f]
+
+        self.assertEqual(['A', 'B'], sorted(record["serial_number"] for record in records))
+        self.assertTrue(all(record["success"] for record in records))
+        self.assertEqual(0x0029, records[0]["pid"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -29,6 +29,7 @@
 import logging
 import os
 import unittest
+from unittest import mock
 
 # Nordic Semiconductor imports
 import sys
@@ -36,7 +37,10 @@ from nordicsemi.dfu.dfu_transport import DfuEvent
 from nordicsemi.dfu import crc16
 from nordicsemi.dfu.init_packet import PacketField, Packet
 from nordicsemi.dfu.model import HexType
-from nordicsemi.dfu.dfu_transport_serial import DfuTransportSerial
+from nordicsemi.dfu.dfu_transport_serial import DfuTransportSerial, HciLink, HciPacket, SlipReader, \
+    TransferCheckpoint
+from nordicsemi.dfu.util import slip_decode_esc_chars
+from nordicsemi.exceptions import NordicSemiException
 
 
 def setup_logging():
@@ -50,6 +54,445 @@ def setup_logging():
     root.addHandler(ch)
 
 
+class FakeBootloaderPort(object):
+    """
+    Minimal stand-in for serial.Serial that answers HCI packets like the serial DFU bootloader.
+
+    If pipelining is disabled, frames written while an ACK is still waiting to be read are dropped,
+    like a bootloader that stops listening while it processes a packet.
+
+    Writes are numbered from 1. Writes listed in drop are lost, writes in nak are answered as if their CRC was
+    wrong, the ACKs of writes in drop_acks are lost and the ACKs of writes in late_acks only arrive with the next ACK.
+    """
+    def __init__(self, pipelining=True, drop=(), nak=(), drop_acks=(), late_acks=()):
+        self.pipelining = pipelining
+        self.drop = set(drop)
+        self.nak = set(nak)
+        self.drop_acks = set(drop_acks)
+        self.late_acks = set(late_acks)
+        self.held_acks = []
+        self.expected_seq = 1
+        self.rx = bytearray()
+        self.received = []
+        self.frames_written = 0
+
+    def write(self, data):
+        frame = bytes(data)
+        self.frames_written += 1
+
+        if self.frames_written in self.drop:
+            return len(frame)
+
+        if not self.pipelining and self.rx:
+            return len(frame)
+
+        decoded = bytes(slip_decode_esc_chars(list(frame[1:-1])))
+        seq = decoded[0] & 0x07
+
+        if seq == self.expected_seq and self.frames_written not in self.nak:
+            self.received.append(decoded[4:-2])
+            self.expected_seq = (self.expected_seq + 1) % 8
+
+        header = [self.expected_seq << 3, 0, 0]
+        header.append((~sum(header) + 1) & 0xFF)
+        ack = bytes([0xC0] + header + [0xC0])
+
+        if self.frames_written in self.drop_acks:
+            return len(frame)
+
+        self.held_acks.append(ack)
+        if self.frames_written not in self.late_acks:
+            self.rx += b''.join(self.held_acks)
+            self.held_acks = []
+
+        return len(frame)
+
+    @property
+    def in_waiting(self):
+        return len(self.rx)
+
+    def read(self, size=1):
+        data = bytes(self.rx[:size])
+        del self.rx[:size]
+        return data
+
+    def close(self):
+        pass
+
+
+class TestSlipReader(unittest.TestCase):
+    ACK_2 = bytes([0xC0, 0x10, 0x00, 0x00, 0xF0, 0xC0])
+
+    def test_frame_split_across_reads(self):
+        reader = SlipReader()
+
+        self.assertEqual([], reader.feed(self.ACK_2[:3]))
+        self.assertEqual([bytes([0x10, 0x00, 0x00, 0xF0])], reader.feed(self.ACK_2[3:]))
+        self.assertEqual([], reader.feed(b''))
+
+    def test_several_frames_in_one_read(self):
+        reader = SlipReader()
+        ack_3 = bytes([0xC0, 0x18, 0x00, 0x00, 0xE8, 0xC0])
+
+        frames = reader.feed(self.ACK_2 + ack_3 + ack_3[:2])
+
+        self.assertEqual([0x10, 0x18], [frame[0] for frame in frames])
+        self.assertEqual([0x18], [frame[0] for frame in reader.feed(ack_3[2:])])
+
+    def test_drops_garbage_and_invalid_frames(self):
+        reader = SlipReader()
+        bad_checksum = bytes([0xC0, 0x10, 0x00, 0x00, 0xF1, 0xC0])
+        bad_escape = bytes([0xC0, 0x10, 0xDB, 0x00, 0x00, 0xF0, 0xC0])
+
+        frames = reader.feed(b'\x01\x02' + bad_checksum + bad_escape + self.ACK_2)
+
+        self.assertEqual([bytes([0x10, 0x00, 0x00, 0xF0])], frames)
+
+    def test_decode_escape_sequences(self):
+        self.assertEqual(bytes([0xC0, 0xDB, 0x01]), SlipReader.decode(bytes([0xDB, 0xDC, 0xDB, 0xDD, 0x01])))
+        self.assertEqual(bytes([0xDB, 0xDC]), SlipReader.decode(bytes([0xDB, 0xDD, 0xDC])))
+        self.assertEqual([0xC0, 0x01], DfuTransportSerial.decode_esc_chars([0xDB, 0xDC, 0x01]))
+
+
+class TestHciPacket(unittest.TestCase):
+    def test_frame_is_escaped_and_decodable(self):
+        firmware = bytes([0x04, 0x00, 0x00, 0x00, 0xC0, 0xDB, 0x01])
+        packet = HciPacket(memoryview(firmware)[:4], memoryview(firmware)[4:], sequence_number=1)
+
+        self.assertEqual(1, packet.sequence_number)
+        self.assertEqual(0xC0, packet.data[0])
+        self.assertEqual(0xC0, packet.data[-1])
+        self.assertEqual(-1, packet.data.find(b'\xc0', 1, len(packet.data) - 1))
+
+        frames = SlipReader().feed(packet.data)
+        self.assertEqual(1, len(frames))
+        self.assertEqual(firmware, frames[0][4:-2])
+        self.assertEqual(crc16.calc_crc16(frames[0][:-2]), frames[0][-2] | (frames[0][-1] << 8))
+
+    def test_legacy_payload_types(self):
+        from_bytes = HciPacket(b'\x01\x02', sequence_number=3)
+        from_chars = HciPacket([chr(1), chr(2)], sequence_number=3)
+        from_str = HciPacket('\x01\x02', sequence_number=3)
+
+        self.assertEqual(from_bytes.data, from_chars.data)
+        self.assertEqual(from_bytes.data, from_str.data)
+
+    def test_str_is_hex(self):
+        packet = HciPacket(b'\x01\xC0', sequence_number=1)
+
+        self.assertEqual(packet.data.hex(), str(packet))
+
+
+@mock.patch.object(DfuTransportSerial, 'ACK_PACKET_TIMEOUT', 0.01)
+@mock.patch.object(DfuTransportSerial, 'MAX_ACK_PACKET_TIMEOUT', 0.04)
+class TestDfuTransportSerialWindow(unittest.TestCase):
+    def create_payloads(self, count):
+        return ((bytes([i] * 4),) for i in range(count))
+
+    def create_transport(self, port, window_size):
+        transport = DfuTransportSerial("fake", window_size=window_size)
+        transport.serial_port = port
+        return transport
+
+    def test_data_payloads_are_lazy(self):
+        firmware = bytes(range(256)) * 5
+
+        payloads = DfuTransportSerial.data_payloads(firmware)
+        first = next(payloads)
+
+        self.assertEqual(bytes([4, 0, 0, 0]), first[0])
+        self.assertIsInstance(first[1], memoryview)
+        self.assertEqual(firmware[:512], first[1])
+        self.assertEqual(firmware[512:1024], next(payloads)[1])
+        self.assertEqual(firmware[1024:], next(payloads)[1])
+        self.assertIsNone(next(payloads, None))
+
+    def test_prepared_frames(self):
+        firmware = bytes(range(256)) * 5
+        transport = self.create_transport(FakeBootloaderPort(), 1)
+        transport.prepare_firmware(firmware)
+
+        # Only used after the start and init packets of a new session
+        transport.link.sequence_number = 5
+        self.assertNotIsInstance(transport.firmware_frames(firmware), list)
+
+        transport.link.sequence_number = 2
+        frames = transport.firmware_frames(firmware)
+
+        self.assertEqual([3, 4, 5], [pkt.sequence_number for pkt, _ in frames])
+        self.assertEqual([512, 512, 256], [size for _, size in frames])
+        self.assertEqual(5, transport.link.sequence_number)
+        self.assertEqual(HciPacket(*next(transport.data_payloads(firmware)), sequence_number=3).data, frames[0][0].data)
+
+        # A resumed transfer continues with the prepared packets after the acknowledged ones
+        transport.link.sequence_number = 3
+        self.assertEqual([4, 5], [pkt.sequence_number for pkt, _ in transport.firmware_frames(firmware, 512)])
+
+        transport.prepare_firmware(bytearray(firmware))
+        self.assertNotIsInstance(transport.firmware_frames(firmware), list)
+        self.assertIsNone(transport.prepared_frames)
+
+    def test_window_size_out_of_range(self):
+        self.assertRaises(Exception, DfuTransportSerial, "fake", window_size=0)
+        self.assertRaises(Exception, DfuTransportSerial, "fake", window_size=8)
+
+    def test_windowed_transfer(self):
+        port = FakeBootloaderPort()
+        transport = self.create_transport(port, 4)
+        events = []
+        transport.register_events_callback(DfuEvent.PROGRESS_EVENT,
+                                           lambda progress, done, log_message: events.append(progress))
+
+        transport.send_packets_windowed(transport.build_frames(self.create_payloads(20)))
+
+        self.assertEqual(20, len(port.received))
+        self.assertEqual(bytes([19] * 4), port.received[-1])
+        self.assertEqual(19, events[-1])
+        self.assertEqual(4, transport.window_size)
+
+    def test_packets_not_formatted_without_debug_logging(self):
+        transport = self.create_transport(FakeBootloaderPort(), 4)
+        logger = logging.getLogger('nordicsemi.dfu.dfu_transport_serial')
+
+        with mock.patch.object(logger, 'level', logging.INFO), \
+                mock.patch.object(HciPacket, '__str__', autospec=True) as packet_str:
+            transport.send_packets_windowed(transport.build_frames(self.create_payloads(4)))
+            transport.send_packet(transport.link.create_packet(b"\x01"))
+
+        packet_str.assert_not_called()
+
+    def test_windowed_resend_after_lost_packet(self):
+        port = FakeBootloaderPort(drop=[10])
+        transport = self.create_transport(port, 4)
+
+        transport.send_packets_windowed(transport.build_frames(self.create_payloads(20)))
+
+        self.assertEqual([bytes([i] * 4) for i in range(20)], port.received)
+        self.assertEqual(4, transport.window_size)
+
+    def test_windowed_resend_rejected_after_lost_packet(self):
+        # The first packet is lost and its resend is rejected, only the second packet was answered before
+        port = FakeBootloaderPort(drop=[1], nak=[3])
+        transport = self.create_transport(port, 2)
+
+        transport.send_packets_windowed(transport.build_frames(self.create_payloads(2)))
+
+        self.assertEqual([bytes([i] * 4) for i in range(2)], port.received)
+        self.assertEqual(5, port.frames_written)
+
+    def test_windowed_gives_up_after_max_attempts(self):
+        port = FakeBootloaderPort(nak=range(1, 100))
+        transport = self.create_transport(port, 4)
+
+        with self.assertRaisesRegex(NordicSemiException, "^{0} failed tx attempts"
+                                    .format(DfuTransportSerial.MAX_TX_ATTEMPTS + 1)):
+            transport.send_packets_windowed(transport.build_frames(self.create_payloads(8)))
+
+    def test_windowed_resend_after_timeout(self):
+        # The ACK of the fourth packet and the last packet are lost, only a timeout tells about the latter
+        port = FakeBootloaderPort(drop_acks=[4], drop=[8])
+        transport = self.create_transport(port, 4)
+        retransmits = []
+        transport.register_events_callback(DfuEvent.RETRANSMIT_EVENT, lambda **kwargs: retransmits.append(kwargs))
+
+        transport.send_packets_windowed(transport.build_frames(self.create_payloads(8)))
+
+        self.assertEqual([bytes([i] * 4) for i in range(8)], port.received)
+        self.assertEqual(9, port.frames_written)
+        self.assertEqual(1, transport.link.timeouts)
+        self.assertEqual(1, transport.link.retransmissions)
+        self.assertEqual(1, transport.link.recoveries)
+        self.assertEqual([{'log_message': "Resending 1 packet(s)", 'sequence_number': 0, 'attempt': 1}], retransmits)
+        self.assertEqual(4, transport.window_size)
+
+    def test_windowed_gives_up_after_timeouts(self):
+        port = FakeBootloaderPort(drop_acks=range(1, 100))
+        transport = self.create_transport(port, 4)
+        timeouts = []
+        transport.register_events_callback(DfuEvent.TIMEOUT_EVENT, lambda log_message: timeouts.append(log_message))
+
+        with self.assertRaisesRegex(NordicSemiException, "No data received"):
+            transport.send_packets_windowed(transport.build_frames(self.create_payloads(8)))
+
+        self.assertEqual(4 * (DfuTransportSerial.MAX_TX_ATTEMPTS + 1), port.frames_written)
+        self.assertEqual(DfuTransportSerial.MAX_TX_ATTEMPTS + 1, transport.link.timeouts)
+        self.assertEqual(1, len(timeouts))
+
+    def test_windowed_falls_back_without_pipelining(self):
+        port = FakeBootloaderPort(pipelining=False)
+        transport = self.create_transport(port, 4)
+
+        transport.send_packets_windowed(transport.build_frames(self.create_payloads(20)))
+
+        self.assertEqual([bytes([i] * 4) for i in range(20)], port.received)
+        self.assertEqual(1, transport.window_size)
+
+
+class TestDfuTransportSerialPacketSize(unittest.TestCase):
+    def create_transport(self, port, packet_size, window_size=1):
+        transport = DfuTransportSerial("fake", window_size=window_size, packet_size=packet_size)
+        transport.serial_port = port
+        return transport
+
+    def page_waits(self, port, transport, firmware):
+        """
+        Sends the firmware and returns the number of frames written when each page write wait was taken.
+        """
+        waits = []
+
+        def page_write_wait_time():
+            waits.append(port.frames_written)
+            return 0
+
+        with mock.patch.object(transport.flash_timing, 'page_write_wait_time', side_effect=page_write_wait_time):
+            transport.send_firmware(firmware)
+
+        return waits
+
+    def test_packet_size_out_of_range(self):
+        for packet_size in (0, 2, 250, DfuTransportSerial.DFU_PACKET_MAX_SIZE + 4):
+            self.assertRaises(NordicSemiException, DfuTransportSerial, "fake", packet_size=packet_size)
+
+        self.assertEqual(4, DfuTransportSerial("fake", packet_size=4).packet_size)
+
+    def test_payloads_split_by_packet_size(self):
+        firmware = bytes(range(256)) * 5
+        transport = self.create_transport(FakeBootloaderPort(), 256)
+
+        payloads = list(DfuTransportSerial.data_payloads(firmware, 256))
+        self.assertEqual([256] * 5, [len(payload[1]) for payload in payloads])
+        self.assertEqual(firmware, b''.join(bytes(payload[1]) for payload in payloads))
+
+        transport.link.sequence_number = 2
+        self.assertEqual([256] * 5, [size for _, size in transport.firmware_frames(firmware)])
+        self.assertEqual([132, 132], [size for _, size in DfuTransportSerial.encode_frames(firmware[:264], 132)])
+
+    def test_page_waits_every_4096_bytes(self):
+        firmware = bytes(range(256)) * 40
+
+        for packet_size, frames_per_page in ((512, 8), (256, 16), (128, 32)):
+            port = FakeBootloaderPort()
+            transport = self.create_transport(port, packet_size)
+            frame_count = len(firmware) // packet_size
+
+            waits = self.page_waits(port, transport, firmware)
+
+            self.assertEqual(list(range(1, frame_count + 1, frames_per_page)) + [frame_count], waits)
+            self.assertEqual(frame_count + 1, len(port.received))
+
+    def test_windowed_page_waits_every_4096_bytes(self):
+        firmware = bytes(range(256)) * 40
+        port = FakeBootloaderPort()
+        transport = self.create_transport(port, 256, window_size=4)
+
+        waits = self.page_waits(port, transport, firmware)
+
+        self.assertEqual([0, 16, 32, 40], waits)
+        self.assertEqual(firmware, b''.join(data[4:] for data in port.received[:-1]))
+
+
+@mock.patch.object(DfuTransportSerial, 'ACK_PACKET_TIMEOUT', 0.01)
+@mock.patch.object(DfuTransportSerial, 'MAX_ACK_PACKET_TIMEOUT', 0.04)
+class TestDfuTransportSerialRetransmit(unittest.TestCase):
+    def create_transport(self, port):
+        transport = DfuTransportSerial("fake")
+        transport.serial_port = port
+        transport.retransmit_events = []
+        transport.register_events_callback(DfuEvent.RETRANSMIT_EVENT,
+                                           lambda **kwargs: transport.retransmit_events.append(kwargs))
+        return transport
+
+    def send_packets(self, transport, count):
+        for i in range(count):
+            transport.send_packet(transport.create_packet(bytes([i] * 4)))
+
+    def test_resend_after_lost_ack(self):
+        port = FakeBootloaderPort(drop_acks=[2])
+        transport = self.create_transport(port)
+
+        self.send_packets(transport, 3)
+
+        self.assertEqual([bytes([i] * 4) for i in range(3)], port.received)
+        self.assertEqual(4, port.frames_written)
+        self.assertEqual(1, transport.link.timeouts)
+        self.assertEqual(1, transport.link.retransmissions)
+        self.assertEqual(1, transport.link.recoveries)
+        self.assertEqual([{'log_message': "Resending packet 2", 'sequence_number': 2, 'attempt': 1}],
+                         transport.retransmit_events)
+        self.assertEqual(1, transport.report.counters["retransmissions"])
+
+    def test_resend_after_rejected_packet(self):
+        port = FakeBootloaderPort(nak=[1, 2])
+        transport = self.create_transport(port)
+
+        self.send_packets(transport, 2)
+
+        self.assertEqual([bytes([i] * 4) for i in range(2)], port.received)
+        self.assertEqual(0, transport.link.timeouts)
+        self.assertEqual(2, transport.link.retransmissions)
+
+    def test_late_ack_is_skipped(self):
+        port = FakeBootloaderPort(late_acks=[1])
+        transport = self.create_transport(port)
+
+        self.send_packets(transport, 3)
+
+        self.assertEqual([bytes([i] * 4) for i in range(3)], port.received)
+        self.assertEqual(4, port.frames_written)
+        self.assertEqual(1, transport.link.retransmissions)
+        self.assertEqual(0, transport.link.unanswered)
+        self.assertEqual(b'', port.read(6))
+
+    def test_gives_up_after_max_attempts(self):
+        port = FakeBootloaderPort(drop_acks=range(1, 10))
+        transport = self.create_transport(port)
+        timeouts = []
+        transport.register_events_callback(DfuEvent.TIMEOUT_EVENT, lambda log_message: timeouts.append(log_message))
+
+        self.assertRaises(NordicSemiException, self.send_packets, transport, 1)
+        self.assertEqual(DfuTransportSerial.MAX_TX_ATTEMPTS + 1, port.frames_written)
+        self.assertEqual(1, len(timeouts))
+        self.assertEqual(0, transport.link.sequence_number)
+
+    def test_gives_up_when_never_accepted(self):
+        port = FakeBootloaderPort(nak=range(1, 10))
+        transport = self.create_transport(port)
+
+        self.assertRaises(NordicSemiException, self.send_packets, transport, 1)
+        self.assertEqual(DfuTransportSerial.MAX_TX_ATTEMPTS + 1, port.frames_written)
+        self.assertEqual(0, transport.link.timeouts)
+
+
+class TestTransferCheckpoint(unittest.TestCase):
+    def test_acknowledge(self):
+        link = HciLink()
+        checkpoint = TransferCheckpoint()
+        checkpoint.in_flight = [(link.create_packet(b''), 512), (link.create_packet(b''), 512),
+                                (link.create_packet(b''), 100)]
+
+        checkpoint.acknowledge(2)
+
+        self.assertEqual(1024, checkpoint.offset)
+        self.assertEqual([3], [pkt.sequence_number for pkt, _ in checkpoint.in_flight])
+
+        checkpoint.acknowledge(1)
+        self.assertEqual(1124, checkpoint.offset)
+        self.assertEqual([], checkpoint.in_flight)
+
+
+class TestHciLink(unittest.TestCase):
+    def test_sequence_numbers_wrap(self):
+        link = HciLink()
+
+        numbers = [link.create_packet(b'').sequence_number for _ in range(9)]
+
+        self.assertEqual([1, 2, 3, 4, 5, 6, 7, 0, 1], numbers)
+        self.assertTrue(HciLink.is_acknowledged(link.create_packet(b''), 3))
+
+        link.reset()
+        self.assertEqual(1, link.create_packet(b'').sequence_number)
+
+
 @unittest.skip('Ignoring these tests since they take too much time to run.')
 class TestDfuTransportSerial(unittest.TestCase):
     DEVKEY_PORT = "NORDICSEMI_PCA10028_1_PORT"
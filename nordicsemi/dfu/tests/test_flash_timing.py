@@ -0,0 +1,150 @@
+# Copyright (c) 2015, Nordic Semiconductor
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of Nordic Semiconductor ASA nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from nordicsemi.dfu.flash_timing import FlashTimingModel
+
+
+class TestFlashTimingModel(unittest.TestCase):
+    PAGE_SIZE = 4096
+    PAGE_ERASE_TIME = 0.0897
+    PAGE_WRITE_TIME = 0.1024
+
+    def setUp(self):
+        self.work_directory = tempfile.mkdtemp(prefix="nrf_dfu_tests_")
+        self.profile_path = os.path.join(self.work_directory, "profiles", "flash_timing.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.work_directory, ignore_errors=True)
+
+    def create_model(self, chip=None, conservative=False, flow_control=False):
+        return FlashTimingModel(self.PAGE_SIZE, self.PAGE_ERASE_TIME, self.PAGE_WRITE_TIME,
+                                chip=chip, conservative=conservative, profile_path=self.profile_path,
+                                flow_control=flow_control)
+
+    def test_unknown_chip_is_conservative(self):
+        model = self.create_model()
+
+        self.assertTrue(model.conservative)
+        self.assertEqual(0.5, model.erase_wait_time(0))
+        self.assertAlmostEqual(42 * self.PAGE_ERASE_TIME, model.erase_wait_time(167936))
+        self.assertAlmostEqual(self.PAGE_WRITE_TIME, model.page_write_wait_time())
+        self.assertAlmostEqual(self.PAGE_ERASE_TIME + self.PAGE_WRITE_TIME,
+                               model.activate_wait_time(167936, True, 0))
+        self.assertAlmostEqual(42 * (self.PAGE_ERASE_TIME + self.PAGE_WRITE_TIME),
+                               model.activate_wait_time(167936, False, 0))
+
+        model.record_erase(167936, 1.0, 0.5)
+        self.assertFalse(model.dirty)
+
+    def test_learns_shorter_erase_time(self):
+        model = self.create_model(chip='nrf52840', flow_control=True)
+        model.record_round_trip(0.005)
+        initial = model.erase_wait_time(167936)
+
+        for _ in range(20):
+            model.record_erase(167936, model.erase_wait_time(167936), 0.005)
+
+        self.assertLess(model.erase_wait_time(167936), initial)
+        self.assertGreaterEqual(model.page_erase_time, FlashTimingModel.CHIPS['nrf52840']['page_erase_time_min'])
+        self.assertEqual(FlashTimingModel.MIN_ERASE_WAIT_TIME, model.erase_wait_time(0))
+
+    def test_no_shorter_waits_without_flow_control(self):
+        model = self.create_model(chip='nrf52832')
+        model.record_round_trip(0.005)
+        model.page_erase_time = 0.02
+        initial = model.erase_wait_time(167936)
+
+        for _ in range(20):
+            model.record_erase(167936, model.erase_wait_time(167936), 0.005)
+
+        self.assertAlmostEqual(initial, model.erase_wait_time(167936))
+
+        # A device that was still busy still makes the wait longer
+        model.record_erase(167936, model.erase_wait_time(167936), 0.5)
+        self.assertGreater(model.erase_wait_time(167936), initial)
+
+    def test_profile_round_trip(self):
+        model = self.create_model(chip='nrf52832')
+        model.record_round_trip(0.004)
+        model.record_page_write(model.page_write_wait_time(), 0.004)
+        model.save()
+
+        self.assertTrue(os.path.isfile(self.profile_path))
+        self.assertFalse(model.dirty)
+
+        loaded = self.create_model(chip='nrf52832')
+        self.assertAlmostEqual(model.page_write_time, loaded.page_write_time)
+        self.assertAlmostEqual(0.004, loaded.round_trip_time)
+
+        other = self.create_model(chip='nrf52840')
+        self.assertIsNone(other.round_trip_time)
+
+    def test_concurrent_saves_keep_every_chip(self):
+        models = [self.create_model(chip=chip) for chip in sorted(FlashTimingModel.CHIPS)] * 4
+        for i, model in enumerate(models):
+            model.record_round_trip(0.001 * (i + 1))
+            model.dirty = True
+
+        threads = [threading.Thread(target=model.save) for model in models]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        with open(self.profile_path) as f:
+            self.assertEqual(sorted(FlashTimingModel.CHIPS), sorted(json.load(f)))
+        self.assertFalse(os.path.exists(self.profile_path + ".lock"))
+
+    def test_stale_profile_lock_is_removed(self):
+        model = self.create_model(chip='nrf52832')
+        model.record_round_trip(0.004)
+        model.dirty = True
+
+        os.makedirs(os.path.dirname(self.profile_path))
+        lock_path = self.profile_path + ".lock"
+        open(lock_path, 'w').close()
+        stale = time.time() - FlashTimingModel.PROFILE_LOCK_TIMEOUT - 1
+        os.utime(lock_path, (stale, stale))
+
+        model.save()
+
+        self.assertFalse(model.dirty)
+        self.assertTrue(os.path.isfile(self.profile_path))
+        self.assertFalse(os.path.exists(lock_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,225 @@
+# Copyright (c) 2015, Nordic Semiconductor
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of Nordic Semiconductor ASA nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import io
+import os
+import unittest
+
+import nordicsemi.dfu.intelhex as intelhex
+from nordicsemi.dfu.intelhex.compat import StringIO
+from nordicsemi.dfu.intelhex.segments import SegmentBuffer
+
+
+class TestSegmentBuffer(unittest.TestCase):
+    def test_adjacent_writes_are_merged(self):
+        buf = SegmentBuffer()
+        buf.write(0x1000, b'\x01\x02')
+        buf.write(0x1004, b'\x05')
+        buf.write(0x1002, b'\x03\x04')
+
+        self.assertEqual(buf.segments(), [(0x1000, bytearray(b'\x01\x02\x03\x04\x05'))])
+        self.assertEqual(len(buf), 5)
+
+    def test_overwrite_across_segments(self):
+        buf = SegmentBuffer({0: 1, 1: 2, 10: 3})
+        buf.write(1, b'\xAA' * 10)
+
+        self.assertEqual(buf.segments(), [(0, bytearray(b'\x01' + b'\xAA' * 10))])
+        self.assertEqual(len(buf), 11)
+
+    def test_single_addresses(self):
+        buf = SegmentBuffer({5: 0x55, 7: 0x77})
+
+        self.assertEqual(buf[5], 0x55)
+        self.assertEqual(buf.get(6, 0xFF), 0xFF)
+        self.assertRaises(KeyError, buf.__getitem__, 6)
+        self.assertNotIn(6, buf)
+        self.assertEqual(list(buf.items()), [(5, 0x55), (7, 0x77)])
+        self.assertEqual(buf, {5: 0x55, 7: 0x77})
+
+    def test_delete_splits_segment(self):
+        buf = SegmentBuffer()
+        buf.write(0, bytes(range(10)))
+
+        self.assertEqual(buf.delete(3, 6), 3)
+        self.assertEqual(buf.segments(), [(0, bytearray(b'\x00\x01\x02')), (6, bytearray(b'\x06\x07\x08\x09'))])
+        self.assertEqual(len(buf), 7)
+        self.assertEqual(buf.delete(100, 200), 0)
+
+    def test_read_gaps_and_bounds(self):
+        buf = SegmentBuffer({2: 1, 3: 2, 6: 3})
+
+        self.assertEqual(buf.read(0, 8, 0xFF), b'\xFF\xFF\x01\x02\xFF\xFF\x03\xFF')
+        self.assertEqual(buf.read(2, 2), b'\x01\x02')
+        self.assertRaises(KeyError, buf.read, 2, 3)
+        self.assertEqual(buf.gaps(0, 8), [(0, 2), (4, 6), (7, 8)])
+        self.assertEqual(buf.first_used(4, 8), 6)
+        self.assertIsNone(buf.first_used(4, 6))
+        self.assertEqual((buf.minaddr(), buf.maxaddr()), (2, 6))
+
+    def test_chunks(self):
+        buf = SegmentBuffer({2: 1, 3: 2, 9: 3})
+
+        chunks = [bytes(chunk) for chunk in buf.chunks(0, 12, 0xFF, pad_size=4)]
+        self.assertEqual(chunks, [b'\xFF\xFF', b'\x01\x02', b'\xFF\xFF\xFF\xFF', b'\xFF', b'\x03', b'\xFF\xFF'])
+        self.assertEqual(b''.join(chunks), buf.read(0, 12, 0xFF))
+
+
+class TestIntelHex(unittest.TestCase):
+    def setUp(self):
+        script_abspath = os.path.abspath(__file__)
+        script_dirname = os.path.dirname(script_abspath)
+        os.chdir(script_dirname)
+
+    def test_hex_round_trip(self):
+        for name in ("bar.hex", "foo.hex", "s132_nrf52_mini.hex"):
+            ih = intelhex.IntelHex(os.path.join("firmwares", name))
+            output = StringIO()
+            ih.write_hex_file(output)
+            output.seek(0)
+
+            reloaded = intelhex.IntelHex(output)
+            self.assertEqual(reloaded.segments(), ih.segments())
+            self.assertEqual(reloaded.todict(), ih.todict())
+
+    def test_records_do_not_cross_64k_boundary(self):
+        ih = intelhex.IntelHex()
+        ih.puts(0xFFF8, b'\x11' * 16)
+        output = StringIO()
+        ih.write_hex_file(output)
+
+        self.assertEqual(output.getvalue().splitlines(), [
+            ':020000040000FA',
+            ':08FFF800111111111111111179',
+            ':020000040001F9',
+            ':08000000111111111111111170',
+            ':00000001FF',
+        ])
+
+    def test_overlapping_records(self):
+        hexfile = StringIO(':0200000001FFFE\n:020001000102FA\n:00000001FF\n')
+
+        with self.assertRaises(intelhex.AddressOverlapError) as context:
+            intelhex.IntelHex(hexfile)
+        self.assertIn('line 2', str(context.exception))
+        self.assertIn('0x1', str(context.exception))
+
+    def test_record_errors_report_line(self):
+        cases = [
+            (':0200000001FFFF\n', intelhex.RecordChecksumError, 1),
+            (':0200000001FFFE\n\n:0300000001FFFE\n', intelhex.RecordLengthError, 3),
+            (':0200000001FFFE\n:02000000\n', intelhex.HexRecordError, 2),
+            (':0200000001FFFE\n:020002000102F9\n:020001000102FA\n', intelhex.AddressOverlapError, 3),
+            (':0200000001FFFE\n:0200000001FFZZ\n', intelhex.HexRecordError, 2),
+        ]
+        for text, error, line in cases:
+            with self.assertRaises(error) as context:
+                intelhex.IntelHex(StringIO(text))
+            self.assertIn('line %d' % line, str(context.exception))
+
+    def test_records_after_eof_are_ignored(self):
+        ih = intelhex.IntelHex(StringIO(':0200000001FFFE\r\n:00000001FF\r\nnot a record\r\n'))
+
+        self.assertEqual(ih.todict(), {0: 1, 1: 0xFF})
+
+    def test_gets_and_puts(self):
+        ih = intelhex.IntelHex()
+        ih.puts(0x100, b'abc')
+        ih.putsz(0x200, b'xyz')
+
+        self.assertEqual(ih.gets(0x100, 3), b'abc')
+        self.assertEqual(ih.getsz(0x200), b'xyz')
+        self.assertEqual(ih[0x101], ord('b'))
+        self.assertEqual(ih[0x104], ih.padding)
+        self.assertRaises(intelhex.NotEnoughDataError, ih.gets, 0x100, 4)
+        self.assertEqual(ih.tobinstr(0x100, 0x104), b'abc\xFF\xFF')
+
+    def test_bounds_follow_writes_and_deletes(self):
+        ih = intelhex.IntelHex()
+        self.assertIsNone(ih.minaddr())
+
+        ih.puts(0x2000, b'\x01' * 16)
+        ih.puts(0x100, b'\x02')
+        self.assertEqual((ih.minaddr(), ih.maxaddr()), (0x100, 0x200F))
+
+        del ih[0x100]
+        del ih[0x2008:0x2010]
+        self.assertEqual((ih.minaddr(), ih.maxaddr()), (0x2000, 0x2007))
+
+    def test_delete_range(self):
+        ih = intelhex.IntelHex()
+        ih.puts(0x1000, b'\x01' * 8)
+        ih.puts(0x10001000, b'\x02' * 4)
+
+        self.assertEqual(ih.delete_range(0x10000000, 0x100000000), 4)
+        self.assertEqual(ih.delete_range(0x1004, 0x2000), 4)
+        self.assertEqual(ih.delete_range(0x3000, 0x4000), 0)
+        self.assertEqual(ih.todict(), {0x1000: 1, 0x1001: 1, 0x1002: 1, 0x1003: 1})
+        self.assertRaises(TypeError, ih.delete_range, -1, 0)
+
+    def test_tobinfile_fills_gaps(self):
+        ih = intelhex.IntelHex()
+        ih.puts(0x10, b'\x01\x02')
+        ih.puts(0x10010, b'\x03')
+        output = io.BytesIO()
+
+        ih.tobinfile(output, start=0x0E, end=0x10011)
+
+        self.assertEqual(output.getvalue(), ih.tobinstr(start=0x0E, end=0x10011))
+        self.assertEqual(len(output.getvalue()), 0x10004)
+
+    def test_slices(self):
+        ih = intelhex.IntelHex()
+        ih[0x10:0x14] = [1, 2, 3, 4]
+        ih[0x20] = 5
+
+        self.assertEqual(ih[0x11:0x21].todict(), {0x11: 2, 0x12: 3, 0x13: 4, 0x20: 5})
+        self.assertEqual(ih[0x10:0x14:2].todict(), {0x10: 1, 0x12: 3})
+
+        del ih[0x11:0x13]
+        self.assertEqual(ih.segments(), [(0x10, 0x11), (0x13, 0x14), (0x20, 0x21)])
+        self.assertEqual(ih.segments(min_gap=3), [(0x10, 0x14), (0x20, 0x21)])
+        self.assertEqual(len(ih), 3)
+
+    def test_merge(self):
+        ih = intelhex.IntelHex({0: 1, 1: 2})
+        other = intelhex.IntelHex({1: 0xAA, 2: 0xBB})
+
+        self.assertRaises(intelhex.AddressOverlapError, intelhex.IntelHex(ih).merge, other)
+
+        ignored = intelhex.IntelHex(ih)
+        ignored.merge(other, overlap='ignore')
+        self.assertEqual(ignored.todict(), {0: 1, 1: 2, 2: 0xBB})
+
+        replaced = intelhex.IntelHex(ih)
+        replaced.merge(other, overlap='replace')
+        self.assertEqual(replaced.todict(), {0: 1, 1: 0xAA, 2: 0xBB})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -26,11 +26,14 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import hashlib
+import io
 import os
 
 import unittest
 import nordicsemi.dfu.nrfhex as nrfhex
 import nordicsemi.dfu.intelhex as intelhex
+from nordicsemi.dfu.crc16 import calc_crc16
 
 
 class TestnRFHex(unittest.TestCase):
@@ -129,6 +132,42 @@ class TestnRFHex(unittest.TestCase):
 
         self.assertEqual(nrf.get_softdevice_variant(), "s132")
 
+    def test_softdevice_variant_follows_changes(self):
+        nrf = nrfhex.nRFHex("firmwares/s132_nrf52_mini.hex")
+
+        self.assertEqual(nrf.get_softdevice_variant(), "s132")
+        self.assertEqual(nrf.get_mbr_end_address(), 0x3000)
+
+        del nrf[0x3000:0x8000]
+
+        self.assertEqual(nrf.get_softdevice_variant(), "unknown")
+        self.assertEqual(nrf.get_mbr_end_address(), 0x1000)
+
+        nrf.puts(0x3004, b'\xDB\xE5\xB1\x51')
+
+        self.assertEqual(nrf.get_softdevice_variant(), "s1x0")
+
+    def test_removed_regions(self):
+        nrf = nrfhex.nRFHex("firmwares/foo.hex")
+
+        self.assertLess(nrf.maxaddr(), 0x10000000)
+
+        nrf = nrfhex.nRFHex("firmwares/foo.hex", removed_regions=[(0x12000, 0x100000)])
+
+        self.assertEqual(nrf.maxaddr(), 0x11FFF)
+
+    def test_tobinfile_returns_bin_info(self):
+        nrf = nrfhex.nRFHex("firmwares/foo.hex", "firmwares/bar.hex")
+        output = io.BytesIO()
+
+        info = nrf.tobinfile(output)
+        data = output.getvalue()
+
+        self.assertEqual(info.size, len(data))
+        self.assertEqual(info.size, nrf.size() + nrf.bootloadersize())
+        self.assertEqual(info.crc16, calc_crc16(data))
+        self.assertEqual(info.sha256, hashlib.sha256(data).digest())
+
 
 if __name__ == '__main__':
     unittest.main()
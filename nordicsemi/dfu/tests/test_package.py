@@ -104,6 +104,14 @@ class TestPackage(unittest.TestCase):
                 self.assertEqual('sd_bl.bin', _json['manifest']['softdevice_bootloader']['bin_file'])
                 self.assertEqual('sd_bl.dat', _json['manifest']['softdevice_bootloader']['dat_file'])
 
+    def test_calculate_bin_info(self):
+        bin_file = "firmwares/bar_wanted.bin"
+        info = Package.calculate_bin_info(bin_file)
+
+        self.assertEqual(info.size, Package.calculate_file_size(bin_file))
+        self.assertEqual(info.crc16, Package.calculate_crc16(bin_file))
+        self.assertEqual(info.sha256, Package.calculate_sha256_hash(bin_file))
+
     def test_unpack_package_a(self):
         self.p = Package(dev_type=1,
                          dev_rev=2,
@@ -0,0 +1,187 @@
+# Copyright (c) 2015, Nordic Semiconductor
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of Nordic Semiconductor ASA nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from nordicsemi.dfu import package_cache
+from nordicsemi.dfu.dfu_transport_serial import HciPacket
+from nordicsemi.dfu.package_cache import PackageCache, package_size
+from nordicsemi.dfu.tests.helpers import create_package
+
+
+class TestPackageCache(unittest.TestCase):
+    def setUp(self):
+        self.work_directory = tempfile.mkdtemp(prefix="nrf_dfu_tests_")
+
+    def tearDown(self):
+        shutil.rmtree(self.work_directory, ignore_errors=True)
+
+    def test_get(self):
+        package_path = create_package(self.work_directory, "package.zip")
+        cache = PackageCache()
+
+        package = cache.get(package_path)
+        self.assertIs(package, cache.get(package_path))
+        self.assertEqual(1, cache.misses)
+        self.assertEqual(1, cache.hits)
+        self.assertEqual(package_size(package), cache.size)
+
+        # A replaced package is loaded again
+        create_package(self.work_directory, "package.zip", app_fw="foo.hex")
+        self.assertIsNot(package, cache.get(package_path))
+        self.assertEqual(2, cache.misses)
+
+    def test_hit_does_not_read_file(self):
+        package_path = create_package(self.work_directory, "package.zip")
+        cache = PackageCache()
+
+        with mock.patch.object(package_cache, 'file_sha256', wraps=package_cache.file_sha256) as file_sha256:
+            package = cache.get(package_path)
+            self.assertEqual(1, file_sha256.call_count)
+
+            with mock.patch('builtins.open', side_effect=AssertionError("package file read")):
+                self.assertIs(package, cache.get(package_path))
+            self.assertEqual(1, file_sha256.call_count)
+
+            # Hashed again once the file changes
+            stat = os.stat(package_path)
+            os.utime(package_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000))
+            cache.get(package_path)
+            self.assertEqual(2, file_sha256.call_count)
+
+    def test_package_changed_while_loading_is_not_kept(self):
+        package_path = create_package(self.work_directory, "package.zip")
+        cache = PackageCache()
+        original_load_package = package_cache.load_package
+
+        def load_package(file_path):
+            package = original_load_package(file_path)
+            # Replaced after it was hashed, the package read may not match the digest
+            create_package(self.work_directory, "package.zip", app_fw="foo.hex")
+            return package
+
+        with mock.patch.object(package_cache, 'load_package', side_effect=load_package):
+            self.assertIsNotNone(cache.get(package_path))
+
+        self.assertEqual(0, len(cache))
+        self.assertEqual(0, cache.size)
+
+        package = cache.get(package_path)
+        self.assertIs(package, cache.get(package_path))
+        self.assertEqual(2, cache.misses)
+
+    def test_slow_load_does_not_block_other_packages(self):
+        slow_path = create_package(self.work_directory, "slow.zip")
+        fast_path = create_package(self.work_directory, "fast.zip", app_fw="foo.hex")
+        cache = PackageCache()
+        loading = threading.Event()
+        release = threading.Event()
+        packages = []
+        original_load_package = package_cache.load_package
+
+        def load_package(file_path):
+            if file_path == slow_path:
+                loading.set()
+                release.wait(10)
+            return original_load_package(file_path)
+
+        with mock.patch.object(package_cache, 'load_package', side_effect=load_package) as load:
+            threads = [threading.Thread(target=lambda: packages.append(cache.get(slow_path))) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            self.assertTrue(loading.wait(10))
+
+            self.assertIsNotNone(cache.get(fast_path))
+            self.assertEqual([], packages)
+
+            release.set()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(2, load.call_count)
+        self.assertIs(packages[0], packages[1])
+
+    def test_compiled_frames(self):
+        package_path = create_package(self.work_directory, "package.zip")
+        cache = PackageCache()
+
+        package = cache.get(package_path, packet_size=256)
+        self.assertEqual(256, package.packet_size)
+        self.assertIsNot(package, cache.get(package_path))
+
+        firmware_manifest = package.images()[0][1]
+        firmware = package.firmware(firmware_manifest)
+        frames = package.frames(firmware_manifest)
+        self.assertEqual(len(firmware), sum(size for _, size in frames))
+        self.assertEqual(HciPacket(b'\x04\x00\x00\x00', firmware[:256], sequence_number=3).data, frames[0][0].data)
+
+    def test_eviction(self):
+        first = create_package(self.work_directory, "first.zip")
+        second = create_package(self.work_directory, "second.zip", app_fw="foo.hex")
+
+        cache = PackageCache(max_size=max(package_size(PackageCache().get(path)) for path in (first, second)))
+        cache.get(first)
+        cache.get(second)
+
+        self.assertEqual(1, len(cache))
+        cache.get(first)
+        self.assertEqual(3, cache.misses)
+
+        # The digest of a package is only kept with the package
+        self.assertEqual([os.path.abspath(first)], list(cache._digests))
+
+        # Packages larger than the cache are not kept
+        cache = PackageCache(max_size=1)
+        cache.get(first)
+        self.assertEqual(0, len(cache))
+        self.assertEqual(0, cache.size)
+        self.assertEqual({}, cache._digests)
+
+    def test_shared_between_threads(self):
+        package_path = create_package(self.work_directory, "package.zip")
+        cache = PackageCache()
+        packages = []
+
+        with mock.patch.object(package_cache, 'load_package', wraps=package_cache.load_package) as load_package:
+            threads = [threading.Thread(target=lambda: packages.append(cache.get(package_path))) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(1, load_package.call_count)
+        self.assertEqual(8, len(packages))
+        self.assertTrue(all(package is packages[0] for package in packages))
+
+
+if __name__ == '__main__':
+    unittest.main()
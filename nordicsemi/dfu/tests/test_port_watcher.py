@@ -0,0 +1,185 @@
+# Copyright (c) 2015, Nordic Semiconductor
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of Nordic Semiconductor ASA nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import time
+import unittest
+from unittest import mock
+
+from serial.tools.list_ports_common import ListPortInfo
+
+from nordicsemi.dfu.dfu_transport_serial import DfuTransportSerial
+from nordicsemi.dfu.port_watcher import PortWatcher, find_port
+from nordicsemi.dfu.tests.test_dfu_transport_serial import FakeBootloaderPort
+
+
+def create_port(device, serial_number=None):
+    port = ListPortInfo(device, skip_link_detection=True)
+    port.serial_number = serial_number
+    return port
+
+
+class FakeComports(object):
+    """ Returns the given port lists one after the other on each call, repeating the last one. """
+
+    def __init__(self, *port_lists):
+        self.port_lists = list(port_lists)
+
+    def __call__(self):
+        if len(self.port_lists) > 1:
+            return self.port_lists.pop(0)
+        return self.port_lists[0]
+
+
+@mock.patch.object(PortWatcher, 'POLL_INTERVAL', 0.001)
+class TestPortWatcher(unittest.TestCase):
+    def test_find_port(self):
+        with mock.patch('serial.tools.list_ports.comports', FakeComports([create_port('/dev/ttyACM0', 'ABC')])):
+            self.assertEqual('ABC', find_port('/dev/ttyACM0').serial_number)
+            self.assertIsNone(find_port('/dev/ttyACM1'))
+
+    def test_device_comes_back_under_new_name(self):
+        comports = FakeComports([create_port('/dev/ttyS0'), create_port('/dev/ttyACM0', 'ABC')],
+                                [create_port('/dev/ttyACM0', 'ABC')],
+                                [create_port('/dev/ttyS0')],
+                                [create_port('/dev/ttyS0')],
+                                [create_port('/dev/ttyS0'), create_port('/dev/ttyACM1', 'ABC')])
+
+        with mock.patch('serial.tools.list_ports.comports', comports):
+            watcher = PortWatcher('/dev/ttyACM0')
+
+            self.assertTrue(watcher.wait_for_removal(1.0))
+            self.assertEqual('/dev/ttyACM1', watcher.wait_for_arrival(1.0))
+            self.assertEqual('/dev/ttyACM1', watcher.device)
+
+    def test_device_without_serial_number_is_matched_by_name(self):
+        comports = FakeComports([create_port('/dev/ttyACM0')], [], [create_port('/dev/ttyACM1')],
+                                [create_port('/dev/ttyACM0')])
+
+        with mock.patch('serial.tools.list_ports.comports', comports):
+            watcher = PortWatcher('/dev/ttyACM0')
+
+            self.assertTrue(watcher.wait_for_removal(1.0))
+            self.assertEqual('/dev/ttyACM0', watcher.wait_for_arrival(1.0))
+
+    def test_timeouts(self):
+        with mock.patch('serial.tools.list_ports.comports', FakeComports([create_port('/dev/ttyACM0', 'ABC')])):
+            watcher = PortWatcher('/dev/ttyACM0')
+
+            self.assertFalse(watcher.wait_for_removal(0.01))
+
+        with mock.patch('serial.tools.list_ports.comports', FakeComports([])):
+            self.assertIsNone(watcher.wait_for_arrival(0.01))
+
+    def test_port_not_enumerated(self):
+        with mock.patch('serial.tools.list_ports.comports', FakeComports([])):
+            watcher = PortWatcher('/dev/pts/3')
+
+            self.assertFalse(watcher.watchable)
+            self.assertFalse(watcher.wait_for_removal(1.0))
+            self.assertIsNone(watcher.wait_for_arrival(1.0))
+
+
+class TestDfuTransportSerialReadiness(unittest.TestCase):
+    def create_transport(self, port):
+        transport = DfuTransportSerial("/dev/ttyACM0")
+        transport.serial_port = port
+        port.timeout = transport.timeout
+        return transport
+
+    def test_ready_bootloader_answers_probe(self):
+        port = FakeBootloaderPort()
+        transport = self.create_transport(port)
+
+        self.assertTrue(transport.wait_until_ready(1.0))
+        self.assertEqual([], port.received)
+        self.assertEqual(0, transport.link.unanswered)
+        self.assertEqual(transport.timeout, port.timeout)
+
+        # The first packet of the transfer is not affected by the probe
+        transport.send_packet(transport.create_packet(b'\x01'))
+        self.assertEqual([b'\x01'], port.received)
+
+    def test_silent_bootloader(self):
+        port = FakeBootloaderPort(drop=range(1, 1000))
+        transport = self.create_transport(port)
+
+        start = time.monotonic()
+        self.assertFalse(transport.wait_until_ready(0.05))
+        self.assertGreaterEqual(time.monotonic() - start, 0.05)
+
+    @mock.patch.object(PortWatcher, 'POLL_INTERVAL', 0.001)
+    def test_touch_reenumeration(self):
+        comports = FakeComports([create_port('/dev/ttyACM0', 'ABC')], [], [create_port('/dev/ttyACM1', 'ABC')])
+        transport = DfuTransportSerial("/dev/ttyACM0", touch=1200)
+
+        with mock.patch('serial.tools.list_ports.comports', comports):
+            watcher = PortWatcher(transport.com_port)
+            start = time.monotonic()
+            transport.wait_for_reenumeration(watcher, 1.0)
+
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual('/dev/ttyACM1', transport.com_port)
+
+
+
+@mock.patch.object(PortWatcher, 'POLL_INTERVAL', 0.001)
+class TestDfuTransportSerialActivation(unittest.TestCase):
+    def create_transport(self, **kwargs):
+        transport = DfuTransportSerial("/dev/ttyACM0", **kwargs)
+        transport.serial_port = FakeBootloaderPort()
+        transport.flash_timing.dirty = False
+        return transport
+
+    def test_reenumeration(self):
+        comports = FakeComports([create_port('/dev/ttyACM0', 'ABC')], [create_port('/dev/ttyACM0', 'ABC')], [],
+                                [create_port('/dev/ttyACM0', 'ABC')])
+        transport = self.create_transport(detect_reenumeration=True)
+
+        with mock.patch('serial.tools.list_ports.comports', comports):
+            self.assertTrue(transport.wait_for_activation())
+
+    def test_timeout_without_reenumeration(self):
+        comports = FakeComports([create_port('/dev/ttyACM0', 'ABC')])
+        transport = self.create_transport(detect_reenumeration=True)
+
+        with mock.patch('serial.tools.list_ports.comports', comports), \
+                mock.patch.object(transport, 'get_activate_wait_time', return_value=0.05):
+            start = time.monotonic()
+            self.assertFalse(transport.wait_for_activation())
+            self.assertGreaterEqual(time.monotonic() - start, 0.05)
+
+    def test_fixed_wait(self):
+        transport = self.create_transport()
+
+        with mock.patch.object(transport, 'get_activate_wait_time', return_value=0.05):
+            start = time.monotonic()
+            self.assertFalse(transport.wait_for_activation())
+            self.assertGreaterEqual(time.monotonic() - start, 0.05)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,284 @@
+# Copyright (c) 2015, Nordic Semiconductor
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of Nordic Semiconductor ASA nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from serial import Serial
+
+from nordicsemi.dfu.dfu import Dfu, DfuPackage
+from nordicsemi.dfu.dfu_transport import DfuEvent
+from nordicsemi.dfu.dfu_transport_serial import DfuTransportSerial, HciLink, SlipReader
+from nordicsemi.dfu.model import HexType
+from nordicsemi.dfu.serial_emulator import SerialDfuEmulator
+from nordicsemi.dfu.tests.helpers import create_package, read_firmware
+from nordicsemi.dfu.wire_image import WireImage
+
+
+@unittest.skipUnless(hasattr(os, 'openpty'), 'Serial DFU emulator needs pseudo-terminals')
+class TestSerialDfuEmulator(unittest.TestCase):
+    def setUp(self):
+        self.work_directory = tempfile.mkdtemp(prefix="nrf_dfu_tests_")
+
+    def tearDown(self):
+        shutil.rmtree(self.work_directory, ignore_errors=True)
+
+    def test_dfu_send_images(self):
+        package_path = create_package(self.work_directory)
+        firmware = read_firmware(package_path)
+
+        for window_size in (1, 4):
+            with SerialDfuEmulator(page_erase_time=0.001, word_write_time=0.000001) as emulator:
+                transport = DfuTransportSerial(emulator.port, single_bank=True, window_size=window_size)
+                Dfu(package_path, transport).dfu_send_images()
+
+                self.assertEqual(1, len(emulator.images))
+                image = emulator.images[0]
+                self.assertTrue(image.complete)
+                self.assertEqual(HexType.APPLICATION, image.mode)
+                self.assertEqual(len(firmware), image.app_size)
+                self.assertEqual(firmware, image.firmware)
+                self.assertEqual(0, emulator.crc_errors)
+                self.assertEqual(window_size, transport.window_size)
+
+    def test_concurrent_sessions(self):
+        package_path = create_package(self.work_directory)
+        firmware = read_firmware(package_path)
+        errors = []
+
+        def run(transport):
+            try:
+                Dfu(package_path, transport).dfu_send_images()
+            except Exception as e:
+                errors.append(e)
+
+        with SerialDfuEmulator(page_erase_time=0.001, word_write_time=0.000001) as first, \
+                SerialDfuEmulator(page_erase_time=0.001, word_write_time=0.000001) as second:
+            emulators = [first, second]
+            transports = [DfuTransportSerial(emulator.port, single_bank=True, window_size=window_size)
+                          for emulator, window_size in zip(emulators, (1, 4))]
+
+            threads = [threading.Thread(target=run, args=(transport,)) for transport in transports]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            self.assertEqual([], errors)
+            for emulator in emulators:
+                self.assertEqual(1, len(emulator.images))
+                self.assertTrue(emulator.images[0].complete)
+                self.assertEqual(firmware, emulator.images[0].firmware)
+                self.assertEqual(0, emulator.crc_errors)
+
+        # Each session numbered its packets on its own link, none of them had to be resent
+        self.assertIsNot(transports[0].link, transports[1].link)
+        self.assertEqual([0, 0], [transport.link.retransmissions for transport in transports])
+        self.assertEqual([0, 0], [transport.link.timeouts for transport in transports])
+
+    def test_multi_image_session(self):
+        package_path = create_package(self.work_directory, softdevice_fw="bar.hex", app_fw="foo.hex")
+        softdevice = read_firmware(package_path, "bar.bin")
+        application = read_firmware(package_path, "foo.bin")
+
+        with SerialDfuEmulator(page_erase_time=0.001, word_write_time=0.000001) as emulator:
+            transport = DfuTransportSerial(emulator.port, single_bank=True)
+            dfu = Dfu(package_path, transport)
+
+            plan = dfu.plan_images()
+            self.assertEqual([(HexType.SOFTDEVICE, True), (HexType.APPLICATION, False)],
+                             [(program_mode, reset) for program_mode, _, reset, _ in plan])
+            self.assertEqual(application, plan[0][3])
+            self.assertIsNone(plan[1][3])
+
+            firmware_frames = []
+            build_firmware_frames = transport.firmware_frames
+
+            def record_firmware_frames(*args):
+                firmware_frames.append(build_firmware_frames(*args))
+                return firmware_frames[-1]
+
+            with mock.patch.object(transport, 'firmware_frames', side_effect=record_firmware_frames):
+                dfu.dfu_send_images()
+
+            self.assertEqual([(HexType.SOFTDEVICE, softdevice), (HexType.APPLICATION, application)],
+                             [(image.mode, image.firmware) for image in emulator.images])
+            self.assertTrue(all(image.complete for image in emulator.images))
+
+        # The application was encoded during the activation of the SoftDevice, and the device was reset only once
+        self.assertNotIsInstance(firmware_frames[0], list)
+        self.assertIsInstance(firmware_frames[1], list)
+        spans = [span["name"] for span in transport.report.spans]
+        self.assertEqual(1, spans.count("dtr_reset_wait"))
+        self.assertEqual(1, spans.count("port_ready_wait"))
+
+    def test_wire_image(self):
+        package_path = create_package(self.work_directory, softdevice_fw="bar.hex", app_fw="foo.hex")
+        wire_image_path = os.path.join(self.work_directory, "package.wire")
+        WireImage.compile(DfuPackage(package_path), wire_image_path, packet_size=256)
+
+        softdevice = read_firmware(package_path, "bar.bin")
+        application = read_firmware(package_path, "foo.bin")
+
+        wire_image = WireImage(wire_image_path)
+
+        for window_size in (1, 4):
+            with SerialDfuEmulator(page_erase_time=0.001, word_write_time=0.000001) as emulator:
+                transport = DfuTransportSerial(emulator.port, single_bank=True, window_size=window_size,
+                                               packet_size=wire_image.packet_size)
+                dfu = Dfu(wire_image, transport)
+                self.assertEqual([None, None], [next_firmware for _, _, _, next_firmware in dfu.plan_images()])
+
+                with mock.patch.object(HciLink, 'create_packet', autospec=True,
+                                       side_effect=HciLink.create_packet) as create_packet:
+                    dfu.dfu_send_images()
+
+                self.assertEqual([(HexType.SOFTDEVICE, softdevice), (HexType.APPLICATION, application)],
+                                 [(image.mode, image.firmware) for image in emulator.images])
+                self.assertTrue(all(image.complete for image in emulator.images))
+                self.assertEqual(0, emulator.crc_errors)
+
+                # Only the start, init and stop packets of each image were built
+                self.assertEqual(6, create_packet.call_count)
+
+    @mock.patch.object(DfuTransportSerial, 'ACK_PACKET_TIMEOUT', 0.1)
+    def test_dfu_recovers_from_dropped_frames(self):
+        package_path = create_package(self.work_directory)
+        firmware = read_firmware(package_path)
+
+        with SerialDfuEmulator(page_erase_time=0.001, word_write_time=0.000001, drop_rate=0.1, seed=3) as emulator:
+            transport = DfuTransportSerial(emulator.port, single_bank=True, timeout=0.05)
+            Dfu(package_path, transport).dfu_send_images()
+
+            image = emulator.images[-1]
+            self.assertTrue(image.complete)
+            self.assertEqual(firmware, image.firmware)
+            self.assertGreater(emulator.frames_dropped, 0)
+            self.assertEqual(emulator.frames_dropped, transport.link.retransmissions)
+            self.assertEqual(emulator.frames_dropped, transport.report.counters["recoveries"])
+
+    @mock.patch.object(DfuTransportSerial, 'MAX_TX_ATTEMPTS', 0)
+    @mock.patch.object(DfuTransportSerial, 'ACK_PACKET_TIMEOUT', 0.1)
+    @mock.patch.object(DfuTransportSerial, 'MAX_ACK_PACKET_TIMEOUT', 0.2)
+    def test_dfu_resumes_stalled_transfer(self):
+        package_path = create_package(self.work_directory)
+        firmware = read_firmware(package_path)
+
+        for window_size in (1, 4):
+            # Frames 1 to 3 are the readiness probe, start and init packets, frame 11 has sequence number 2
+            with SerialDfuEmulator(page_erase_time=0.001, word_write_time=0.000001, drop_frames=[11]) as emulator:
+                transport = DfuTransportSerial(emulator.port, single_bank=True, timeout=0.05, window_size=window_size)
+                Dfu(package_path, transport).dfu_send_images()
+
+                self.assertEqual(1, len(emulator.images))
+                self.assertTrue(emulator.images[0].complete)
+                self.assertEqual(firmware, emulator.images[0].firmware)
+                self.assertEqual(1, transport.report.counters["resumes"])
+
+    @mock.patch.object(DfuTransportSerial, 'MAX_TX_ATTEMPTS', 0)
+    @mock.patch.object(DfuTransportSerial, 'ACK_PACKET_TIMEOUT', 0.1)
+    @mock.patch.object(DfuTransportSerial, 'MAX_ACK_PACKET_TIMEOUT', 0.2)
+    def test_dfu_restarts_when_device_was_reset(self):
+        package_path = create_package(self.work_directory)
+        firmware = read_firmware(package_path)
+
+        with SerialDfuEmulator(page_erase_time=0.001, word_write_time=0.000001, drop_frames=[10]) as emulator:
+            transport = DfuTransportSerial(emulator.port, single_bank=True, timeout=0.05)
+            transport.register_events_callback(DfuEvent.TIMEOUT_EVENT, lambda log_message: emulator.reboot())
+            Dfu(package_path, transport).dfu_send_images()
+
+            self.assertEqual(2, len(emulator.images))
+            self.assertFalse(emulator.images[0].complete)
+            self.assertTrue(emulator.images[1].complete)
+            self.assertEqual(firmware, emulator.images[1].firmware)
+            self.assertEqual(0, transport.report.counters["resumes"])
+            self.assertEqual(1, transport.report.counters["restarts"])
+
+    def test_activation_detected_by_boot_banner(self):
+        package_path = create_package(self.work_directory)
+        firmware = read_firmware(package_path)
+
+        with SerialDfuEmulator(page_erase_time=0.001, word_write_time=0.000001, boot_banner=b'\r\nBlinky v1.2\r\n',
+                               activation_time=0.05) as emulator:
+            transport = DfuTransportSerial(emulator.port, boot_banner=r'Blinky v\d+\.\d+')
+            Dfu(package_path, transport).dfu_send_images()
+
+            self.assertTrue(emulator.images[0].complete)
+
+        activation_wait = transport.report.phase_totals()["activation_wait"]
+        self.assertGreaterEqual(activation_wait, 0.05)
+        self.assertLess(activation_wait, transport.get_activate_wait_time())
+
+    def test_session_report(self):
+        package_path = create_package(self.work_directory)
+        firmware = read_firmware(package_path)
+
+        with SerialDfuEmulator(page_erase_time=0.001, word_write_time=0.000001) as emulator:
+            transport = DfuTransportSerial(emulator.port, single_bank=True)
+            Dfu(package_path, transport).dfu_send_images()
+
+        report = transport.report.to_dict()
+        for phase in ("image", "port_open", "dtr_reset_wait", "start_packet", "erase_wait", "init_packet",
+                      "data_transfer", "stop_packet", "close", "activation_wait"):
+            self.assertIn(phase, report["phases"])
+
+        frames = (len(firmware) + transport.packet_size - 1) // transport.packet_size
+        # Start, init, data and stop packets
+        self.assertEqual(frames + 3, report["histograms"]["frame_ack"]["count"])
+        self.assertEqual(frames + 3, report["histograms"]["frame_write"]["count"])
+        self.assertEqual(0, report["counters"]["retransmissions"])
+        self.assertEqual(0, report["counters"]["timeouts"])
+
+    def test_corrupt_frame_is_not_acknowledged(self):
+        with SerialDfuEmulator() as emulator:
+            port = Serial(emulator.port, timeout=1)
+            link = HciLink()
+            reader = SlipReader()
+
+            packet = link.create_packet(b'\x05\x00\x00\x00')
+            corrupt = bytearray(packet.data)
+            corrupt[-3] ^= 0x01
+
+            port.write(corrupt)
+            ack = reader.feed(port.read(6))[0]
+            self.assertFalse(HciLink.is_acknowledged(packet, (ack[0] >> 3) & 0x07))
+
+            port.write(packet.data)
+            ack = reader.feed(port.read(6))[0]
+            self.assertTrue(HciLink.is_acknowledged(packet, (ack[0] >> 3) & 0x07))
+
+            port.close()
+            self.assertEqual(1, emulator.crc_errors)
+
+
+if __name__ == '__main__':
+    unittest.main()
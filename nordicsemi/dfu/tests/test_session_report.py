@@ -0,0 +1,128 @@
+# Copyright (c) 2015, Nordic Semiconductor
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of Nordic Semiconductor ASA nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from nordicsemi.dfu.session_report import LatencyHistogram, SessionReport
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    def test_add(self):
+        histogram = LatencyHistogram()
+
+        for seconds in (0.00005, 0.001, 0.0015, 2.0):
+            histogram.add(seconds)
+
+        result = histogram.to_dict()
+        self.assertEqual(4, result["count"])
+        self.assertEqual(0.00005, result["min"])
+        self.assertEqual(2.0, result["max"])
+        self.assertAlmostEqual((0.00005 + 0.001 + 0.0015 + 2.0) / 4, result["mean"])
+        self.assertEqual(1, result["buckets"]["<=0.0001"])
+        self.assertEqual(1, result["buckets"]["<=0.001"])
+        self.assertEqual(1, result["buckets"]["<=0.002"])
+        self.assertEqual(1, result["buckets"]["inf"])
+
+    def test_empty(self):
+        result = LatencyHistogram().to_dict()
+
+        self.assertEqual(0, result["count"])
+        self.assertIsNone(result["mean"])
+        self.assertEqual(0, sum(result["buckets"].values()))
+
+
+class TestSessionReport(unittest.TestCase):
+    def setUp(self):
+        self.work_directory = tempfile.mkdtemp(prefix="nrf_dfu_tests_")
+
+    def tearDown(self):
+        shutil.rmtree(self.work_directory, ignore_errors=True)
+
+    def test_spans(self):
+        report = SessionReport()
+
+        with report.span("erase_wait", size=4096):
+            pass
+
+        for _ in range(2):
+            with report.span("init_packet"):
+                pass
+
+        self.assertEqual(3, len(report.spans))
+        self.assertEqual(4096, report.spans[0]["size"])
+        self.assertEqual(["erase_wait", "init_packet"], list(report.phase_totals().keys()))
+
+    def test_failed_span_is_recorded(self):
+        report = SessionReport()
+
+        with self.assertRaises(ValueError):
+            with report.span("data_transfer"):
+                raise ValueError("No ACK")
+
+        self.assertEqual("No ACK", report.spans[0]["error"])
+
+    def test_write(self):
+        report = SessionReport()
+        report.record_latency("frame_ack", 0.003)
+        report.count("retransmissions", 2)
+        report.count("retransmissions")
+
+        with report.span("stop_packet"):
+            pass
+
+        report_path = os.path.join(self.work_directory, "report.json")
+        report.write(report_path)
+
+        with open(report_path) as f:
+            result = json.load(f)
+
+        self.assertEqual(3, result["counters"]["retransmissions"])
+        self.assertEqual(1, result["histograms"]["frame_ack"]["count"])
+        self.assertIn("stop_packet", result["phases"])
+        self.assertEqual("stop_packet", result["spans"][0]["name"])
+
+    def test_event_stream(self):
+        events = io.StringIO()
+        report = SessionReport(event_stream=events)
+
+        with report.span("port_open", port="/dev/ttyACM0"):
+            report.count("timeouts")
+
+        records = [json.loads(line) for line in events.getvalue().splitlines()]
+        self.assertEqual(["span_start", "counter", "span_end"], [record["event"] for record in records])
+        self.assertEqual("/dev/ttyACM0", records[0]["port"])
+        self.assertEqual(1, records[1]["value"])
+        self.assertIn("duration", records[2])
+
+
+if __name__ == '__main__':
+    unittest.main()
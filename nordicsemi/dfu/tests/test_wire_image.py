@@ -0,0 +1,117 @@
+# Copyright (c) 2015, Nordic Semiconductor
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of Nordic Semiconductor ASA nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import os
+import shutil
+import tempfile
+import unittest
+
+from nordicsemi.dfu.dfu import DfuPackage
+from nordicsemi.dfu.dfu_transport_serial import HciPacket
+from nordicsemi.dfu.model import HexType
+from nordicsemi.dfu.tests.helpers import create_package, read_firmware
+from nordicsemi.dfu.wire_image import WireImage, load_package
+from nordicsemi.exceptions import NordicSemiException
+
+
+class TestWireImage(unittest.TestCase):
+    def setUp(self):
+        self.work_directory = tempfile.mkdtemp(prefix="nrf_dfu_tests_")
+        self.package_path = create_package(self.work_directory, softdevice_fw="bar.hex", app_fw="foo.hex")
+        self.softdevice = read_firmware(self.package_path, "bar.bin")
+        self.application = read_firmware(self.package_path, "foo.bin")
+
+        self.wire_image_path = os.path.join(self.work_directory, "package.wire")
+
+    def tearDown(self):
+        shutil.rmtree(self.work_directory, ignore_errors=True)
+
+    def test_compile_and_load(self):
+        package = DfuPackage(self.package_path)
+        size = WireImage.compile(package, self.wire_image_path, packet_size=256)
+        self.assertEqual(os.path.getsize(self.wire_image_path), size)
+
+        wire_image = load_package(self.wire_image_path)
+        self.assertIsInstance(wire_image, WireImage)
+        self.assertEqual(256, wire_image.packet_size)
+        self.assertEqual([HexType.SOFTDEVICE, HexType.APPLICATION],
+                         [program_mode for program_mode, _ in wire_image.images()])
+
+        for (_, expected), (_, firmware_manifest) in zip(package.images(), wire_image.images()):
+            firmware = wire_image.firmware(firmware_manifest)
+            self.assertEqual(package.firmware(expected), firmware)
+            self.assertEqual(package.init_packet(expected), wire_image.init_packet(firmware_manifest))
+
+            frames = wire_image.frames(firmware_manifest)
+            self.assertEqual((len(firmware) + 255) // 256, len(frames))
+            self.assertEqual(len(firmware), sum(size for _, size in frames))
+            self.assertEqual([(3 + i) % 8 for i in range(len(frames))], [pkt.sequence_number for pkt, _ in frames])
+            self.assertEqual(HciPacket(b'\x04\x00\x00\x00', firmware[:256], sequence_number=3).data,
+                             frames[0][0].data)
+
+    def test_has_package_attributes(self):
+        package = DfuPackage(self.package_path)
+        WireImage.compile(package, self.wire_image_path)
+
+        self.assertEqual(sorted(vars(package)), sorted(vars(WireImage(self.wire_image_path))))
+        self.assertRaises(NordicSemiException, WireImage, os.path.join(self.work_directory, "missing.wire"))
+
+    def test_load_zip(self):
+        package = load_package(self.package_path)
+
+        self.assertNotIsInstance(package, WireImage)
+        self.assertIsNone(package.frames(package.images()[0][1]))
+
+    def test_corrupt_wire_image(self):
+        package = DfuPackage(self.package_path)
+        WireImage.compile(package, self.wire_image_path)
+
+        with open(self.wire_image_path, 'rb') as f:
+            data = f.read()
+
+        with open(self.wire_image_path, 'wb') as f:
+            f.write(data[:-1])
+        self.assertRaises(NordicSemiException, WireImage, self.wire_image_path)
+
+        # Flip a bit in the header of the first frame
+        corrupt = bytearray(data)
+        init_packet = package.init_packet(package.images()[0][1])
+        first_frame = WireImage.HEADER.size + WireImage.IMAGE_HEADER.size + len(init_packet) + WireImage.FRAME_HEADER.size
+        corrupt[first_frame + 1] ^= 0x01
+        with open(self.wire_image_path, 'wb') as f:
+            f.write(corrupt)
+        self.assertRaises(NordicSemiException, WireImage, self.wire_image_path)
+
+    def test_packet_size_out_of_range(self):
+        package = DfuPackage(self.package_path)
+
+        self.assertRaises(NordicSemiException, WireImage.compile, package, self.wire_image_path, 0)
+        self.assertRaises(NordicSemiException, WireImage.compile, package, self.wire_image_path, 514)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -79,7 +79,7 @@ def convert_uint32_to_array(value):
     return [byte0, byte1, byte2, byte3]
 
 
-def slip_parts_to_four_bytes(seq, dip, rp, pkt_type, pkt_len):
+def slip_parts_to_header(seq, dip, rp, pkt_type, pkt_len):
     """
     Creates a SLIP header.
 
@@ -91,7 +91,7 @@ def slip_parts_to_four_bytes(seq, dip, rp, pkt_type, pkt_len):
     :param int rp: Reliable packet
     :param pkt_type: Payload packet
     :param pkt_len: Packet length
-    :return: str with SLIP header
+    :return: bytes with SLIP header
     """
     ints = [0, 0, 0, 0]
     ints[0] = seq | (((seq + 1) % 8) << 3) | (dip << 6) | (rp << 7)
@@ -99,7 +99,16 @@ def slip_parts_to_four_bytes(seq, dip, rp, pkt_type, pkt_len):
     ints[2] = (pkt_len & 0x0FF0) >> 4
     ints[3] = (~(sum(ints[0:3])) + 1) & 0xFF
 
-    return ''.join(chr(b) for b in ints)
+    return bytes(ints)
+
+
+def slip_parts_to_four_bytes(seq, dip, rp, pkt_type, pkt_len):
+    """
+    Creates a SLIP header.
+
+    :return: str with SLIP header
+    """
+    return ''.join(chr(b) for b in slip_parts_to_header(seq, dip, rp, pkt_type, pkt_len))
 
 
 def int32_to_bytes(value):
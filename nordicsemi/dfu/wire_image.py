@@ -0,0 +1,226 @@
+# Copyright (c) 2015, Nordic Semiconductor
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of Nordic Semiconductor ASA nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Python standard library
+import logging
+import struct
+
+# Nordic libraries
+from nordicsemi.exceptions import NordicSemiException
+from nordicsemi.dfu.dfu import Dfu, DfuPackage
+from nordicsemi.dfu.dfu_transport_serial import DfuTransportSerial, HciPacket, SlipReader
+from nordicsemi.dfu.manifest import Manifest
+from nordicsemi.dfu.model import HexType
+
+logger = logging.getLogger(__name__)
+
+
+class WireImage(DfuPackage):
+    """
+    A DFU package compiled for serial DFU, with the data packets of every image SLIP encoded ahead of time.
+
+    Sending a wire image only writes the stored frames to the port, no packet is built or checksummed during the
+    transfer. The start, init and stop packets are still built when sent, they are one packet each.
+
+    File layout, little endian:
+
+        magic, version, packet size, image count
+        for each image, in the order they are sent:
+            program mode, softdevice size, bootloader size, application size, init packet length, frame count
+            init packet
+            for each data frame: frame length, SLIP encoded frame
+
+    Data frames are numbered like in a new session, where the start and init packets take sequence numbers 1 and 2,
+    so frame i has sequence number (3 + i) % 8. A resumed transfer keeps that numbering, so one numbering is enough.
+    The sizes in the start packet are all the flash timing model needs to compute the erase and activation waits.
+    The firmware itself is not stored, it is decoded from the frames when the image is loaded.
+    """
+
+    MAGIC = b'NRFWIRE\x00'
+    VERSION = 1
+
+    HEADER = struct.Struct('<8sBxHI')
+    IMAGE_HEADER = struct.Struct('<BxxxIIIII')
+    FRAME_HEADER = struct.Struct('<H')
+
+    MANIFEST_KEYS = {
+        HexType.SD_BL: 'softdevice_bootloader',
+        HexType.SOFTDEVICE: 'softdevice',
+        HexType.BOOTLOADER: 'bootloader',
+        HexType.APPLICATION: 'application',
+    }
+
+    # Header, packet type and CRC around the firmware bytes of a decoded data frame
+    FRAME_PAYLOAD_START = HciPacket.HEADER_SIZE + 4
+    FRAME_PAYLOAD_END = -HciPacket.CRC_SIZE
+
+    def _read(self, file_path):
+        """
+        Reads a wire image.
+
+        :param str file_path: Path to the wire image
+        :return:
+        """
+        with open(file_path, 'rb') as f:
+            data = memoryview(f.read())
+
+        magic, version, self.packet_size, image_count = WireImage._unpack(WireImage.HEADER, data, 0)
+        if magic != WireImage.MAGIC:
+            raise NordicSemiException("{0} is not a wire image".format(file_path))
+        if version != WireImage.VERSION:
+            raise NordicSemiException("Unsupported wire image version {0}".format(version))
+
+        offset = WireImage.HEADER.size
+        manifest = {}
+
+        for i in range(image_count):
+            program_mode, sd_size, bl_size, app_size, init_packet_length, frame_count = \
+                WireImage._unpack(WireImage.IMAGE_HEADER, data, offset)
+            offset += WireImage.IMAGE_HEADER.size
+
+            if program_mode not in WireImage.MANIFEST_KEYS:
+                raise NordicSemiException("Unknown program mode {0} in wire image".format(program_mode))
+
+            firmware_manifest = {'bin_file': "image{0}.bin".format(i), 'dat_file': "image{0}.dat".format(i)}
+            if program_mode == HexType.SD_BL:
+                firmware_manifest['sd_size'] = sd_size
+                firmware_manifest['bl_size'] = bl_size
+            manifest[WireImage.MANIFEST_KEYS[program_mode]] = firmware_manifest
+
+            self.files[firmware_manifest['dat_file']] = bytes(data[offset:offset + init_packet_length])
+            offset += init_packet_length
+
+            frames = []
+            for frame in range(frame_count):
+                length, = WireImage._unpack(WireImage.FRAME_HEADER, data, offset)
+                offset += WireImage.FRAME_HEADER.size
+                frames.append(HciPacket.from_frame(bytes(data[offset:offset + length]), (3 + frame) % 8))
+                offset += length
+
+            firmware = WireImage._decode_firmware(frames)
+            if len(firmware) != sd_size + bl_size + app_size:
+                raise NordicSemiException("Image {0} of the wire image has {1} firmware bytes, expected {2}"
+                                          .format(i, len(firmware), sd_size + bl_size + app_size))
+
+            self.files[firmware_manifest['bin_file']] = firmware
+            self.compiled_frames[firmware_manifest['bin_file']] = [
+                (pkt, min(self.packet_size, len(firmware) - j * self.packet_size)) for j, pkt in enumerate(frames)]
+
+        if offset != len(data):
+            raise NordicSemiException("Unexpected data at the end of the wire image")
+
+        self.manifest = Manifest(**manifest)
+
+    @staticmethod
+    def _unpack(header, data, offset):
+        if offset + header.size > len(data):
+            raise NordicSemiException("Wire image is truncated")
+
+        return header.unpack_from(data, offset)
+
+    @staticmethod
+    def _decode_firmware(frames):
+        """
+        Joins the firmware bytes of data frames.
+
+        :param list frames: HciPacket data packets
+        :return bytes: Firmware
+        """
+        firmware = bytearray()
+
+        for pkt in frames:
+            frame = SlipReader.decode(pkt.data[1:-1])
+
+            if not SlipReader.is_valid_header(frame) or frame[0] & 0x07 != pkt.sequence_number:
+                raise NordicSemiException("Corrupt frame in wire image")
+
+            firmware += frame[WireImage.FRAME_PAYLOAD_START:WireImage.FRAME_PAYLOAD_END]
+
+        return bytes(firmware)
+
+    @staticmethod
+    def is_wire_image(file_path):
+        """
+        Tells if a file is a wire image, by its magic.
+
+        :param str file_path: Path to the file
+        :return bool: True if the file starts like a wire image
+        """
+        with open(file_path, 'rb') as f:
+            return f.read(len(WireImage.MAGIC)) == WireImage.MAGIC
+
+    @staticmethod
+    def compile(package, file_path, packet_size=DfuTransportSerial.DFU_PACKET_MAX_SIZE):
+        """
+        Writes the wire image of a package.
+
+        :param DfuPackage package: Loaded package
+        :param str file_path: Path of the wire image to write
+        :param int packet_size: Maximum number of firmware bytes per data packet, the serial transport's packet size
+        :return int: Number of bytes written
+        """
+        if not 4 <= packet_size <= DfuTransportSerial.DFU_PACKET_MAX_SIZE or packet_size % 4:
+            raise NordicSemiException("Packet size must be a multiple of 4 up to {0}, got {1}"
+                                      .format(DfuTransportSerial.DFU_PACKET_MAX_SIZE, packet_size))
+
+        images = package.images()
+        chunks = [WireImage.HEADER.pack(WireImage.MAGIC, WireImage.VERSION, packet_size, len(images))]
+
+        for program_mode, firmware_manifest in images:
+            firmware = package.firmware(firmware_manifest)
+            init_packet = package.init_packet(firmware_manifest)
+
+            frames = [pkt.data for pkt, _ in DfuTransportSerial.encode_frames(firmware, packet_size)]
+
+            chunks.append(WireImage.IMAGE_HEADER.pack(program_mode,
+                                                      *Dfu.image_sizes(program_mode, firmware_manifest, firmware),
+                                                      len(init_packet), len(frames)))
+            chunks.append(init_packet)
+
+            for frame in frames:
+                chunks.append(WireImage.FRAME_HEADER.pack(len(frame)))
+                chunks.append(frame)
+
+        with open(file_path, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+
+        return sum(len(chunk) for chunk in chunks)
+
+
+def load_package(file_path):
+    """
+    Loads a DFU package, either a zip or a wire image.
+
+    :param str file_path: Path to the package
+    :return DfuPackage: The loaded package
+    """
+    if WireImage.is_wire_image(file_path):
+        return WireImage(file_path)
+
+    return DfuPackage(file_path)
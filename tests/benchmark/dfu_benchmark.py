@@ -0,0 +1,357 @@
+# Copyright (c) 2015, Nordic Semiconductor
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of Nordic Semiconductor ASA nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Serial DFU transfer benchmark.
+
+Runs the full Dfu.dfu_send_images flow against the emulated serial bootloader for a matrix of package types, baud
+rates, packet sizes and flash timings, and compares the results with a stored baseline.
+
+Wall clock results depend on the host, so baselines are stored per host. On a host without a baseline of its own the
+cases are compared relative to each other with the baseline of another host, which cancels out the speed of the host.
+
+USAGE:
+    python tests/benchmark/dfu_benchmark.py --output results.json
+    python tests/benchmark/dfu_benchmark.py --update-baseline
+"""
+
+# Python standard library
+import collections
+import itertools
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+# 3rd party libraries
+import click
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir)))
+
+# Nordic libraries
+from nordicsemi.dfu.dfu import Dfu
+from nordicsemi.dfu.dfu_transport_serial import DfuTransportSerial
+from nordicsemi.dfu.package import Package
+from nordicsemi.dfu.serial_emulator import SerialDfuEmulator
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# Firmware sizes in bytes of the generated packages
+PACKAGES = collections.OrderedDict([
+    ("application", {"application": 48 * 1024}),
+    ("bootloader", {"bootloader": 24 * 1024}),
+    ("sd_bl", {"softdevice": 96 * 1024, "bootloader": 24 * 1024}),
+])
+
+# Simulated page erase and word write times
+FLASH_TIMINGS = collections.OrderedDict([
+    ("nrf52840", {"page_erase_time": 0.085, "word_write_time": 0.000041}),
+    ("nrf52832", {"page_erase_time": 0.0897, "word_write_time": 0.000338}),
+    ("fast", {"page_erase_time": 0.002, "word_write_time": 0.000001}),
+])
+
+# Metrics compared with the baseline, and whether a higher value is better
+COMPARED_METRICS = {
+    "bytes_per_second": True,
+    "cpu_time_per_frame": False,
+}
+
+
+class PhaseTimer(object):
+    """ Measures wall time spent in transport methods. """
+
+    def __init__(self):
+        self.phases = collections.OrderedDict()
+
+    def wrap(self, transport, method_name, phase):
+        original = getattr(transport, method_name)
+
+        def timed(*args, **kwargs):
+            start = time.monotonic()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.phases[phase] = self.phases.get(phase, 0.0) + time.monotonic() - start
+
+        setattr(transport, method_name, timed)
+
+
+class CpuTimer(object):
+    """ Measures CPU time of the calling thread spent in a transport method, excluding the emulator thread. """
+
+    def __init__(self):
+        self.cpu_time = 0.0
+
+    def wrap(self, transport, method_name):
+        original = getattr(transport, method_name)
+
+        def timed(*args, **kwargs):
+            start = time.thread_time()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.cpu_time += time.thread_time() - start
+
+        setattr(transport, method_name, timed)
+
+
+def create_package(work_directory, package_type):
+    """
+    Generates a package with random firmware of the sizes in PACKAGES.
+
+    :return: Path to the package and total firmware size
+    """
+    firmware_paths = {}
+
+    for firmware_type, size in PACKAGES[package_type].items():
+        path = os.path.join(work_directory, "{0}_{1}.bin".format(package_type, firmware_type))
+        with open(path, 'wb') as f:
+            f.write(os.urandom(size))
+        firmware_paths[firmware_type] = path
+
+    package_path = os.path.join(work_directory, "{0}.zip".format(package_type))
+    package = Package(app_fw=firmware_paths.get("application"),
+                      bootloader_fw=firmware_paths.get("bootloader"),
+                      softdevice_fw=firmware_paths.get("softdevice"))
+    package.generate_package(package_path)
+
+    return package_path, sum(PACKAGES[package_type].values())
+
+
+def run_case(package_path, firmware_size, baud_rate, packet_size, flash_timing, window_size):
+    """
+    Runs one DFU against a fresh emulator.
+
+    :return dict: Metrics of the run
+    """
+    with SerialDfuEmulator(baud_rate=baud_rate, **FLASH_TIMINGS[flash_timing]) as emulator:
+        transport = DfuTransportSerial(emulator.port, baud_rate=baud_rate, packet_size=packet_size,
+                                       window_size=window_size)
+
+        phase_timer = PhaseTimer()
+        for method_name, phase in (("open", "open"),
+                                   ("send_start_dfu", "start_and_erase"),
+                                   ("send_init_packet", "init_packet"),
+                                   ("send_firmware", "data_transfer"),
+                                   ("send_activate_firmware", "activate"),
+                                   ("close", "close")):
+            phase_timer.wrap(transport, method_name, phase)
+
+        cpu_timer = CpuTimer()
+        cpu_timer.wrap(transport, "send_firmware")
+
+        dfu = Dfu(package_path, transport)
+
+        start = time.monotonic()
+        dfu.dfu_send_images()
+        total = time.monotonic() - start
+
+        if not all(image.complete for image in emulator.images):
+            raise RuntimeError("Emulator did not receive a complete image")
+
+        frames = sum((image.size + packet_size - 1) // packet_size for image in emulator.images)
+
+    phases = phase_timer.phases
+    phases["activation_wait"] = total - sum(phases.values())
+    data_transfer = phases["data_transfer"]
+
+    return collections.OrderedDict([
+        ("firmware_bytes", firmware_size),
+        ("frames", frames),
+        ("total_time", total),
+        ("bytes_per_second", firmware_size / data_transfer),
+        ("frames_per_second", frames / data_transfer),
+        ("cpu_time_per_frame", cpu_timer.cpu_time / frames),
+        ("retransmissions", transport.link.retransmissions),
+        ("phases", phases),
+    ])
+
+
+def host_key():
+    """
+    Names the host results are recorded on, baselines are only comparable on the same host.
+
+    :return str: Host name, machine type and Python version
+    """
+    return "{0}-{1}-python{2}".format(platform.node(), platform.machine(), platform.python_version())
+
+
+def case_key(package_type, baud_rate, packet_size, flash_timing, window_size):
+    return "{0}-{1}-{2}-{3}-w{4}".format(package_type, baud_rate, packet_size, flash_timing, window_size)
+
+
+def compare(cases, baseline_cases, threshold, reference_case=None):
+    """
+    Compares results with a baseline.
+
+    With a reference case, every metric is divided by the metric of the reference case on both sides first, so
+    baselines recorded on another host can be used.
+
+    :param dict cases: Metrics of the cases run, by case key
+    :param dict baseline_cases: Metrics of the baseline cases, by case key
+    :param float threshold: Allowed relative regression
+    :param str reference_case: Case to compare the other cases relative to, None to compare absolute values
+    :return list: Descriptions of the regressions found
+    """
+    regressions = []
+
+    for case, metrics in cases.items():
+        if case not in baseline_cases or case == reference_case:
+            continue
+
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            current = metrics[metric]
+            reference = baseline_cases[case][metric]
+
+            if reference_case is not None:
+                current /= cases[reference_case][metric]
+                reference /= baseline_cases[reference_case][metric]
+
+            if higher_is_better:
+                regressed = current < reference * (1.0 - threshold)
+            else:
+                regressed = current > reference * (1.0 + threshold)
+
+            if regressed:
+                regressions.append("{0}: {1}{2} {3:.6g} (baseline {4:.6g})".format(
+                    case, metric, "" if reference_case is None else " relative to " + reference_case,
+                    current, reference))
+
+    return regressions
+
+
+def load_baselines(path):
+    """
+    Loads the stored baselines.
+
+    :return dict: Results of each host, by host key
+    """
+    if not os.path.isfile(path):
+        return collections.OrderedDict()
+
+    with open(path, 'r') as f:
+        return json.load(f, object_pairs_hook=collections.OrderedDict).get("hosts", collections.OrderedDict())
+
+
+@click.command()
+@click.option('--package-type', 'package_types', multiple=True, type=click.Choice(list(PACKAGES.keys())),
+              help='Package types to run, default: all')
+@click.option('--baud-rate', 'baud_rates', multiple=True, type=click.INT,
+              help='Baud rates to simulate, default: 115200 and 1000000')
+@click.option('--packet-size', 'packet_sizes', multiple=True, type=click.INT,
+              help='Data packet sizes, default: {0}'.format(DfuTransportSerial.DFU_PACKET_MAX_SIZE))
+@click.option('--flash-timing', 'flash_timings', multiple=True, type=click.Choice(list(FLASH_TIMINGS.keys())),
+              help='Simulated flash timings, default: nrf52840')
+@click.option('--window', type=click.IntRange(1, DfuTransportSerial.MAX_WINDOW_SIZE),
+              default=DfuTransportSerial.DEFAULT_WINDOW_SIZE, help='Transport window size')
+@click.option('--output', type=click.Path(dir_okay=False), help='Write the results to this JSON file')
+@click.option('--baseline', type=click.Path(dir_okay=False), default=BASELINE_PATH,
+              help='Baseline to compare with')
+@click.option('--threshold', type=click.FLOAT, default=0.2,
+              help='Allowed relative regression before failing, default: 0.2')
+@click.option('--update-baseline', is_flag=True, help='Store the results as the new baseline')
+def main(package_types, baud_rates, packet_sizes, flash_timings, window, output, baseline, threshold,
+         update_baseline):
+    """Runs the DFU benchmark matrix against the emulated serial bootloader."""
+    package_types = package_types or list(PACKAGES.keys())
+    baud_rates = baud_rates or [115200, 1000000]
+    packet_sizes = packet_sizes or [DfuTransportSerial.DFU_PACKET_MAX_SIZE]
+    flash_timings = flash_timings or ["nrf52840"]
+
+    host = host_key()
+    results = collections.OrderedDict([
+        ("host", host),
+        ("python", platform.python_version()),
+        ("platform", platform.platform()),
+        ("cases", collections.OrderedDict()),
+    ])
+
+    work_directory = tempfile.mkdtemp(prefix="nrf_dfu_benchmark_")
+    try:
+        for package_type in package_types:
+            package_path, firmware_size = create_package(work_directory, package_type)
+
+            for baud_rate, packet_size, flash_timing in itertools.product(baud_rates, packet_sizes, flash_timings):
+                case = case_key(package_type, baud_rate, packet_size, flash_timing, window)
+                metrics = run_case(package_path, firmware_size, baud_rate, packet_size, flash_timing, window)
+                results["cases"][case] = metrics
+
+                click.echo("{0:<40} {1:>9.0f} B/s {2:>7.1f} frames/s {3:>8.1f} us CPU/frame {4:>6.2f}s total"
+                           .format(case, metrics["bytes_per_second"], metrics["frames_per_second"],
+                                   metrics["cpu_time_per_frame"] * 1e6, metrics["total_time"]))
+    finally:
+        shutil.rmtree(work_directory, ignore_errors=True)
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=4)
+
+    baselines = load_baselines(baseline)
+
+    if update_baseline:
+        # Cases not run this time keep their stored values
+        if host in baselines:
+            baselines[host]["cases"].update(results["cases"])
+            results["cases"] = baselines[host]["cases"]
+        baselines[host] = results
+        with open(baseline, 'w') as f:
+            json.dump({"hosts": baselines}, f, indent=4)
+        click.echo("Baseline for {0} stored in {1}".format(host, baseline))
+        return
+
+    if host in baselines:
+        regressions = compare(results["cases"], baselines[host]["cases"], threshold)
+    else:
+        # Only the ratios between cases carry over from another host, and it takes two cases to have one
+        other = next(((other_host, other_results) for other_host, other_results in baselines.items()
+                      if len(set(results["cases"]) & set(other_results["cases"])) > 1), None)
+
+        if other is None:
+            click.echo("No baseline for {0} in {1}, nothing to compare with".format(host, baseline))
+            return
+
+        other_host, other_results = other
+        reference_case = next(case for case in results["cases"] if case in other_results["cases"])
+        click.echo("No baseline for {0}, comparing relative to {1} with the baseline of {2}"
+                   .format(host, reference_case, other_host))
+        regressions = compare(results["cases"], other_results["cases"], threshold, reference_case)
+
+    if regressions:
+        click.echo("Performance regressions:")
+        for regression in regressions:
+            click.echo("  " + regression)
+        sys.exit(1)
+
+    click.echo("No regressions against {0}".format(baseline))
+
+
+if __name__ == '__main__':
+    main()